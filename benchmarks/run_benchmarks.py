@@ -0,0 +1,366 @@
+# benchmarks/run_benchmarks.py — Timing, memory and scaling benchmarks on synthetic markets
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import io
+import gc
+import json
+import time
+import runpy
+import shutil
+import argparse
+import platform
+import tempfile
+import importlib
+import tracemalloc
+import subprocess
+import contextlib
+from itertools import combinations
+from datetime import datetime
+
+import numpy as np
+
+from benchmarks.synthetic import generate_market, cluster_pairs, write_workspace
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_ROOT, "benchmarks", "results")
+
+
+@contextlib.contextmanager
+def workspace_cwd(path):
+    """Run with path as cwd and the strategies' console logging swallowed."""
+    prev = os.getcwd()
+    os.chdir(path)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield
+    finally:
+        os.chdir(prev)
+
+
+def select_pairs(market, n_pairs, cluster_size):
+    """Cointegrated (same-cluster) pairs first, then cross-cluster pairs."""
+    pairs = cluster_pairs(market, cluster_size)
+    if n_pairs and n_pairs > len(pairs):
+        seen = set(pairs)
+        pairs += [p for p in combinations(sorted(market), 2) if p not in seen]
+    return pairs[:n_pairs] if n_pairs else pairs
+
+
+# --- Benchmarks -----------------------------------------------------------------
+# Each benchmark takes (workspace, market, pairs, interval) and returns the
+# number of bars it processed, which the harness uses for time-per-bar.
+
+def _run_cerebro(market, pairs, strategy_cls, **kwargs):
+    import backtrader as bt
+
+    cerebro = bt.Cerebro()
+    cerebro.broker.set_cash(1_000_000)
+    symbols = sorted({s for pair in pairs for s in pair})
+    for symbol in symbols:
+        cerebro.adddata(bt.feeds.PandasData(dataname=market[symbol], name=symbol))
+    for s1, s2 in pairs:
+        cerebro.addstrategy(strategy_cls, asset1_name=s1, asset2_name=s2, **kwargs)
+    cerebro.run()
+
+
+def bench_compute_beta(workspace, market, pairs, interval):
+    """Rolling-OLS hedge ratio alone, once per bar per pair."""
+    from strategies.spread_pair_strategy import SpreadPairStrategy
+
+    class BetaOnly(SpreadPairStrategy):
+        def next(self):
+            self.compute_beta()
+
+        def stop(self):
+            pass
+
+    _run_cerebro(market, pairs, BetaOnly)
+    return len(next(iter(market.values())))
+
+
+def bench_kalman_beta(workspace, market, pairs, interval):
+    """Kalman-filter hedge ratio alone, once per bar per pair."""
+    from strategies.spread_pair_strategy import SpreadPairStrategy
+
+    class BetaOnly(SpreadPairStrategy):
+        def next(self):
+            self.compute_beta()
+
+        def stop(self):
+            pass
+
+    _run_cerebro(market, pairs, BetaOnly, hedge_ratio="kalman")
+    return len(next(iter(market.values())))
+
+
+def bench_strategy_next(workspace, market, pairs, interval):
+    """Full SpreadPairStrategy.next loop, including the CSV writes in stop()."""
+    from strategies.spread_pair_strategy import SpreadPairStrategy
+
+    os.makedirs("data/processed", exist_ok=True)
+    _run_cerebro(market, pairs, SpreadPairStrategy, spread_lookback=60, beta_lookback=20,
+                 volatility_lookback=50, max_volatility=5.0, stop_loss_multiple=3.0)
+    return len(next(iter(market.values())))
+
+
+def bench_run_portfolio(workspace, market, pairs, interval):
+    """End-to-end main.run_portfolio against the workspace config."""
+    sys.modules.pop("main", None)
+    main = importlib.import_module("main")
+    main.run_portfolio()
+    return len(next(iter(market.values())))
+
+
+def bench_optimizer(workspace, market, pairs, interval):
+    """Full optimizer grid over every configured pair (daily files)."""
+    runpy.run_path(os.path.join(REPO_ROOT, "utils", "optimize_spread_parameters.py"), run_name="__main__")
+    return len(next(iter(market.values())))
+
+
+def bench_ranker(workspace, market, pairs, interval):
+    """Correlation + cointegration ranking over every symbol combination."""
+    utils_dir = os.path.join(REPO_ROOT, "utils")
+    if utils_dir not in sys.path:
+        sys.path.append(utils_dir)
+    ranker = importlib.import_module("rank_spread_candidates")
+    df = ranker.compute_metrics(sorted(market))
+    ranker.rank_pairs(df)
+    return len(next(iter(market.values())))
+
+
+BENCHMARKS = {
+    "compute_beta": bench_compute_beta,
+    "kalman_beta": bench_kalman_beta,
+    "strategy_next": bench_strategy_next,
+    "run_portfolio": bench_run_portfolio,
+    "optimizer": bench_optimizer,
+    "ranker": bench_ranker,
+}
+
+UNIVERSE_BENCHMARKS = {"run_portfolio", "optimizer", "ranker"}
+
+
+# --- Harness --------------------------------------------------------------------
+
+def measure(fn, args, repeat=1, memory=True):
+    """
+    Best-of-repeat wall time, plus peak traced memory from one extra run
+    (tracemalloc slows execution, so it never contributes to the timing).
+    """
+    timings = []
+    n_bars = 0
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        n_bars = fn(*args)
+        timings.append(time.perf_counter() - start)
+
+    peak_mb = None
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            fn(*args)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        peak_mb = peak / 1e6
+
+    best = min(timings)
+    return {
+        "seconds": best,
+        "seconds_all": timings,
+        "n_bars": n_bars,
+        "time_per_bar_us": best / n_bars * 1e6 if n_bars else None,
+        "peak_memory_mb": peak_mb,
+    }
+
+
+def run_suite(benchmarks, intervals, symbol_counts, bar_counts, pair_counts,
+              cluster_size=3, repeat=1, memory=True, seed=42):
+    results = []
+    for interval in intervals:
+        for n_symbols in symbol_counts:
+            for n_bars in bar_counts:
+                market = generate_market(n_symbols, n_bars, interval=interval,
+                                         cluster_size=cluster_size, seed=seed)
+                root = tempfile.mkdtemp(prefix="ccf_bench_")
+                try:
+                    write_workspace(market, root, interval=interval, cluster_size=cluster_size)
+                    for n_pairs in pair_counts:
+                        pairs = select_pairs(market, n_pairs, cluster_size)
+                        for name in benchmarks:
+                            # Whole-universe benchmarks ignore the pair count; run them once.
+                            if name in UNIVERSE_BENCHMARKS and n_pairs != pair_counts[0]:
+                                continue
+                            point = {
+                                "benchmark": name,
+                                "interval": interval,
+                                "n_symbols": n_symbols,
+                                "n_bars": n_bars,
+                                "n_pairs": len(pairs),
+                            }
+                            print(f"[BENCH] - {name} | {interval} | symbols={n_symbols} "
+                                  f"bars={n_bars} pairs={len(pairs)}")
+                            try:
+                                with workspace_cwd(root):
+                                    point.update(measure(BENCHMARKS[name],
+                                                         (root, market, pairs, interval),
+                                                         repeat=repeat, memory=memory))
+                                if point["n_pairs"] and point["time_per_bar_us"] is not None:
+                                    point["time_per_pair_bar_us"] = point["time_per_bar_us"] / point["n_pairs"]
+                                print(f"[BENCH] -   {point['seconds']:.3f}s | "
+                                      f"{point['time_per_bar_us']:.1f} us/bar | "
+                                      f"peak={point['peak_memory_mb'] or float('nan'):.1f} MB")
+                            except Exception as e:
+                                point["error"] = f"{type(e).__name__}: {e}"
+                                print(f"[BENCH] -   failed: {point['error']}")
+                            results.append(point)
+                finally:
+                    shutil.rmtree(root, ignore_errors=True)
+    return results
+
+
+def scaling_curves(results):
+    """
+    Group points per benchmark/interval into curves along each scaled
+    dimension and fit the log-log slope (1.0 = linear scaling).
+    """
+    curves = {}
+    ok = [r for r in results if "error" not in r]
+    for dim in ("n_bars", "n_symbols", "n_pairs"):
+        others = [d for d in ("n_bars", "n_symbols", "n_pairs") if d != dim]
+        groups = {}
+        for r in ok:
+            key = (r["benchmark"], r["interval"]) + tuple(r[d] for d in others)
+            groups.setdefault(key, []).append((r[dim], r["seconds"]))
+        for key, points in groups.items():
+            points = sorted(set(points))
+            if len({x for x, _ in points}) < 2:
+                continue
+            x = np.log([p[0] for p in points])
+            y = np.log([max(p[1], 1e-9) for p in points])
+            slope = float(np.polyfit(x, y, 1)[0])
+            curves.setdefault(f"{key[0]}@{key[1]}", []).append({
+                "dimension": dim,
+                "fixed": dict(zip(others, key[2:])),
+                "points": [{"x": p[0], "seconds": p[1]} for p in points],
+                "loglog_slope": slope,
+            })
+    return curves
+
+
+def environment_info():
+    info = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+    }
+    try:
+        info["git_commit"] = subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        info["git_commit"] = None
+    for mod in ("numpy", "pandas", "backtrader", "statsmodels"):
+        try:
+            info[mod] = importlib.import_module(mod).__version__
+        except Exception:
+            info[mod] = None
+    return info
+
+
+def save_results(results, label="run", output_dir=RESULTS_DIR):
+    os.makedirs(output_dir, exist_ok=True)
+    report = {
+        "label": label,
+        "environment": environment_info(),
+        "results": results,
+        "scaling": scaling_curves(results),
+    }
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    path = os.path.join(output_dir, f"{stamp}_{label}.json")
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"[BENCH] - Results saved to {path}")
+    return path
+
+
+def _point_key(r):
+    return (r["benchmark"], r["interval"], r["n_symbols"], r["n_bars"], r["n_pairs"])
+
+
+def compare_results(baseline_path, current_path, threshold=0.10):
+    """
+    Print per-point time and memory ratios (current / baseline) and return
+    the points slower than 1 + threshold.
+    """
+    with open(baseline_path) as f:
+        baseline = {_point_key(r): r for r in json.load(f)["results"] if "error" not in r}
+    with open(current_path) as f:
+        current = {_point_key(r): r for r in json.load(f)["results"] if "error" not in r}
+
+    regressions = []
+    print(f"\n{'benchmark':<16}{'interval':>9}{'syms':>6}{'bars':>8}{'pairs':>7}"
+          f"{'base s':>10}{'curr s':>10}{'ratio':>8}{'mem ratio':>11}")
+    for key in sorted(set(baseline) & set(current)):
+        b, c = baseline[key], current[key]
+        ratio = c["seconds"] / b["seconds"] if b["seconds"] else float("nan")
+        mem_ratio = (c["peak_memory_mb"] / b["peak_memory_mb"]
+                     if b.get("peak_memory_mb") and c.get("peak_memory_mb") else float("nan"))
+        flag = "  <-- REGRESSION" if ratio > 1 + threshold else ""
+        print(f"{key[0]:<16}{key[1]:>9}{key[2]:>6}{key[3]:>8}{key[4]:>7}"
+              f"{b['seconds']:>10.3f}{c['seconds']:>10.3f}{ratio:>8.2f}{mem_ratio:>11.2f}{flag}")
+        if flag:
+            regressions.append({"key": key, "ratio": ratio})
+    return regressions
+
+
+def _int_list(value):
+    return [int(v) for v in value.split(",") if v]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the framework on synthetic cointegrated markets.")
+    parser.add_argument("--benchmarks", default="compute_beta,strategy_next,ranker",
+                        help=f"Comma-separated subset of: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--intervals", default="1d", help="Comma-separated subset of 1d,15m,1m")
+    parser.add_argument("--symbols", type=_int_list, default=[6], help="Symbol counts, e.g. 6,12,24")
+    parser.add_argument("--bars", type=_int_list, default=[500, 2000], help="Bar counts, e.g. 500,2000,8000")
+    parser.add_argument("--pairs", type=_int_list, default=[0],
+                        help="Pair counts for per-pair benchmarks (0 = all cointegrated pairs)")
+    parser.add_argument("--cluster-size", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc pass")
+    parser.add_argument("--label", default="run")
+    parser.add_argument("--compare", help="Baseline JSON to compare this run against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Slowdown ratio flagged as a regression")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    benchmarks = [b for b in args.benchmarks.split(",") if b]
+    unknown = set(benchmarks) - set(BENCHMARKS)
+    if unknown:
+        raise SystemExit(f"[BENCH] - Unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    results = run_suite(benchmarks, args.intervals.split(","), args.symbols, args.bars, args.pairs,
+                        cluster_size=args.cluster_size, repeat=args.repeat,
+                        memory=not args.no_memory, seed=args.seed)
+    path = save_results(results, label=args.label)
+
+    if args.compare:
+        regressions = compare_results(args.compare, path, threshold=args.threshold)
+        if regressions:
+            print(f"\n[BENCH] - {len(regressions)} regression(s) above {args.threshold:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
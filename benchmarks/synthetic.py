@@ -0,0 +1,153 @@
+# benchmarks/synthetic.py — Deterministic synthetic market with cointegrated legs
+
+import os
+import json
+import numpy as np
+import pandas as pd
+
+# Bar spacing per supported interval; intraday bars skip weekends.
+INTERVAL_FREQ = {
+    "1d": "B",
+    "15m": "15min",
+    "1m": "1min",
+}
+
+# Annualised volatility scaled to one bar of each interval.
+BARS_PER_YEAR = {
+    "1d": 252,
+    "15m": 252 * 23 * 4,
+    "1m": 252 * 23 * 60,
+}
+
+
+def make_index(n_bars, interval="1d", start="2023-01-02"):
+    """Build a weekday-only DatetimeIndex with exactly n_bars entries."""
+    if interval not in INTERVAL_FREQ:
+        raise ValueError(f"[SYNTH] - Unsupported interval '{interval}'")
+    freq = INTERVAL_FREQ[interval]
+    if freq == "B":
+        return pd.bdate_range(start=start, periods=n_bars, name="Date")
+
+    # Oversample by the weekend ratio, then drop Saturdays and Sundays.
+    idx = pd.date_range(start=start, periods=int(n_bars * 7 / 5) + 2 * 24 * 60, freq=freq)
+    idx = idx[idx.dayofweek < 5][:n_bars]
+    return pd.DatetimeIndex(idx, name="Date")
+
+
+def ou_process(rng, n_bars, half_life, sigma):
+    """Ornstein–Uhlenbeck path with the given half-life (in bars)."""
+    phi = np.exp(-np.log(2) / half_life)
+    shocks = rng.standard_normal(n_bars) * sigma
+    path = np.empty(n_bars)
+    path[0] = shocks[0]
+    for t in range(1, n_bars):
+        path[t] = phi * path[t - 1] + shocks[t]
+    return path
+
+
+def generate_market(n_symbols, n_bars, interval="1d", cluster_size=3, seed=42,
+                    annual_vol=0.30, spread_vol=0.002, half_life=None, start="2023-01-02"):
+    """
+    Generate OHLCV frames for n_symbols synthetic futures.
+
+    Symbols are grouped in clusters of cluster_size. Every leg of a cluster
+    follows the cluster's random-walk factor (scaled by a leg-specific beta)
+    plus its own OU deviation, so pairs within a cluster are cointegrated
+    and pairs across clusters are not.
+
+    Returns:
+        dict[str, pd.DataFrame]: symbol -> frame indexed by "Date" with
+        Open, High, Low, Close and Volume columns, as written by the loader.
+    """
+    rng = np.random.default_rng(seed)
+    index = make_index(n_bars, interval, start=start)
+    bar_vol = annual_vol / np.sqrt(BARS_PER_YEAR[interval])
+    half_life = half_life or max(5.0, n_bars / 50)
+
+    market = {}
+    n_clusters = int(np.ceil(n_symbols / cluster_size))
+    for c in range(n_clusters):
+        factor = np.cumsum(rng.standard_normal(n_bars) * bar_vol)
+        level = np.log(rng.uniform(20, 200))
+        for k in range(cluster_size):
+            i = c * cluster_size + k
+            if i >= n_symbols:
+                break
+            beta = rng.uniform(0.6, 1.4)
+            log_close = level + rng.normal(0, 0.2) + beta * factor + \
+                ou_process(rng, n_bars, half_life, spread_vol)
+            close = np.exp(log_close)
+
+            open_ = np.empty(n_bars)
+            open_[0] = close[0]
+            open_[1:] = close[:-1]
+            wick = np.abs(rng.standard_normal(n_bars)) * bar_vol * close
+            high = np.maximum(open_, close) + wick
+            low = np.minimum(open_, close) - wick
+            volume = rng.integers(100, 10_000, size=n_bars)
+
+            market[f"S{i:03d}"] = pd.DataFrame({
+                "Open": open_,
+                "High": high,
+                "Low": low,
+                "Close": close,
+                "Volume": volume,
+            }, index=index)
+    return market
+
+
+def cluster_pairs(market, cluster_size=3):
+    """Pairs of symbols sharing a cluster, i.e. the cointegrated pairs."""
+    symbols = sorted(market)
+    pairs = []
+    for start in range(0, len(symbols), cluster_size):
+        group = symbols[start:start + cluster_size]
+        for a in range(len(group)):
+            for b in range(a + 1, len(group)):
+                pairs.append((group[a], group[b]))
+    return pairs
+
+
+def write_market(market, root, interval="1d"):
+    """Write frames in the loader's layout: {root}/data/raw/{interval}/{symbol}.csv."""
+    folder = os.path.join(root, "data", "raw", interval)
+    os.makedirs(folder, exist_ok=True)
+    for symbol, df in market.items():
+        df.to_csv(os.path.join(folder, f"{symbol}.csv"))
+    return folder
+
+
+def write_workspace(market, root, interval="1d", cluster_size=3, capital=1_000_000, pair_mode="intra"):
+    """
+    Lay out a self-contained project directory (config + raw data) so the
+    entry points can run against synthetic data from root as cwd.
+    """
+    symbols = sorted(market)
+    books = {}
+    for start in range(0, len(symbols), cluster_size):
+        books[f"book{start // cluster_size}"] = symbols[start:start + cluster_size]
+
+    budget = capital / max(len(books), 1)
+    config = {
+        "start_date": str(next(iter(market.values())).index[0].date()),
+        "data_interval": interval,
+        "capital": capital,
+        "slippage_pct": 0.001,
+        "capital_allocation": {
+            book: {"budget": budget, "contracts": contracts} for book, contracts in books.items()
+        },
+        "excluded_pairs": [],
+        "pair_mode": pair_mode,
+    }
+
+    os.makedirs(os.path.join(root, "config"), exist_ok=True)
+    with open(os.path.join(root, "config", "config.json"), "w") as f:
+        json.dump(config, f, indent=4)
+    with open(os.path.join(root, "config", "contracts.json"), "w") as f:
+        json.dump({s: f"{s}=F" for s in symbols}, f, indent=4)
+
+    write_market(market, root, interval)
+    if interval != "1d":
+        # The optimizer and ranker read daily files regardless of config.
+        write_market(market, root, "1d")
+    return config
@@ -0,0 +1,373 @@
+# cli.py — Single entry point; heavy dependencies are imported inside each subcommand
+
+import os
+import sys
+import json
+import argparse
+
+from utils.config import load_config, config_symbols, candidate_pairs
+
+
+def cmd_backtest(args, config):
+    if args.queue:
+        from utils.sharding import sharded_backtest
+
+        sharded_backtest(args.queue, config=config, workers=args.workers, stale_timeout=args.stale_timeout,
+                         timeout=args.timeout)
+        return
+
+    from main import run_portfolio
+
+    run_portfolio(config=config, profile=args.profile, cprofile=args.cprofile, tracemalloc=args.tracemalloc,
+                  resume=args.resume)
+
+
+def cmd_optimize(args, config):
+    if args.queue:
+        from utils.sharding import sharded_optimize
+
+        sharded_optimize(args.queue, config=config, workers=args.workers,
+                         stale_timeout=args.stale_timeout, timeout=args.timeout, output_path=args.output)
+        return
+
+    from utils.optimize_spread_parameters import optimize
+
+    optimize(config=config, output_path=args.output, resume=args.resume)
+
+
+def cmd_worker(args, config):
+    from utils.sharding import worker
+
+    worker(args.queue_dir, heartbeat_interval=args.heartbeat, idle_timeout=args.idle_timeout,
+           max_units=args.max_units)
+
+
+def cmd_rank(args, config):
+    from utils.rank_spread_candidates import compute_metrics, rank_pairs, plot_heatmap
+
+    symbols = args.symbols or config_symbols(config)
+    df = compute_metrics(symbols)
+    if df.empty:
+        print("[RANKER] - No pairs could be evaluated.")
+        return
+    ranked = rank_pairs(df, top_n=args.top_n)
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    ranked.to_csv(args.output, index=False)
+    print(f"\n[RANKER] - Top spread candidates saved to {args.output}")
+    print(ranked[["pair", "correlation", "cointegration_pval", "combined_score"]])
+    if not args.no_heatmap:
+        plot_heatmap(df, symbols)
+
+
+def cmd_screen(args, config):
+    from utils.data_loader import load_bars
+    from utils.pair_screening import screening_settings, screen_pairs, summarize
+
+    interval = config.get("data_interval", "1d")
+    resample = config.get("resample", {})
+    symbol_data = {}
+    for symbol in config_symbols(config):
+        try:
+            symbol_data[symbol] = load_bars(symbol, interval=interval, resample=resample.get("enabled", True),
+                                            session_start=resample.get("session_start"))
+        except FileNotFoundError as e:
+            print(e)
+    pairs = [p for p in candidate_pairs(config, verbose=False) if p[0] in symbol_data and p[1] in symbol_data]
+
+    settings = screening_settings(config)
+    if args.top_n is not None:
+        settings["top_n"] = args.top_n
+    _, scores = screen_pairs(symbol_data, pairs, settings)
+    summarize(scores, path=args.output)
+
+
+def cmd_download(args, config):
+    from utils.download_all_contracts import download_all
+
+    download_all(
+        start_date=args.start or config.get("start_date", "2023-01-01"),
+        interval=args.interval or config.get("data_interval", "1d"),
+        symbols=args.symbols,
+    )
+
+
+def cmd_risk(args, config):
+    from risk.compare_subbook_risk import compare_subbook_risks
+
+    interval = args.interval or config.get("data_interval", "1d")
+    subbooks = {book: info["contracts"] for book, info in config["capital_allocation"].items()}
+    os.makedirs("data/processed", exist_ok=True)
+    compare_subbook_risks(subbooks, price_data_dir=os.path.join("data", "raw", interval))
+
+
+def cmd_stress(args, config):
+    from risk.stress import stress_test
+
+    stress_test(config, horizon=args.horizon, windows=args.windows,
+                assume_open=True if args.assume_open else None)
+
+
+def cmd_attribution(args, config):
+    from risk.attribution import attribution_report
+
+    attribution_report(config, source=args.source, window=args.window, step=args.step)
+
+
+def cmd_results(args, config):
+    from utils.results_db import ResultsDB, results_db_settings
+
+    with ResultsDB(results_db_settings(config)["path"]) as db:
+        if args.query == "runs":
+            df = db.runs(args.kind)
+        elif args.query == "best-params":
+            df = db.best_params(args.metric, pair=args.pair, run_ids=args.run)
+        elif args.query == "subbook-pnl":
+            df = db.subbook_pnl(args.freq, run_id=args.run[0] if args.run else None)
+        elif args.query == "pair-pnl":
+            df = db.pair_pnl_by_run(args.pair)
+        else:
+            df = db.trades(args.run[0] if args.run else None, pair=args.pair, subbook=args.subbook)
+    print(df.to_string())
+
+
+def cmd_daemon(args, config):
+    from utils.research_daemon import daemon_settings, serve, request
+
+    if args.action == "start":
+        serve(config, host=args.host, port=args.port, workers=args.workers, config_path=args.config)
+        return
+    settings = daemon_settings(config)
+    settings.update({k: v for k, v in (("host", args.host), ("port", args.port)) if v})
+    if args.action == "status":
+        payload = request(settings, "status")
+    elif args.action == "jobs":
+        payload = request(settings, "jobs")
+    else:
+        payload = request(settings, args.action, {}, timeout=None if args.action == "reload" else 30)
+    print(json.dumps(payload, indent=2))
+
+
+def _parse_value(text):
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return text
+
+
+def _print_rows(rows, columns):
+    rows = [[_format_cell(row.get(c)) for c in columns] for row in rows]
+    widths = [max([len(c)] + [len(r[i]) for r in rows]) for i, c in enumerate(columns)]
+    print("  ".join(c.rjust(w) for c, w in zip(columns, widths)))
+    for r in rows:
+        print("  ".join(v.rjust(w) for v, w in zip(r, widths)))
+
+
+def _format_cell(value):
+    return f"{value:.4f}" if isinstance(value, float) else str(value)
+
+
+def cmd_submit(args, config):
+    from utils.research_daemon import daemon_settings, submit
+
+    settings = daemon_settings(config)
+    settings.update({k: v for k, v in (("host", args.host), ("port", args.port)) if v})
+    params = {}
+    if args.pairs:
+        params["pairs"] = args.pairs
+    if args.set:
+        params["params"] = {k: _parse_value(v) for k, v in (item.split("=", 1) for item in args.set)}
+    if args.grid:
+        params["grid"] = json.loads(args.grid)
+    if args.kind == "rank":
+        params["top_n"] = args.top_n
+        if args.symbols:
+            params["symbols"] = args.symbols
+    if args.no_record:
+        params["record"] = False
+
+    def progress(event):
+        if event["event"] == "progress":
+            print(f"[CLIENT] - job {event['job']}: {event['done']}/{event['total']}")
+        elif event["event"] == "unit_failed":
+            print(f"[CLIENT] - job {event['job']}: unit {event['unit']} failed: {event['error']}")
+
+    job = submit(settings, args.kind, params, wait=not args.no_wait, on_event=progress)
+    if args.no_wait:
+        print(f"[CLIENT] - Submitted job {job['id']} ({args.kind})")
+        return
+    if job["status"] != "done":
+        print(f"[CLIENT] - Job {job['id']} {job['status']}: {job['error']}")
+        return 1
+
+    result = job["result"]
+    if args.kind == "backtest":
+        _print_rows(result["pairs"], ["pair", "subbook", "realized_pnl", "unrealized_pnl", "total_pnl"])
+        if result["portfolio"]:
+            p = result["portfolio"]
+            print(f"\n[CLIENT] - Portfolio value {p['portfolio_value']:,.2f} | trades {p['total_trades']} "
+                  f"| win rate {p['win_rate']:.2%}")
+    elif args.kind == "optimize":
+        _print_rows(result["best"], ["pair", "subbook", "z_entry", "z_exit", "lookback", "sharpe", "return_pct"])
+        print(f"\n[CLIENT] - {result['points']} grid point(s) evaluated")
+    else:
+        _print_rows(result["ranked"], ["pair", "correlation", "cointegration_pval", "combined_score"])
+    if result.get("run_id"):
+        print(f"[CLIENT] - Stored as results-db run {result['run_id']}")
+    print(f"[CLIENT] - Job {job['id']} finished in {job['elapsed']:.2f}s")
+
+
+def cmd_pairs(args, config):
+    pairs = candidate_pairs(config, verbose=False)
+    for s1, s2, book1, book2 in pairs:
+        tag = book1 if book1 == book2 else f"{book1}/{book2}"
+        print(f"{s1} - {s2}\t{tag}")
+    print(f"[CLI] - {len(pairs)} pairs (pair_mode={config.get('pair_mode', 'intra')})")
+
+
+def cmd_check(args, config):
+    from utils.data_loader import resample_source
+
+    interval = args.interval or config.get("data_interval", "1d")
+    missing = 0
+    for symbol in config_symbols(config):
+        path = os.path.join("data", "raw", interval, f"{symbol}.csv")
+        base = None if os.path.exists(path) else resample_source(symbol, interval)
+        if os.path.exists(path):
+            print(f"  {symbol:<6} ok       {os.path.getsize(path) / 1e6:8.2f} MB  {path}")
+        elif base is not None:
+            print(f"  {symbol:<6} derived  from {base} bars in data/raw/{base}/")
+        else:
+            missing += 1
+            print(f"  {symbol:<6} MISSING  {path}")
+    print(f"[CLI] - {missing} missing file(s) for interval '{interval}'")
+    return 1 if missing else 0
+
+
+def add_shard_args(p):
+    p.add_argument("--queue", metavar="DIR", help="Shard work units into this queue directory (shared filesystem)")
+    p.add_argument("--workers", type=int, default=0, help="Local worker processes to start with --queue")
+    p.add_argument("--stale-timeout", type=float, default=120.0,
+                   help="Re-queue claims without a heartbeat for this many seconds")
+    p.add_argument("--timeout", type=float, help="Give up if units are still unfinished after this many seconds")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="cli.py", description="Cross-commodities research framework")
+    parser.add_argument("--config", default="config/config.json", help="Path to config.json")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("backtest", help="Run the portfolio backtest")
+    p.add_argument("--profile", action="store_true", default=None, help="Time each run stage and pair")
+    p.add_argument("--cprofile", action="store_true", default=None, help="Also capture cProfile stats")
+    p.add_argument("--tracemalloc", action="store_true", default=None, help="Also track peak memory per stage")
+    p.add_argument("--resume", action="store_true", help="Continue from the last checkpoint (see config: checkpoint)")
+    add_shard_args(p)
+    p.set_defaults(func=cmd_backtest)
+
+    p = sub.add_parser("optimize", help="Grid-search spread parameters per pair")
+    p.add_argument("--output", default="data/processed/best_pair_parameters.csv")
+    p.add_argument("--resume", action="store_true", help="Skip grid points completed by an interrupted run")
+    add_shard_args(p)
+    p.set_defaults(func=cmd_optimize)
+
+    p = sub.add_parser("worker", help="Claim and run units from a sharded backtest/optimize queue")
+    p.add_argument("queue_dir")
+    p.add_argument("--heartbeat", type=float, default=10.0, help="Seconds between claim heartbeats")
+    p.add_argument("--idle-timeout", type=float, default=5.0, help="Exit after the queue is empty this long")
+    p.add_argument("--max-units", type=int, help="Exit after this many units")
+    p.set_defaults(func=cmd_worker)
+
+    p = sub.add_parser("rank", help="Rank spread candidates by correlation + cointegration")
+    p.add_argument("--symbols", nargs="+", help="Symbols to rank (default: configured contracts)")
+    p.add_argument("--top-n", type=int, default=10)
+    p.add_argument("--output", default="data/processed/top_spread_candidates.csv")
+    p.add_argument("--no-heatmap", action="store_true")
+    p.set_defaults(func=cmd_rank)
+
+    p = sub.add_parser("screen", help="Score candidate pairs (correlation, cointegration, half-life, overlap)")
+    p.add_argument("--top-n", type=int, help="Override screening.top_n from config")
+    p.add_argument("--output", default="data/processed/pair_screening.csv")
+    p.set_defaults(func=cmd_screen)
+
+    p = sub.add_parser("download", help="Download contract data from Yahoo Finance")
+    p.add_argument("--interval", help="Bar interval (default: data_interval from config)")
+    p.add_argument("--start", help="Start date (default: start_date from config)")
+    p.add_argument("--symbols", nargs="+", help="Symbols to download (default: all in contracts.json)")
+    p.set_defaults(func=cmd_download)
+
+    p = sub.add_parser("risk", help="Compare risk metrics across subbooks")
+    p.add_argument("--interval", help="Bar interval (default: data_interval from config)")
+    p.set_defaults(func=cmd_risk)
+
+    p = sub.add_parser("stress", help="Apply the stress scenario library to open spread positions")
+    p.add_argument("--horizon", type=int, help="Bars per scenario path (default: stress.horizon)")
+    p.add_argument("--windows", type=int, help="Historical windows per scenario (default: stress.windows)")
+    p.add_argument("--assume-open", action="store_true", help="Stress every pair, not only those past z_entry")
+    p.set_defaults(func=cmd_stress)
+
+    p = sub.add_parser("attribution", help="Rolling risk contribution per pair and subbook from spread PnL")
+    p.add_argument("--source", choices=["snapshot", "trades"],
+                   help="Current positions or the last backtest's trades (default: attribution.source)")
+    p.add_argument("--window", type=int, help="Bars per covariance window (default: attribution.window)")
+    p.add_argument("--step", type=int, help="Bars between window ends (default: attribution.step)")
+    p.set_defaults(func=cmd_attribution)
+
+    p = sub.add_parser("results", help="Query the results database across runs")
+    p.add_argument("query", choices=["runs", "best-params", "subbook-pnl", "pair-pnl", "trades"])
+    p.add_argument("--run", type=int, action="append", help="Run id (repeat for best-params; default: latest/all)")
+    p.add_argument("--pair", help="Restrict to one pair")
+    p.add_argument("--subbook", help="Restrict trades to one subbook")
+    p.add_argument("--kind", choices=["backtest", "optimize"], help="Filter runs by kind")
+    p.add_argument("--metric", default="sharpe", choices=["sharpe", "return_pct", "drawdown"])
+    p.add_argument("--freq", default="month", choices=["day", "month", "year"])
+    p.set_defaults(func=cmd_results)
+
+    p = sub.add_parser("daemon", help="Run or control the research daemon (warm data, pooled jobs)")
+    p.add_argument("action", choices=["start", "status", "jobs", "reload", "shutdown"])
+    p.add_argument("--host", help="Bind/connect address (default: daemon.host)")
+    p.add_argument("--port", type=int, help="Port (default: daemon.port)")
+    p.add_argument("--workers", type=int, help="Pool size for start (default: daemon.workers)")
+    p.set_defaults(func=cmd_daemon)
+
+    p = sub.add_parser("submit", help="Send a backtest/optimize/rank job to the research daemon")
+    p.add_argument("kind", choices=["backtest", "optimize", "rank"])
+    p.add_argument("--pairs", nargs="+", metavar="PAIR", help='Restrict to pairs, e.g. "CL - HO"')
+    p.add_argument("--set", nargs="+", metavar="KEY=VALUE", help="Strategy parameter overrides, e.g. z_entry=1.5")
+    p.add_argument("--grid", help="Optimizer grid as JSON, e.g. '[[1.0, 0.25, 20]]'")
+    p.add_argument("--symbols", nargs="+", help="Symbols for rank (default: all configured)")
+    p.add_argument("--top-n", type=int, default=10)
+    p.add_argument("--no-record", action="store_true", help="Do not store the run in the results DB")
+    p.add_argument("--no-wait", action="store_true", help="Return after submitting instead of streaming progress")
+    p.add_argument("--host")
+    p.add_argument("--port", type=int)
+    p.set_defaults(func=cmd_submit)
+
+    p = sub.add_parser("pairs", help="List the pairs admitted by pair_mode and excluded_pairs")
+    p.set_defaults(func=cmd_pairs)
+
+    p = sub.add_parser("check", help="Check that raw data exists for every configured contract")
+    p.add_argument("--interval", help="Bar interval (default: data_interval from config)")
+    p.set_defaults(func=cmd_check)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    config = load_config(args.config)
+    try:
+        return args.func(args, config) or 0
+    except (ConnectionError, RuntimeError) as e:
+        if args.func not in (cmd_daemon, cmd_submit):
+            raise
+        print(e)
+        return 1
+    except TimeoutError as e:
+        if not getattr(args, "queue", None):
+            raise
+        print(e)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
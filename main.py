@@ -1,71 +1,137 @@
 # main.py — Unified day-by-day simulation with pair filtering
 
 import os
-import json
+import argparse
 import pandas as pd
 import backtrader as bt
-from itertools import combinations
-from utils.data_loader import load_csv, download_data, save_to_csv
+from utils.data_loader import load_bars, download_data, save_to_csv
+from utils.config import load_config, load_symbol_map, config_symbols, candidate_pairs, pair_strategy_params
+from utils.config import find_subbook as config_find_subbook, subbook_index
 from strategies.spread_pair_strategy import SpreadPairStrategy
 from risk.risk_metrics import compute_risk_metrics
 from risk.concentration import herfindahl_index, diversification_ratio
-import statsmodels.api as sm
+from risk.limits import RiskLimitMonitor
 from portfolio.allocator import CapitalAllocator
-
-# Load config
-with open("config/config.json") as f:
-    config = json.load(f)
-
-symbol_map_path = config.get("symbol_map_path", "config/contracts.json")
-with open(symbol_map_path) as f:
-    symbol_map = json.load(f)
-
-start_date = config.get("start_date", "2023-01-01")
-initial_capital = config.get("capital", 10_000_000)
-slippage_pct = config.get("slippage_pct", 0.001)
-excluded_pairs = set(config.get("excluded_pairs", []))
-
-capital_allocation = config["capital_allocation"]
-symbols = sum([entry["contracts"] for entry in capital_allocation.values()], [])
-data_interval = config.get("data_interval", "1d")
+from utils.profiling import RunProfiler, NullProfiler
+from utils.pair_screening import screening_settings, screen_pairs, data_version
+from utils.streaming import StreamingCSVData, aligned_closes, raw_path
+from utils.results_db import record_backtest_outputs
+from utils.checkpoint import (BacktestCheckpoint, checkpoint_settings, backtest_checkpoint_dir, run_fingerprint,
+                              clear_checkpoint)
 
 log_path = "data/processed/failed_spreads.log"
-os.makedirs(os.path.dirname(log_path), exist_ok=True)
-os.makedirs("data/processed", exist_ok=True)
-os.makedirs("data/processed/zscore", exist_ok=True)
 
-def get_data(symbol):
+def get_data(symbol, config=None, download=True):
+    """Bars for symbol at the configured interval; downloaded and saved when missing, unless download=False."""
+    config = config if config is not None else load_config()
+    data_interval = config.get("data_interval", "1d")
+    resample = config.get("resample", {})
     try:
-        return load_csv(symbol, interval=data_interval)
+        return load_bars(symbol, interval=data_interval, resample=resample.get("enabled", True),
+                         session_start=resample.get("session_start"))
     except FileNotFoundError:
-        yf_symbol = symbol_map.get(symbol)
+        if not download:
+            raise
+        yf_symbol = load_symbol_map(config).get(symbol)
         print(f"[MAIN] - Downloading {symbol} ({yf_symbol}) with interval '{data_interval}'...")
-        df = download_data(yf_symbol, start=start_date, interval=data_interval)
+        df = download_data(yf_symbol, start=config.get("start_date", "2023-01-01"), interval=data_interval)
         save_to_csv(df, symbol, interval=data_interval)
         return df
 
-def estimate_beta(asset1_series, asset2_series):
-    model = sm.OLS(asset1_series, sm.add_constant(asset2_series)).fit()
-    return model.params.iloc[1]
+def find_subbook(symbol, config=None):
+    book = config_find_subbook(symbol, config if config is not None else load_config())
+    if book is None:
+        print(f"[MAIN] - Symbol {symbol} not found in any subbook.")
+    return book
+
+def pair_strategy_kwargs(config, s1, s2, book1, **extra):
+    """SpreadPairStrategy kwargs for one pair: portfolio defaults, then config overrides."""
+    subbook_budget = config["capital_allocation"].get(book1, {}).get("budget", config.get("capital", 10_000_000))
+    strategy_params = dict(
+        asset1_name=s1,
+        asset2_name=s2,
+        spread_lookback=60,
+        z_entry=2.0,
+        z_exit=0.5,
+        slippage_pct=config.get("slippage_pct", 0.001),
+        stop_loss_multiple=3.0,
+        subbook_name=book1,
+        subbook_start_capital=subbook_budget,
+        rolling_beta=True,
+        beta_static=1.0,
+        beta_lookback=20,
+        use_log_spread=True,
+        max_holding_period=5 * 24 * 4,  # ~5 days at 15-min bars
+        volatility_filter=True,
+        volatility_lookback=50,
+        max_volatility=5.0,
+        **extra
+    )
+    strategy_params.update(pair_strategy_params(config, s1, s2))
+    return strategy_params
+
+def save_risk_metrics(symbol_data, path="data/processed/portfolio_risk_metrics.csv"):
+    price_data = pd.DataFrame({s: symbol_data[s]["Close"] for s in symbol_data}).dropna()
 
-def find_subbook(symbol):
-    for book, info in capital_allocation.items():
-        if symbol in info["contracts"]:
-            return book
-    print(f"[MAIN] - Symbol {symbol} not found in any subbook.")
-    return None
+    allocator = CapitalAllocator(price_data)
+    weights = allocator.equal_weight()
+
+    risk = compute_risk_metrics(price_data, weights)
+    risk["Herfindahl Index"] = herfindahl_index(weights)
+    risk["Diversification Ratio"] = diversification_ratio(price_data, weights)
+    risk.to_csv(path)
+    return risk
+
+def run_portfolio(config=None, profile=None, cprofile=None, tracemalloc=None, resume=False):
+    """
+    Run the full portfolio backtest.
+
+    config defaults to the cached config/config.json.
+
+    With checkpoint.enabled (or resume=True) the run is checkpointed
+    periodically; resume=True continues from the last checkpoint of the
+    same config and data, with the same final results as an uninterrupted
+    run. The checkpoint is removed once the run completes.
+
+    profile/cprofile/tracemalloc override the "profiling" section of the
+    config; when profiling is enabled a ranked stage report is printed and
+    saved as JSON under data/processed/profiling/.
+    """
+    config = config if config is not None else load_config()
+    initial_capital = config.get("capital", 10_000_000)
+    slippage_pct = config.get("slippage_pct", 0.001)
+    capital_allocation = config["capital_allocation"]
+
+    os.makedirs("data/processed", exist_ok=True)
+    os.makedirs("data/processed/zscore", exist_ok=True)
+
+    profiling = config.get("profiling", {})
+    profile = profiling.get("enabled", False) if profile is None else profile
+    if profile:
+        profiler = RunProfiler(
+            cprofile=profiling.get("cprofile", False) if cprofile is None else cprofile,
+            memory=profiling.get("tracemalloc", False) if tracemalloc is None else tracemalloc,
+        )
+    else:
+        profiler = NullProfiler()
+    profiler.start()
 
-def run_portfolio():
     for file in [
         'data/processed/spread_trades.csv',
         'data/processed/portfolio_risk_metrics.csv',
         'data/processed/portfolio_summary.csv',
-        'data/processed/pairwise_pnl_summary.csv'
+        'data/processed/pairwise_pnl_summary.csv',
+        'data/processed/risk_limits.csv'
     ]:
         if os.path.exists(file):
             os.remove(file)
 
-    cerebro = bt.Cerebro()
+    streaming = config.get("streaming", {})
+    if streaming.get("enabled", False):
+        # exactbars keeps backtrader's line buffers bounded as well.
+        cerebro = bt.Cerebro(exactbars=streaming.get("exactbars", 1))
+    else:
+        cerebro = bt.Cerebro()
     cerebro.broker.set_cash(initial_capital)
 
     print("\n[MAIN] - Initial Capital Allocation per Subbook:")
@@ -73,137 +139,143 @@ def run_portfolio():
         print(f"  [MAIN] - {book.capitalize()}: {info['budget']:,.2f}")
 
     symbol_data = {}
-    for symbol in set(symbols):
-        df = get_data(symbol)
-        feed = bt.feeds.PandasData(dataname=df, name=symbol)
-        cerebro.adddata(feed)
+    streamed = []
+    for symbol in config_symbols(config):
+        if streaming.get("enabled", False) and os.path.exists(raw_path(symbol, config.get("data_interval", "1d"))):
+            with profiler.stage("build_feeds"):
+                cerebro.adddata(StreamingCSVData(symbol=symbol, interval=config.get("data_interval", "1d"),
+                                                 chunksize=streaming.get("chunksize", 100_000), name=symbol))
+            streamed.append(symbol)
+            continue
+        with profiler.stage("get_data"):
+            df = get_data(symbol, config)
+        with profiler.stage("build_feeds"):
+            feed = bt.feeds.PandasData(dataname=df, name=symbol)
+            cerebro.adddata(feed)
         symbol_data[symbol] = df
 
-    pairs = list(combinations(set(symbols), 2))
-    pair_mode = config.get("pair_mode", "intra")
+    if streamed:
+        # Screening and risk metrics only need closes; read them through the chunked k-way merge.
+        with profiler.stage("get_data"):
+            closes = aligned_closes(streamed, config.get("data_interval", "1d"), streaming.get("chunksize", 100_000))
+        for symbol in streamed:
+            symbol_data[symbol] = closes[symbol].dropna().to_frame("Close")
+        symbol_data = {symbol: symbol_data[symbol] for symbol in config_symbols(config)}
 
-    for s1, s2 in pairs:
-        book1 = find_subbook(s1)
-        book2 = find_subbook(s2)
+    pairs = candidate_pairs(config)
+    screening = screening_settings(config)
+    if screening["enabled"]:
+        with profiler.stage("screening"):
+            pairs, scores = screen_pairs(symbol_data, pairs, screening)
+            scores.to_csv("data/processed/pair_screening.csv", index=False)
 
-        pair_name = f"{s1} - {s2}"
-        reverse_pair = f"{s2} - {s1}"
-
-        if pair_name in excluded_pairs or reverse_pair in excluded_pairs:
-            print(f"[MAIN] - Skipping excluded pair: {pair_name}")
-            continue
-
-        if book1 is None or book2 is None:
-            print(f"[MAIN] - Skipping pair {s1}-{s2} | book1={book1}, book2={book2}")
-            continue
-
-        if pair_mode == "intra" and book1 != book2:
-            continue
-        elif pair_mode == "cross" and book1 == book2:
-            continue
-        elif pair_mode not in ["intra", "cross", "all"]:
-            print(f"[MAIN] - Invalid pair_mode '{pair_mode}' in config. Skipping pair {s1}-{s2}.")
-            continue
+    risk_monitor = RiskLimitMonitor.from_config(config)
 
+    for s1, s2, book1, book2 in pairs:
         try:
-            df1 = symbol_data[s1]
-            df2 = symbol_data[s2]
-            common_idx = df1.index.intersection(df2.index)
-            beta = estimate_beta(df1.loc[common_idx, "Close"], df2.loc[common_idx, "Close"])
-
-            subbook_budget = capital_allocation.get(book1, {}).get("budget", initial_capital)
-            cerebro.addstrategy(
-                SpreadPairStrategy,
-                asset1_name=s1,
-                asset2_name=s2,
-                spread_lookback=60,
-                z_entry=2.0,
-                z_exit=0.5,
-                slippage_pct=slippage_pct,
-                stop_loss_multiple=3.0,
-                subbook_name=book1,
-                subbook_start_capital=subbook_budget,
-                rolling_beta=True,
-                beta_static=1.0,
-                beta_lookback=20,
-                use_log_spread=True,
-                max_holding_period=5 * 24 * 4,  # ~5 days at 15-min bars
-                volatility_filter=True,
-                volatility_lookback=50,
-                max_volatility=5.0
-            )
+            strategy_params = pair_strategy_kwargs(config, s1, s2, book1,
+                                                   profiler=profiler if profile else None,
+                                                   risk_monitor=risk_monitor)
+            with profiler.stage("strategy_setup"):
+                cerebro.addstrategy(SpreadPairStrategy, **strategy_params)
 
         except Exception as e:
             with open(log_path, "a") as f:
                 f.write(f"[MAIN] - Failed pair {s1}-{s2}: {str(e)}\n")
 
+    checkpoint = checkpoint_settings(config)
+    if checkpoint["enabled"] or resume:
+        cerebro.addstrategy(
+            BacktestCheckpoint,
+            directory=backtest_checkpoint_dir(checkpoint),
+            fingerprint=run_fingerprint(config, [list(p) for p in pairs],
+                                        data_version(symbol_data, list(symbol_data))),
+            interval_s=checkpoint["interval_s"],
+            every_bars=checkpoint["every_bars"],
+            resume=resume,
+        )
+
     cerebro.addanalyzer(bt.analyzers.SharpeRatio, _name="sharpe")
     cerebro.addanalyzer(bt.analyzers.DrawDown, _name="drawdown")
     cerebro.addanalyzer(bt.analyzers.Returns, _name="returns")
 
-    results = cerebro.run()
+    with profiler.stage("cerebro_run"):
+        results = cerebro.run()
     strat = results[0]
-
-    if os.path.exists("data/processed/spread_trades.csv"):
-        df_trades = pd.read_csv("data/processed/spread_trades.csv")
-        subbook_pnls = {book: 0.0 for book in capital_allocation}
-
-        for _, row in df_trades.iterrows():
-            symbol_pair = row['symbol']
-            s1, s2 = symbol_pair.split(" - ")
-            book = find_subbook(s1)
-            if book:
-                subbook_pnls[book] += row["pnl"]
-
-        print("\n[MAIN] - Final Subbook Results:")
-        final_total = 0.0
-        for book, pnl in subbook_pnls.items():
-            start_cap = capital_allocation[book]["budget"]
-            final_cap = start_cap + pnl
-            final_total += final_cap
-            print(f"  [MAIN] - {book.capitalize()}: Start = {start_cap:,.2f}, PnL = {pnl:,.2f}, Final = {final_cap:,.2f}")
-
-        print(f"\n[MAIN] - Portfolio Final Value: {final_total:,.2f}")
-
-        if not df_trades.empty and "pnl" in df_trades.columns:
-            sharpe = strat.analyzers.sharpe.get_analysis().get("sharperatio", None)
-            drawdown = strat.analyzers.drawdown.get_analysis()["max"]["drawdown"]
-            ret = strat.analyzers.returns.get_analysis().get("rtot", None)
-            final_value = cerebro.broker.getvalue()
-
-            wins = (df_trades["pnl"] > 0).sum()
-            losses = (df_trades["pnl"] <= 0).sum()
-            total = wins + losses
-            win_rate = wins / total if total else 0
-            loss_rate = losses / total if total else 0
-
-            summary_df = pd.DataFrame([{
-                "portfolio_value": final_value,
-                "sharpe": sharpe,
-                "drawdown": drawdown,
-                "return_pct": ret,
-                "total_trades": total,
-                "wins": wins,
-                "losses": losses,
-                "win_rate": win_rate,
-                "loss_rate": loss_rate
-            }])
-            summary_df.to_csv("data/processed/portfolio_summary.csv", index=False)
-            print("\n[MAIN] - Portfolio Summary saved to data/processed/portfolio_summary.csv")
-
-    price_data = pd.DataFrame({s: symbol_data[s]["Close"] for s in symbol_data}).dropna()
-    returns = price_data.pct_change().dropna()
-
-    allocator = CapitalAllocator(price_data)
-    weights = allocator.equal_weight()
-
-    risk = compute_risk_metrics(price_data, weights)
-    risk["Herfindahl Index"] = herfindahl_index(weights)
-    risk["Diversification Ratio"] = diversification_ratio(price_data, weights)
-    risk.to_csv("data/processed/portfolio_risk_metrics.csv")
+    if checkpoint["enabled"] or resume:
+        clear_checkpoint(backtest_checkpoint_dir(checkpoint))
+
+    with profiler.stage("summary"):
+        if os.path.exists("data/processed/spread_trades.csv"):
+            df_trades = pd.read_csv("data/processed/spread_trades.csv")
+            subbook_pnls = {book: 0.0 for book in capital_allocation}
+            books = subbook_index(config)
+
+            for _, row in df_trades.iterrows():
+                symbol_pair = row['symbol']
+                s1, s2 = symbol_pair.split(" - ")
+                book = books.get(s1)
+                if book:
+                    subbook_pnls[book] += row["pnl"]
+
+            print("\n[MAIN] - Final Subbook Results:")
+            final_total = 0.0
+            for book, pnl in subbook_pnls.items():
+                start_cap = capital_allocation[book]["budget"]
+                final_cap = start_cap + pnl
+                final_total += final_cap
+                print(f"  [MAIN] - {book.capitalize()}: Start = {start_cap:,.2f}, PnL = {pnl:,.2f}, Final = {final_cap:,.2f}")
+
+            print(f"\n[MAIN] - Portfolio Final Value: {final_total:,.2f}")
+
+            if not df_trades.empty and "pnl" in df_trades.columns:
+                sharpe = strat.analyzers.sharpe.get_analysis().get("sharperatio", None)
+                drawdown = strat.analyzers.drawdown.get_analysis()["max"]["drawdown"]
+                ret = strat.analyzers.returns.get_analysis().get("rtot", None)
+                final_value = cerebro.broker.getvalue()
+
+                wins = (df_trades["pnl"] > 0).sum()
+                losses = (df_trades["pnl"] <= 0).sum()
+                total = wins + losses
+                win_rate = wins / total if total else 0
+                loss_rate = losses / total if total else 0
+
+                summary_df = pd.DataFrame([{
+                    "portfolio_value": final_value,
+                    "sharpe": sharpe,
+                    "drawdown": drawdown,
+                    "return_pct": ret,
+                    "total_trades": total,
+                    "wins": wins,
+                    "losses": losses,
+                    "win_rate": win_rate,
+                    "loss_rate": loss_rate
+                }])
+                summary_df.to_csv("data/processed/portfolio_summary.csv", index=False)
+                print("\n[MAIN] - Portfolio Summary saved to data/processed/portfolio_summary.csv")
+
+    with profiler.stage("risk_metrics"):
+        save_risk_metrics(symbol_data)
+        if risk_monitor is not None:
+            risk_monitor.report().to_csv("data/processed/risk_limits.csv", index=False)
+            print("[MAIN] - Risk-limit monitor report saved to data/processed/risk_limits.csv")
+
+    with profiler.stage("results_db"):
+        record_backtest_outputs(config)
 
     print("\n[MAIN] - Backtest completed and metrics saved.")
     print('[MAIN] -Final Portfolio Value: {:,.2f}'.format(cerebro.broker.getvalue()))
 
+    profiler.stop()
+    if profile:
+        profiler.print_report()
+        profiler.save(profiling.get("output_dir", "data/processed/profiling"))
+
 if __name__ == "__main__":
-    run_portfolio()
+    parser = argparse.ArgumentParser(description="Run the portfolio backtest.")
+    parser.add_argument("--profile", action="store_true", default=None, help="Time each run stage and pair")
+    parser.add_argument("--cprofile", action="store_true", default=None, help="Also capture cProfile stats")
+    parser.add_argument("--tracemalloc", action="store_true", default=None, help="Also track peak memory per stage")
+    parser.add_argument("--resume", action="store_true", help="Continue from the last checkpoint")
+    args = parser.parse_args()
+    run_portfolio(profile=args.profile, cprofile=args.cprofile, tracemalloc=args.tracemalloc, resume=args.resume)
@@ -1,37 +1,143 @@
 # portfolio/engine.py
 
-from subbooks.oil import get_oil_assets
-from subbooks.gas import get_gas_assets
-from subbooks.grains import get_grains_assets
+import importlib
+from collections import OrderedDict
+
+from utils.config import load_config, subbook_index
+
+
+def _frame_bytes(df):
+    return int(df.memory_usage(deep=True).sum())
+
+
+def _subbook_filter(book):
+    """subbooks/{book}.py's {book}_filters(df), if that module defines one."""
+    try:
+        module = importlib.import_module(f"subbooks.{book}")
+    except ImportError:
+        return None
+    return getattr(module, f"{book}_filters", None)
+
 
 class PortfolioEngine:
-    def __init__(self):
-        self.subbooks = {
-            "oil": get_oil_assets(),
-            "gas": get_gas_assets(),
-            "grains": get_grains_assets(),
-        }
+    """
+    Subbook registry built from config["capital_allocation"].
+
+    Contracts and budgets come from the config, so the registry always
+    agrees with what the backtest trades. symbol_index is built once per
+    engine by utils.config.subbook_index, the rule find_subbook also uses.
+    Price data is loaded lazily, one subbook at a time, the first time an
+    active subbook's data is requested; each frame passes through the
+    subbook's {book}_filters from subbooks/ when one exists. Loaded
+    subbooks are kept in LRU order, and once the cache grows past
+    max_memory_mb the least recently used inactive subbooks are evicted.
+    Active subbooks are never evicted.
+    """
+
+    def __init__(self, config=None, loader=None, max_memory_mb=None):
+        self.config = config if config is not None else load_config()
+        engine = self.config.get("engine", {})
+        self.max_memory_mb = engine.get("max_memory_mb") if max_memory_mb is None else max_memory_mb
+        self.loader = loader or self._default_loader
+
+        self.subbooks = {book: list(info["contracts"]) for book, info in self.config["capital_allocation"].items()}
+        self.budgets = {book: info.get("budget") for book, info in self.config["capital_allocation"].items()}
+        self.symbol_index = subbook_index(self.config)
+
+        self.active = []
         self.active_assets = []
+        self._data = OrderedDict()      # book -> {symbol: DataFrame}, least recently used first
+        self._bytes = {}
+        self.stats = {"loads": 0, "hits": 0, "evictions": 0}
+
+    def _default_loader(self, symbol):
+        from utils.data_loader import load_bars
+
+        resample = self.config.get("resample", {})
+        return load_bars(symbol, interval=self.config.get("data_interval", "1d"),
+                         resample=resample.get("enabled", True), session_start=resample.get("session_start"))
+
+    # --- Registry ---------------------------------------------------------------
+
+    def subbook_of(self, symbol):
+        return self.symbol_index.get(symbol)
 
     def load_all_assets(self):
-        """Flatten all sub-books into a single asset list."""
-        self.active_assets = [
-            asset for subbook_assets in self.subbooks.values()
-            for asset in subbook_assets
-        ]
-        return self.active_assets
+        """Activate every subbook and return the flattened asset list."""
+        return self.activate_subbooks(list(self.subbooks))
 
     def activate_subbooks(self, active_list):
-        """Activate only specific sub-books (e.g., ['oil', 'grains'])"""
-        self.active_assets = [
-            asset for name, assets in self.subbooks.items()
-            if name in active_list
-            for asset in assets
-        ]
+        """Activate only specific sub-books (e.g., ['oil', 'grains']). Data loads on first use."""
+        unknown = [book for book in active_list if book not in self.subbooks]
+        if unknown:
+            raise KeyError(f"[ENGINE] - Unknown subbook(s) {unknown}; configured: {list(self.subbooks)}")
+        self.active = [book for book in self.subbooks if book in active_list]
+        self.active_assets = [asset for book in self.active for asset in self.subbooks[book]]
+        self._enforce_cap()
         return self.active_assets
 
+    def deactivate_subbooks(self, names):
+        return self.activate_subbooks([book for book in self.active if book not in names])
+
+    # --- Data -------------------------------------------------------------------
+
+    def subbook_data(self, book):
+        """{symbol: bars} for an active subbook, loading it on first access."""
+        if book not in self.active:
+            raise KeyError(f"[ENGINE] - Subbook '{book}' is not active")
+        if book in self._data:
+            self._data.move_to_end(book)
+            self.stats["hits"] += 1
+            return self._data[book]
+
+        frames = {}
+        filters = _subbook_filter(book)
+        for symbol in self.subbooks[book]:
+            try:
+                df = self.loader(symbol)
+            except FileNotFoundError as e:
+                print(e)
+                continue
+            frames[symbol] = filters(df) if filters is not None else df
+        self._data[book] = frames
+        self._bytes[book] = sum(_frame_bytes(df) for df in frames.values())
+        self.stats["loads"] += 1
+        self._enforce_cap()
+        return frames
+
+    def get_data(self, symbol):
+        book = self.subbook_of(symbol)
+        if book is None:
+            raise KeyError(f"[ENGINE] - Symbol {symbol} not found in any subbook")
+        return self.subbook_data(book).get(symbol)
+
+    def active_data(self):
+        """{symbol: bars} across all active subbooks."""
+        return {symbol: df for book in self.active for symbol, df in self.subbook_data(book).items()}
+
+    def memory_mb(self):
+        return sum(self._bytes.values()) / 1e6
+
+    def evict(self, book):
+        if self._data.pop(book, None) is not None:
+            self._bytes.pop(book, None)
+            self.stats["evictions"] += 1
+
+    def _enforce_cap(self):
+        if self.max_memory_mb is None:
+            return
+        for book in [b for b in self._data if b not in self.active]:
+            if self.memory_mb() <= self.max_memory_mb:
+                break
+            self.evict(book)
+
     def print_summary(self):
         print("Loaded Subbooks:")
         for name, assets in self.subbooks.items():
-            print(f"  {name.capitalize()}: {assets}")
+            state = "active" if name in self.active else "inactive"
+            cached = f", {self._bytes[name] / 1e6:.2f} MB cached" if name in self._data else ""
+            print(f"  {name.capitalize()}: {assets} ({state}{cached})")
         print("\nActive Assets:", self.active_assets)
+        print(f"Cache: {self.memory_mb():.2f} MB"
+              + (f" / {self.max_memory_mb} MB cap" if self.max_memory_mb is not None else "")
+              + f" | loads={self.stats['loads']} hits={self.stats['hits']} evictions={self.stats['evictions']}")
@@ -0,0 +1,333 @@
+# risk/attribution.py — Pair- and subbook-level risk attribution from spread PnL covariance
+
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_ATTRIBUTION = {
+    "source": "snapshot",   # "snapshot": current positions held over history; "trades": backtest positions
+    "window": 60,           # bars per rolling covariance window
+    "step": 5,              # bars between window ends
+    "assume_open": True,    # snapshot source: give every pair a position (see risk.stress.snapshot_positions)
+    "chunk_rows": 20_000,   # bars processed per block
+}
+
+
+def attribution_settings(config):
+    return {**DEFAULT_ATTRIBUTION, **config.get("attribution", {})}
+
+
+# --- Spread PnL matrix --------------------------------------------------------
+# A position in pair p holds w = direction * size1 of leg 1 against
+# h = direction * size1 * beta of leg 2, so its PnL over bar t is
+#     x[t, p] = w[t-1, p] * d1[t, p] - h[t-1, p] * d2[t, p]
+# with d the change in log price (log spreads) or price (price spreads) of
+# each leg — the bar-by-bar version of direction * Δspread * size1.
+
+def pair_legs(positions, symbols):
+    """Column indices of each position's legs in symbols."""
+    index = {s: i for i, s in enumerate(symbols)}
+    return positions["s1"].map(index).to_numpy(), positions["s2"].map(index).to_numpy()
+
+
+def snapshot_exposures(positions):
+    """Constant (w, h) per pair from a snapshot_positions() frame."""
+    w = positions["direction"].to_numpy(dtype=np.float64) * positions["size1"].to_numpy(dtype=np.float64)
+    return w, w * positions["beta"].to_numpy(dtype=np.float64)
+
+
+def trade_events(trades, pairs, index):
+    """
+    Exposure changes implied by closed trades (spread_trades.csv rows):
+    (rows, cols, dw, dh) with +w/+h at the entry bar and -w/-h at the exit
+    bar. The hedge leg is the executed size2. Dates are matched to the first
+    bar on or after them, which is exact for daily bars.
+    """
+    col = {pair: j for j, pair in enumerate(pairs)}
+    cols = trades["symbol"].map(col).to_numpy()
+    direction = np.where(trades["side"].to_numpy() == "Long Spread", 1.0, -1.0)
+    w = direction * trades["size1"].to_numpy(dtype=np.float64)
+    h = direction * trades["size2"].to_numpy(dtype=np.float64)
+    start = index.searchsorted(pd.to_datetime(trades["entry_date"]).to_numpy())
+    end = index.searchsorted(pd.to_datetime(trades["exit_date"]).to_numpy())
+    rows = np.concatenate([start, end])
+    order = np.argsort(rows, kind="stable")
+    return (rows[order], np.concatenate([cols, cols])[order],
+            np.concatenate([w, -w])[order], np.concatenate([h, -h])[order])
+
+
+def spread_pnl_blocks(closes, positions, exposures=None, events=None, chunk_rows=20_000):
+    """
+    Yield (start_row, x) blocks of the (time x pairs) spread PnL matrix,
+    bars aligned with closes.index (row 0 is all zeros).
+
+    exposures: constant (w, h) arrays, or events: trade_events() output for
+    time-varying positions. Blocks keep memory at chunk_rows x pairs.
+    """
+    symbols = list(closes.columns)
+    i1, i2 = pair_legs(positions, symbols)
+    log_spread = positions["log_spread"].to_numpy(dtype=bool)
+    values = closes.to_numpy(dtype=np.float64)
+    n = len(values)
+
+    if events is not None:
+        ev_rows, ev_cols, ev_w, ev_h = events
+        carry_w = np.zeros(len(positions))
+        carry_h = np.zeros(len(positions))
+    else:
+        w_const, h_const = exposures
+
+    for start in range(0, n, chunk_rows):
+        stop = min(start + chunk_rows, n)
+        lo = max(start - 1, 0)
+        block = values[lo:stop]
+        d1 = d2 = None
+        if log_spread.any():
+            dlog = np.diff(np.log(block + 1e-6), axis=0)
+            d1, d2 = dlog[:, i1], dlog[:, i2]
+        if not log_spread.all():
+            dpx = np.diff(block, axis=0)
+            if d1 is None:
+                d1, d2 = dpx[:, i1], dpx[:, i2]
+            else:
+                d1 = np.where(log_spread, d1, dpx[:, i1])
+                d2 = np.where(log_spread, d2, dpx[:, i2])
+
+        # Exposure held over each bar is the one at the end of the previous bar.
+        if events is not None:
+            held = slice(lo, stop - 1)
+            dw = np.zeros((held.stop - held.start, len(positions)))
+            dh = np.zeros_like(dw)
+            sel = (ev_rows >= held.start) & (ev_rows < held.stop)
+            np.add.at(dw, (ev_rows[sel] - held.start, ev_cols[sel]), ev_w[sel])
+            np.add.at(dh, (ev_rows[sel] - held.start, ev_cols[sel]), ev_h[sel])
+            w = carry_w + np.cumsum(dw, axis=0)
+            h = carry_h + np.cumsum(dh, axis=0)
+            if len(w):
+                carry_w, carry_h = w[-1], h[-1]
+        else:
+            w, h = w_const, h_const
+
+        x = w * d1 - h * d2
+        if start == 0:
+            x = np.vstack([np.zeros((1, len(positions))), x])
+        yield start, x
+
+
+def spread_pnl_matrix(closes, positions, exposures=None, events=None):
+    """The full spread PnL matrix as a DataFrame (bars x pairs)."""
+    x = np.vstack([block for _, block in spread_pnl_blocks(closes, positions, exposures, events)])
+    return pd.DataFrame(x, index=closes.index, columns=positions["pair"].to_numpy())
+
+
+# --- Rolling attribution ------------------------------------------------------
+
+def rolling_attribution(blocks, n_rows, window=60, step=5):
+    """
+    Risk contributions over rolling windows of the spread PnL matrix.
+
+    For every window, with portfolio PnL y = sum_p x_p:
+        vol          sd(y)
+        contribution cov(x_p, y) / sd(y)     (sums to vol)
+        pct          cov(x_p, y) / var(y)    (sums to 1)
+        standalone   sd(x_p)
+
+    Window sums come from prefix sums recorded only at the window
+    boundaries while the blocks stream past, so the cost is one pass over
+    the matrix. Memory is O(windows x pairs); no pairs x pairs covariance is
+    formed. Returns (ends, vol, contribution, pct, standalone), with ends the
+    row index of each window's last bar.
+    """
+    ends = np.arange(window, n_rows + 1, step)
+    if not len(ends):
+        raise ValueError(f"[ATTRIBUTION] - Need at least {window} bars, have {n_rows}")
+    marks = np.union1d(ends, ends - window)           # prefix lengths to record
+    pos = {m: k for k, m in enumerate(marks)}
+
+    s_x = s_xy = s_xx = None
+    s_y = np.zeros(len(marks))
+    s_yy = np.zeros(len(marks))
+    run_x = run_xy = run_xx = None
+    run_y = run_yy = 0.0
+    shift_x = shift_y = None
+    consumed = 0
+
+    for _, x in blocks:
+        y = x.sum(axis=1)
+        if shift_x is None:
+            # Shifting by the first block's means keeps the prefix sums well conditioned.
+            shift_x, shift_y = x.mean(axis=0), y.mean()
+            n_pairs = x.shape[1]
+            s_x, s_xy, s_xx = (np.zeros((len(marks), n_pairs)) for _ in range(3))
+            run_x, run_xy, run_xx = (np.zeros(n_pairs) for _ in range(3))
+        xc = x - shift_x
+        yc = y - shift_y
+
+        lo, hi = consumed, consumed + len(x)
+        take = marks[(marks > lo) & (marks <= hi)]
+        xy, xx = xc * yc[:, None], xc * xc
+        if len(take):
+            rel = take - lo - 1
+            k = [pos[m] for m in take]
+            s_x[k] = np.cumsum(xc, axis=0)[rel] + run_x
+            s_xy[k] = np.cumsum(xy, axis=0)[rel] + run_xy
+            s_xx[k] = np.cumsum(xx, axis=0)[rel] + run_xx
+            s_y[k] = np.cumsum(yc)[rel] + run_y
+            s_yy[k] = np.cumsum(yc * yc)[rel] + run_yy
+
+        run_x = run_x + xc.sum(axis=0)
+        run_xy = run_xy + xy.sum(axis=0)
+        run_xx = run_xx + xx.sum(axis=0)
+        run_y += yc.sum()
+        run_yy += (yc * yc).sum()
+        consumed = hi
+
+    a = np.array([pos[m] for m in ends - window])
+    b = np.array([pos[m] for m in ends])
+    n = float(window)
+    sx, sy = s_x[b] - s_x[a], s_y[b] - s_y[a]
+    cov_xy = ((s_xy[b] - s_xy[a]) - sx * sy[:, None] / n) / (n - 1)
+    var_x = ((s_xx[b] - s_xx[a]) - sx * sx / n) / (n - 1)
+    var_y = ((s_yy[b] - s_yy[a]) - sy * sy / n) / (n - 1)
+
+    var_y = np.where(var_y > 1e-18, var_y, np.nan)
+    vol = np.sqrt(var_y)
+    contribution = cov_xy / vol[:, None]
+    pct = cov_xy / var_y[:, None]
+    standalone = np.sqrt(np.clip(var_x, 0.0, None))
+    return ends - 1, vol, contribution, pct, standalone
+
+
+def attribute(closes, positions, capital_allocation, exposures=None, events=None,
+              window=60, step=5, chunk_rows=20_000):
+    """
+    Pair and subbook risk attribution over rolling windows.
+
+    Returns a dict of DataFrames:
+        pairs     latest window per pair: exposure, standalone vol, marginal
+                  (d vol / d unit of size1), contribution, pct_contribution,
+                  and the pct contribution averaged over all windows
+        subbooks  latest window per subbook: standalone vol, contribution, pct
+        rolling   per window end: portfolio vol, diversification ratio and
+                  each subbook's pct contribution
+        rolling_pairs  per window end: each pair's pct contribution
+    """
+    pairs = positions["pair"].to_numpy()
+    blocks = spread_pnl_blocks(closes, positions, exposures, events, chunk_rows)
+    ends, vol, contribution, pct, standalone = rolling_attribution(blocks, len(closes), window, step)
+    dates = closes.index[ends]
+
+    books = list(capital_allocation)
+    membership = (positions["subbook"].to_numpy()[:, None] == np.array(books)[None, :]).astype(np.float64)
+    book_contribution = contribution @ membership
+    book_pct = pct @ membership
+
+    # Stand-alone subbook vol needs the subbook PnL series: one more pass over (bars x subbooks).
+    book_blocks = ((start, x @ membership)
+                   for start, x in spread_pnl_blocks(closes, positions, exposures, events, chunk_rows))
+    _, _, _, _, book_standalone = rolling_attribution(book_blocks, len(closes), window, step)
+
+    if events is not None:
+        w_end = np.zeros(len(positions))
+        rows, cols, dw, _ = events
+        live = rows <= ends[-1]
+        np.add.at(w_end, cols[live], dw[live])
+    else:
+        w_end = exposures[0]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        marginal = np.where(w_end != 0, contribution[-1] / w_end, np.nan)
+
+    pair_table = pd.DataFrame({
+        "pair": pairs,
+        "subbook": positions["subbook"].to_numpy(),
+        "exposure": w_end,
+        "standalone_vol": standalone[-1],
+        "marginal": marginal,
+        "contribution": contribution[-1],
+        "pct_contribution": pct[-1],
+        "avg_pct_contribution": np.nanmean(pct, axis=0) if np.isfinite(pct).any() else np.nan,
+    }).sort_values("contribution", ascending=False, key=np.abs).reset_index(drop=True)
+
+    book_table = pd.DataFrame({
+        "subbook": books,
+        "pairs": membership.sum(axis=0).astype(int),
+        "standalone_vol": book_standalone[-1],
+        "contribution": book_contribution[-1],
+        "pct_contribution": book_pct[-1],
+    })
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        diversification = standalone.sum(axis=1) / vol
+    rolling = pd.DataFrame(book_pct, index=dates, columns=books)
+    rolling.insert(0, "portfolio_vol", vol)
+    rolling.insert(1, "diversification_ratio", diversification)
+    rolling.index.name = "Date"
+
+    rolling_pairs = pd.DataFrame(pct, index=dates, columns=pairs)
+    rolling_pairs.index.name = "Date"
+    return {"pairs": pair_table, "subbooks": book_table, "rolling": rolling, "rolling_pairs": rolling_pairs}
+
+
+def attribution_report(config, source=None, window=None, step=None, output_dir="data/processed"):
+    """
+    Build positions from the configured source, run attribute() and save
+    risk_attribution_{pairs,subbooks,rolling,rolling_pairs}.csv to output_dir.
+    """
+    from main import get_data, pair_strategy_kwargs
+    from risk.stress import snapshot_positions
+    from utils.config import config_symbols, candidate_pairs, subbook_index
+
+    settings = attribution_settings(config)
+    source = source or settings["source"]
+    window = window or settings["window"]
+    step = step or settings["step"]
+
+    bars = {s: get_data(s, config) for s in config_symbols(config)}
+    closes = pd.DataFrame({s: df["Close"] for s, df in bars.items()}).dropna()
+
+    exposures = events = None
+    if source == "snapshot":
+        positions = snapshot_positions(candidate_pairs(config, verbose=False), config,
+                                       assume_open=settings["assume_open"], bars=bars)
+        if positions.empty:
+            print("[ATTRIBUTION] - No open positions at the last bar (set attribution.assume_open).")
+            return None
+        exposures = snapshot_exposures(positions)
+    elif source == "trades":
+        trades_path = os.path.join(output_dir, "spread_trades.csv")
+        if not os.path.exists(trades_path):
+            raise FileNotFoundError(f"[ATTRIBUTION] - {trades_path} not found; run a backtest first")
+        trades = pd.read_csv(trades_path)
+        names = list(dict.fromkeys(trades["symbol"]))
+        legs = [name.split(" - ") for name in names]
+        books = subbook_index(config)
+        positions = pd.DataFrame({
+            "pair": names,
+            "s1": [s1 for s1, _ in legs],
+            "s2": [s2 for _, s2 in legs],
+            "subbook": [books.get(s1) for s1, _ in legs],
+        })
+        positions["log_spread"] = [bool(pair_strategy_kwargs(config, s1, s2, book)["use_log_spread"])
+                                   for (s1, s2), book in zip(legs, positions["subbook"])]
+        positions = positions[positions["s1"].isin(closes.columns) & positions["s2"].isin(closes.columns)]
+        positions = positions.reset_index(drop=True)
+        events = trade_events(trades[trades["symbol"].isin(positions["pair"])], positions["pair"].tolist(),
+                              closes.index)
+    else:
+        raise ValueError(f"[ATTRIBUTION] - Unknown source '{source}'; use 'snapshot' or 'trades'")
+
+    start = time.perf_counter()
+    result = attribute(closes, positions, config["capital_allocation"], exposures=exposures, events=events,
+                       window=window, step=step, chunk_rows=settings["chunk_rows"])
+    elapsed = time.perf_counter() - start
+
+    os.makedirs(output_dir, exist_ok=True)
+    for name, df in result.items():
+        df.to_csv(os.path.join(output_dir, f"risk_attribution_{name}.csv"), index=name.startswith("rolling"))
+    print(f"[ATTRIBUTION] - {len(positions)} pairs x {len(result['rolling'])} windows of {window} bars "
+          f"({source}) in {elapsed:.2f}s")
+    print(result["subbooks"].to_string(index=False))
+    print(f"[ATTRIBUTION] - Results saved to {output_dir}/risk_attribution_*.csv")
+    return result
@@ -18,7 +18,7 @@ def compare_subbook_risks(subbooks, price_data_dir="data/raw"):
         price_df = pd.concat(dfs, axis=1).dropna()
         returns = price_df.pct_change().dropna()
 
-        weights = [1 / len(symbols)] * len(symbols)
+        weights = pd.Series(1 / len(symbols), index=symbols)
         risk = compute_risk_metrics(price_df, weights)
         div_ratio = diversification_ratio(price_df, weights)
         risk["Diversification Ratio"] = div_ratio
@@ -0,0 +1,247 @@
+# risk/limits.py — Incremental per-subbook exposure, concentration and vol-risk limits
+
+import math
+import heapq
+import pandas as pd
+
+# Every limit is per subbook; None disables it.
+DEFAULT_LIMITS = {
+    "max_gross": None,          # sum of |qty * price|
+    "max_net": None,            # |sum of qty * price|
+    "max_symbol_gross": None,   # |qty * price| of any single contract
+    "max_hhi": None,            # Herfindahl index of gross exposure shares
+    "max_vol_risk": None,       # sum of |exposure| * EWMA per-bar vol (no diversification credit)
+}
+
+
+class _Symbol:
+    __slots__ = ("price", "var", "last_dt", "books")
+
+    def __init__(self):
+        self.price = None
+        self.var = 0.0
+        self.last_dt = None
+        self.books = set()
+
+    @property
+    def vol(self):
+        return math.sqrt(self.var)
+
+
+class _Book:
+    __slots__ = ("qty", "exposure", "vol_risk_by_symbol", "heap", "gross", "net", "sum_sq", "vol_risk",
+                 "peak_gross", "peak_vol_risk", "blocked", "breaches")
+
+    def __init__(self):
+        self.qty = {}
+        self.exposure = {}
+        self.vol_risk_by_symbol = {}
+        self.heap = []  # (-|exposure|, symbol) max-heap; entries that no longer match exposure are stale
+        self.gross = 0.0
+        self.net = 0.0
+        self.sum_sq = 0.0
+        self.vol_risk = 0.0
+        self.peak_gross = 0.0
+        self.peak_vol_risk = 0.0
+        self.blocked = 0
+        self.breaches = {}
+
+    @property
+    def hhi(self):
+        return self.sum_sq / self.gross ** 2 if self.gross > 0 else 0.0
+
+    def push(self, symbol, exposure):
+        heapq.heappush(self.heap, (-abs(exposure), symbol))
+        if len(self.heap) > 2 * len(self.exposure) + 16:
+            # Mostly stale: rebuild from the live exposures (amortised O(1) per push).
+            self.heap = [(-abs(e), s) for s, e in self.exposure.items()]
+            heapq.heapify(self.heap)
+
+    def largest(self, skip):
+        """Largest |exposure| among contracts not in skip; stale entries are dropped on the way."""
+        held = []
+        largest = 0.0
+        while self.heap:
+            neg, symbol = self.heap[0]
+            exposure = self.exposure.get(symbol)
+            if exposure is None or abs(exposure) != -neg:
+                heapq.heappop(self.heap)
+            elif symbol in skip:
+                held.append(heapq.heappop(self.heap))
+            else:
+                largest = -neg
+                break
+        for entry in held:
+            heapq.heappush(self.heap, entry)
+        return largest
+
+
+def _metrics(gross, net, sum_sq, vol_risk, max_symbol_gross):
+    return {
+        "max_gross": gross,
+        "max_net": abs(net),
+        "max_symbol_gross": max_symbol_gross,
+        "max_hhi": sum_sq / gross ** 2 if gross > 0 else 0.0,
+        "max_vol_risk": vol_risk,
+    }
+
+
+class RiskLimitMonitor:
+    """
+    Portfolio risk state shared by every SpreadPairStrategy in one Cerebro.
+
+    Strategies report each bar's close through mark() and each executed
+    order through on_fill(). Per-subbook gross/net exposure, the sum of
+    squared exposures (for the Herfindahl index) and the vol-weighted
+    exposure are kept as running sums and the largest single exposure in a
+    max-heap, so each update only touches the contract that changed.
+    Per-contract volatility is an EWMA of log returns (RiskMetrics-style,
+    lambda 0.94 by default). Before entering, a strategy asks
+    allow_entry(), which evaluates the book as if the new legs were
+    already filled and rejects the entry if any limit would be exceeded.
+    """
+
+    def __init__(self, limits=None, subbook_limits=None, ewma_lambda=0.94):
+        self.limits = {**DEFAULT_LIMITS, **(limits or {})}
+        self.subbook_limits = subbook_limits or {}
+        self.ewma_lambda = ewma_lambda
+        self.symbols = {}
+        self.books = {}
+
+    @classmethod
+    def from_config(cls, config):
+        """Monitor built from the config's "risk_limits" section, or None when disabled."""
+        section = config.get("risk_limits", {})
+        if not section.get("enabled", False):
+            return None
+        return cls(limits=section.get("default"), subbook_limits=section.get("subbooks"),
+                   ewma_lambda=section.get("ewma_lambda", 0.94))
+
+    def limits_for(self, book):
+        return {**self.limits, **self.subbook_limits.get(book, {})}
+
+    def _symbol(self, symbol):
+        state = self.symbols.get(symbol)
+        if state is None:
+            state = self.symbols[symbol] = _Symbol()
+        return state
+
+    def _book(self, book):
+        state = self.books.get(book)
+        if state is None:
+            state = self.books[book] = _Book()
+        return state
+
+    def _revalue(self, book, symbol, sym):
+        """Re-derive one contract's exposure in one book and adjust the running sums."""
+        qty = book.qty.get(symbol, 0)
+        new = qty * sym.price if sym.price is not None else 0.0
+        new_vol_risk = abs(new) * sym.vol
+        old = book.exposure.get(symbol, 0.0)
+        old_vol_risk = book.vol_risk_by_symbol.get(symbol, 0.0)
+
+        book.gross += abs(new) - abs(old)
+        book.net += new - old
+        book.sum_sq += new * new - old * old
+        book.vol_risk += new_vol_risk - old_vol_risk
+        if qty:
+            book.exposure[symbol] = new
+            book.vol_risk_by_symbol[symbol] = new_vol_risk
+            if abs(new) != abs(old):
+                book.push(symbol, new)
+        else:
+            book.exposure.pop(symbol, None)
+            book.vol_risk_by_symbol.pop(symbol, None)
+            if not book.exposure:
+                # Flat book: drop accumulated rounding drift.
+                book.gross = book.net = book.sum_sq = book.vol_risk = 0.0
+                book.heap = []
+
+        book.peak_gross = max(book.peak_gross, book.gross)
+        book.peak_vol_risk = max(book.peak_vol_risk, book.vol_risk)
+
+    def mark(self, symbol, dt, price):
+        """New close for a contract. Repeated calls for the same bar are ignored."""
+        sym = self._symbol(symbol)
+        if sym.last_dt == dt:
+            return
+        if sym.price is not None and sym.price > 0 and price > 0:
+            ret = math.log(price / sym.price)
+            sym.var = self.ewma_lambda * sym.var + (1 - self.ewma_lambda) * ret * ret
+        sym.last_dt = dt
+        sym.price = price
+        for book_name in sym.books:
+            self._revalue(self.books[book_name], symbol, sym)
+
+    def on_fill(self, book_name, symbol, size, price):
+        """Executed order: size is signed (negative for sells)."""
+        sym = self._symbol(symbol)
+        if sym.price is None:
+            sym.price = price
+        book = self._book(book_name)
+        qty = book.qty.get(symbol, 0) + size
+        if qty:
+            book.qty[symbol] = qty
+            sym.books.add(book_name)
+        else:
+            book.qty.pop(symbol, None)
+            sym.books.discard(book_name)
+        self._revalue(book, symbol, sym)
+
+    def check(self, book_name, legs):
+        """
+        Limits the book would breach after filling `legs`, an iterable of
+        (symbol, signed size, price). Returns {limit: value}; empty if allowed.
+        """
+        book = self._book(book_name)
+        gross, net, sum_sq, vol_risk = book.gross, book.net, book.sum_sq, book.vol_risk
+        largest = 0.0
+        touched = set()
+        for symbol, size, price in legs:
+            touched.add(symbol)
+            sym = self._symbol(symbol)
+            mark = sym.price if sym.price is not None else price
+            old = book.exposure.get(symbol, 0.0)
+            new = (book.qty.get(symbol, 0) + size) * mark
+            gross += abs(new) - abs(old)
+            net += new - old
+            sum_sq += new * new - old * old
+            vol_risk += (abs(new) - abs(old)) * sym.vol
+            largest = max(largest, abs(new))
+        # Contracts not touched by this entry still count towards max_symbol_gross.
+        largest = max(largest, book.largest(touched))
+
+        metrics = _metrics(gross, net, sum_sq, vol_risk, largest)
+        return {name: metrics[name] for name, limit in self.limits_for(book_name).items()
+                if name in metrics and limit is not None and metrics[name] > limit}
+
+    def allow_entry(self, book_name, legs):
+        breaches = self.check(book_name, legs)
+        if breaches:
+            book = self._book(book_name)
+            book.blocked += 1
+            for name in breaches:
+                book.breaches[name] = book.breaches.get(name, 0) + 1
+            return False, breaches
+        return True, {}
+
+    def report(self):
+        """One row per subbook with current and peak risk plus blocked-entry counts."""
+        rows = []
+        for name in sorted(self.books):
+            book = self.books[name]
+            rows.append({
+                "subbook": name,
+                "gross": book.gross,
+                "net": book.net,
+                "hhi": book.hhi,
+                "vol_risk": book.vol_risk,
+                "peak_gross": book.peak_gross,
+                "peak_vol_risk": book.peak_vol_risk,
+                "blocked_entries": book.blocked,
+                **{f"blocked_{k}": v for k, v in sorted(book.breaches.items())},
+            })
+        df = pd.DataFrame(rows)
+        blocked = [c for c in df.columns if c.startswith("blocked_")]
+        df[blocked] = df[blocked].fillna(0).astype(int)
+        return df
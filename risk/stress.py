@@ -0,0 +1,262 @@
+# risk/stress.py — Vectorized scenario / stress engine for open spread positions
+
+import os
+import time
+import contextlib
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_STRESS = {
+    "horizon": 20,          # bars each scenario path runs for
+    "windows": 500,         # historical windows each scenario is replayed over
+    "assume_open": False,   # give every pair a position in the direction of its z-score
+    "batch_size": 1024,     # scenarios evaluated per array batch
+    "scenarios": [{"name": "baseline"}],
+}
+
+
+def stress_settings(config):
+    return {**DEFAULT_STRESS, **config.get("stress", {})}
+
+
+def _per_symbol(spec, symbols, default):
+    """Expand {"CL": x, "*": y} to one value per symbol."""
+    spec = spec or {}
+    fallback = spec.get("*", default)
+    return np.array([spec.get(s, fallback) for s in symbols], dtype=np.float64)
+
+
+# --- Position snapshot --------------------------------------------------------
+
+def snapshot_positions(pairs, config, assume_open=False, bars=None):
+    """
+    Spread positions held at the last bar. Each pair is replayed through
+    SpreadPairStrategy over its full history in its own Cerebro, as in
+    sharded runs, so entries, exits, stops, holding limits and the hedge
+    estimator match the backtest; the position is read before stop()
+    force-closes it. Portfolio risk limits are not applied. With
+    assume_open a flat pair gets the position an entry would take now (see
+    SpreadPairStrategy.position_snapshot).
+
+    bars: {symbol: OHLCV frame}; loaded with main.get_data when omitted.
+    """
+    import backtrader as bt
+    from main import get_data, pair_strategy_kwargs
+    from strategies.spread_pair_strategy import SpreadPairStrategy
+
+    bars = dict(bars or {})
+    rows = []
+    for s1, s2, book1, book2 in pairs:
+        try:
+            for symbol in (s1, s2):
+                if symbol not in bars:
+                    bars[symbol] = get_data(symbol, config)
+        except FileNotFoundError as e:
+            print(f"[STRESS] - Skipping {s1} - {s2}: {e}")
+            continue
+
+        cerebro = bt.Cerebro()
+        cerebro.broker.set_cash(config.get("capital", 10_000_000))
+        for symbol in (s1, s2):
+            cerebro.adddata(bt.feeds.PandasData(dataname=bars[symbol], name=symbol))
+        cerebro.addstrategy(SpreadPairStrategy, **pair_strategy_kwargs(config, s1, s2, book1, write_csv=False,
+                                                                       signal_archive=False))
+        # The strategy logs every bar; the replay only needs its end state.
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            strat = cerebro.run()[0]
+            row = strat.final_position or strat.position_snapshot(assume_open=assume_open)
+        if row is not None:
+            rows.append(row)
+    return pd.DataFrame(rows)
+
+
+# --- Scenarios ----------------------------------------------------------------
+
+def window_starts(n_returns, horizon, windows):
+    """Evenly spaced start offsets of `windows` historical windows of length horizon."""
+    last = n_returns - horizon
+    if last < 0:
+        raise ValueError(f"[STRESS] - Need at least {horizon} returns, have {n_returns}")
+    return np.unique(np.linspace(0, last, min(windows, last + 1)).astype(np.int64))
+
+
+def scenario_returns(returns, dates, symbols, spec, horizon, windows, rng):
+    """
+    Log-return paths (W, horizon, n) and instant jumps (n,) for one scenario.
+
+    spec keys (all optional):
+        jumps        {symbol or "*": fractional gap at t0}, e.g. {"CL": 0.10}
+        vol          {symbol or "*": multiplier on returns}, e.g. {"NG": 2.0}
+        decorrelate  0..1 — blend each symbol's path with an independently
+                     drawn historical window, breaking cross-correlation
+        replay       start date — replay that single historical window
+                     instead of `windows` evenly spaced ones
+    """
+    if spec.get("replay") is not None:
+        start = int(dates.searchsorted(pd.Timestamp(spec["replay"])))
+        if start > len(returns) - horizon:
+            raise ValueError(f"[STRESS] - Replay window {spec['replay']} runs past the data")
+        starts = np.array([start])
+    else:
+        starts = window_starts(len(returns), horizon, windows)
+
+    steps = np.arange(horizon)
+    paths = returns[starts[:, None] + steps[None, :]]                       # (W, H, n)
+
+    blend = float(spec.get("decorrelate", 0.0))
+    if blend > 0:
+        n = returns.shape[1]
+        pool = window_starts(len(returns), horizon, len(returns))
+        other = rng.choice(pool, size=(len(starts), n))                      # (W, n)
+        independent = returns[other[:, None, :] + steps[None, :, None], np.arange(n)[None, None, :]]
+        paths = np.sqrt(1 - blend) * paths + np.sqrt(blend) * independent
+
+    paths = paths * _per_symbol(spec.get("vol"), symbols, 1.0)[None, None, :]
+    jumps = np.log1p(_per_symbol(spec.get("jumps"), symbols, 0.0))
+    return paths, jumps
+
+
+# --- Evaluation ---------------------------------------------------------------
+
+def evaluate_positions(paths, jumps, positions, symbols):
+    """
+    Re-price every position along every path in one batch.
+
+    paths (S, H, n) log returns, jumps (n,) or (S, n). Each position's legs
+    start from its own price1/price2, the closes of the bar its snapshot
+    was taken on. Returns (pnl, stopped): pnl (S, H, P) is each position's PnL along the
+    path, frozen at the first stop-loss breach; stopped (S, P) tells whether
+    the stop fired. PnL follows the strategy:
+    direction * (spread - entry_spread) * size1.
+    """
+    index = {s: i for i, s in enumerate(symbols)}
+    i1 = positions["s1"].map(index).to_numpy()
+    i2 = positions["s2"].map(index).to_numpy()
+    beta = positions["beta"].to_numpy(dtype=np.float64)
+    direction = positions["direction"].to_numpy(dtype=np.float64)
+    size1 = positions["size1"].to_numpy(dtype=np.float64)
+    entry = positions["entry_spread"].to_numpy(dtype=np.float64)
+    stop = positions["stop_distance"].to_numpy(dtype=np.float64)
+    log_spread = positions["log_spread"].to_numpy(dtype=bool)
+    price1 = positions["price1"].to_numpy(dtype=np.float64)
+    price2 = positions["price2"].to_numpy(dtype=np.float64)
+
+    jumps = np.broadcast_to(jumps, (paths.shape[0], paths.shape[2]))
+    moves = jumps[:, None, :] + np.cumsum(paths, axis=1)                    # (S, H, n)
+    leg1 = np.exp(np.log(price1)[None, None, :] + moves[:, :, i1])          # (S, H, P)
+    leg2 = np.exp(np.log(price2)[None, None, :] + moves[:, :, i2])
+    spread = np.where(log_spread,
+                      np.log(leg1 + 1e-6) - beta * np.log(leg2 + 1e-6),
+                      leg1 - beta * leg2)
+
+    move = direction * (spread - entry)
+    pnl = move * size1
+    hit = move < -stop
+    stopped = hit.any(axis=1)
+    # Bars at or after the first breach keep the PnL realised at the stop.
+    after_stop = np.cumsum(hit, axis=1) > 0
+    first = hit.argmax(axis=1)
+    at_stop = np.take_along_axis(pnl, first[:, None, :], axis=1)
+    return np.where(after_stop, at_stop, pnl), stopped
+
+
+def run_stress(closes, positions, scenarios, capital_allocation, horizon=20, windows=500,
+               batch_size=1024, seed=42):
+    """
+    Apply every scenario to every position and aggregate by subbook.
+
+    closes: aligned close matrix (bars x symbols), the source of the
+    historical returns; positions carry their own starting leg prices
+    (snapshot_positions' price1/price2). Each scenario is replayed
+    over `windows` historical windows, so the scenario count is
+    len(scenarios) x windows. Returns one row per (scenario, subbook) plus a
+    "total" row per scenario with the PnL distribution across windows.
+    """
+    symbols = list(closes.columns)
+    returns = np.log(closes).diff().iloc[1:].to_numpy()
+    dates = closes.index[1:]
+    rng = np.random.default_rng(seed)
+
+    books = list(capital_allocation)
+    if positions.empty:
+        return pd.DataFrame()
+    membership = (positions["subbook"].to_numpy()[:, None] == np.array(books)[None, :]).astype(np.float64)
+    pairs_per_book = membership.sum(axis=0)
+
+    rows = []
+    for spec in scenarios:
+        paths, jumps = scenario_returns(returns, dates, symbols, spec, horizon, windows, rng)
+        exit_parts, worst_parts, stop_parts = [], [], []
+        for start in range(0, len(paths), batch_size):
+            pnl, stopped = evaluate_positions(paths[start:start + batch_size], jumps, positions, symbols)
+            book_path = pnl @ membership                                     # (S, H, K)
+            exit_parts.append(book_path[:, -1, :])
+            worst_parts.append(book_path.min(axis=1))
+            stop_parts.append(stopped @ membership)
+        book_pnl = np.concatenate(exit_parts)
+        book_worst = np.concatenate(worst_parts)
+        book_stops = np.concatenate(stop_parts)
+
+        columns = {book: k for k, book in enumerate(books)}
+        for book, k in [*columns.items(), ("total", None)]:
+            pnl = book_pnl.sum(axis=1) if k is None else book_pnl[:, k]
+            # The portfolio's worst point is not the sum of each book's worst point;
+            # for the total row this is a conservative bound.
+            worst = book_worst.sum(axis=1) if k is None else book_worst[:, k]
+            stops = book_stops.sum(axis=1) if k is None else book_stops[:, k]
+            n_pairs = pairs_per_book.sum() if k is None else pairs_per_book[k]
+            budget = (sum(info["budget"] for info in capital_allocation.values()) if k is None
+                      else capital_allocation[book]["budget"])
+            var_95 = np.percentile(pnl, 5)
+            rows.append({
+                "scenario": spec.get("name", "unnamed"),
+                "subbook": book,
+                "open_pairs": int(n_pairs),
+                "windows": len(pnl),
+                "mean_pnl": pnl.mean(),
+                "var_95": var_95,
+                "cvar_95": pnl[pnl <= var_95].mean(),
+                "worst_pnl": pnl.min(),
+                "worst_path_pnl": worst.min(),
+                "worst_pct_budget": pnl.min() / budget if budget else np.nan,
+                "stop_rate": stops.mean() / n_pairs if n_pairs else 0.0,
+            })
+    return pd.DataFrame(rows)
+
+
+def stress_test(config, horizon=None, windows=None, assume_open=None, output_dir="data/processed"):
+    """
+    Snapshot the positions held at the last bar, run the "stress" section's
+    scenario library and save stress_positions.csv and stress_results.csv
+    to output_dir.
+    """
+    from main import get_data
+    from utils.config import config_symbols, candidate_pairs
+
+    settings = stress_settings(config)
+    horizon = horizon or settings["horizon"]
+    windows = windows or settings["windows"]
+    assume_open = settings["assume_open"] if assume_open is None else assume_open
+
+    bars = {s: get_data(s, config) for s in config_symbols(config)}
+    closes = pd.DataFrame({s: df["Close"] for s, df in bars.items()}).dropna()
+    positions = snapshot_positions(candidate_pairs(config, verbose=False), config, assume_open=assume_open, bars=bars)
+    os.makedirs(output_dir, exist_ok=True)
+    positions.to_csv(os.path.join(output_dir, "stress_positions.csv"), index=False)
+    if positions.empty:
+        print("[STRESS] - No open positions at the last bar (use assume_open to stress every pair).")
+        return positions, pd.DataFrame()
+
+    start = time.perf_counter()
+    results = run_stress(closes, positions, settings["scenarios"], config["capital_allocation"],
+                         horizon=horizon, windows=windows, batch_size=settings["batch_size"],
+                         seed=settings.get("seed", 42))
+    elapsed = time.perf_counter() - start
+    n_scenarios = int(results.loc[results["subbook"] == "total", "windows"].sum())
+    results.to_csv(os.path.join(output_dir, "stress_results.csv"), index=False)
+    print(f"[STRESS] - {n_scenarios} scenario paths x {len(positions)} positions in {elapsed:.2f}s")
+    print(results[results["subbook"] == "total"][["scenario", "mean_pnl", "var_95", "cvar_95", "worst_pnl", "stop_rate"]]
+          .to_string(index=False))
+    print(f"[STRESS] - Results saved to {os.path.join(output_dir, 'stress_results.csv')}")
+    return positions, results
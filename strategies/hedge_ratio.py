@@ -0,0 +1,153 @@
+# strategies/hedge_ratio.py — Pluggable hedge-ratio estimators for SpreadPairStrategy
+
+from collections import deque
+import numpy as np
+
+
+class HedgeRatioEstimator:
+    """
+    Interface for per-bar hedge-ratio estimation.
+
+    update(price1, price2) is called once per bar on which either leg has a
+    new bar, with the raw closes, and returns the hedge ratio to use on that
+    bar. Estimators that model the
+    spread's residual also expose innovation / innovation_var, which the
+    strategy can use as its z-score instead of a rolling window.
+    """
+
+    provides_zscore = False
+
+    def __init__(self, beta_static=1.0):
+        self.beta_static = beta_static
+        self.beta = beta_static
+        self.intercept = 0.0
+        self.innovation = None
+        self.innovation_var = None
+
+    def update(self, price1, price2):
+        raise NotImplementedError
+
+    def zscore(self):
+        if self.innovation is None or not self.innovation_var:
+            return None
+        return self.innovation / np.sqrt(self.innovation_var)
+
+
+class StaticHedgeRatio(HedgeRatioEstimator):
+    """Constant beta_static."""
+
+    def update(self, price1, price2):
+        return self.beta
+
+
+class RollingOLSHedgeRatio(HedgeRatioEstimator):
+    """
+    OLS of price1 on price2 (with intercept) over the last `lookback` bars.
+    Falls back to beta_static until the window is full or when the fit is
+    degenerate. Closed-form on a fixed-size buffer instead of a statsmodels
+    fit per bar.
+    """
+
+    def __init__(self, beta_static=1.0, lookback=20):
+        super().__init__(beta_static)
+        self.lookback = lookback
+        self.y = deque(maxlen=lookback)
+        self.x = deque(maxlen=lookback)
+
+    def update(self, price1, price2):
+        self.y.append(price1)
+        self.x.append(price2)
+        if len(self.y) < self.lookback:
+            self.beta = self.beta_static
+            return self.beta
+
+        y = np.fromiter(self.y, dtype=float, count=self.lookback)
+        x = np.fromiter(self.x, dtype=float, count=self.lookback)
+        xc = x - x.mean()
+        var_x = xc @ xc
+        beta = (xc @ (y - y.mean())) / var_x if var_x > 0 else np.nan
+        if np.isfinite(beta):
+            self.beta = beta
+            self.intercept = y.mean() - beta * x.mean()
+        else:
+            self.beta = self.beta_static
+        return self.beta
+
+
+class KalmanHedgeRatio(HedgeRatioEstimator):
+    """
+    Recursive Kalman filter on price1 = beta * price2 + intercept + noise,
+    with beta and intercept following a random walk. Constant work per bar
+    and no window buffer.
+
+    Args:
+        delta: process noise; state covariance grows by delta / (1 - delta)
+            per bar. Larger values let beta adapt faster.
+        obs_var: observation noise variance of the regression residual.
+        log_prices: run the regression on log prices, matching a log spread.
+    """
+
+    provides_zscore = True
+
+    def __init__(self, beta_static=1.0, delta=1e-4, obs_var=1e-3, log_prices=True, initial_var=1.0):
+        super().__init__(beta_static)
+        self.process_var = delta / (1 - delta)
+        self.obs_var = obs_var
+        self.log_prices = log_prices
+        self.initial_var = initial_var
+        self.state = None
+        self.cov = None
+
+    def update(self, price1, price2):
+        if self.log_prices:
+            y, x = np.log(price1 + 1e-6), np.log(price2 + 1e-6)
+        else:
+            y, x = price1, price2
+
+        if self.state is None:
+            self.state = np.array([self.beta_static, y - self.beta_static * x])
+            self.cov = np.eye(2) * self.initial_var
+
+        obs = np.array([x, 1.0])
+        prior_cov = self.cov + np.eye(2) * self.process_var
+        predicted = obs @ self.state
+
+        pf = prior_cov @ obs
+        q = obs @ pf + self.obs_var
+        e = y - predicted
+        gain = pf / q
+
+        self.state = self.state + gain * e
+        self.cov = prior_cov - np.outer(gain, pf)
+
+        self.innovation = e
+        self.innovation_var = q
+        self.beta, self.intercept = self.state
+        if not np.isfinite(self.beta):
+            self.beta = self.beta_static
+        return self.beta
+
+
+HEDGE_RATIO_ESTIMATORS = {
+    "static": StaticHedgeRatio,
+    "rolling_ols": RollingOLSHedgeRatio,
+    "kalman": KalmanHedgeRatio,
+}
+
+
+def make_hedge_estimator(params):
+    """
+    Estimator for a SpreadPairStrategy params mapping (hedge_ratio,
+    rolling_beta, beta_static, beta_lookback, kalman_*, use_log_spread).
+    """
+    method = params.get("hedge_ratio") or ("rolling_ols" if params.get("rolling_beta", True) else "static")
+    if method not in HEDGE_RATIO_ESTIMATORS:
+        raise ValueError(f"[STRATEGY] - Unknown hedge_ratio '{method}'")
+    beta_static = params.get("beta_static", 1.0)
+    if method == "rolling_ols":
+        return RollingOLSHedgeRatio(beta_static, lookback=params.get("beta_lookback", 20))
+    if method == "kalman":
+        return KalmanHedgeRatio(beta_static, delta=params.get("kalman_delta", 1e-4),
+                                obs_var=params.get("kalman_obs_var", 1e-3),
+                                log_prices=params.get("use_log_spread", True))
+    return HEDGE_RATIO_ESTIMATORS[method](beta_static)
@@ -3,10 +3,22 @@
 import backtrader as bt
 import pandas as pd
 import numpy as np
-import statsmodels.api as sm
 import os
+import time
+from contextlib import nullcontext
+from strategies.hedge_ratio import make_hedge_estimator
+from utils.trade_logger import spread_trade_log
+from utils.signal_archive import save_signal_archive, SIGNAL_DIR
+
+# Columns of data/processed/spread_trades.csv, in file order.
+TRADE_CSV_COLUMNS = ['symbol', 'side', 'entry_date', 'entry_spread', 'exit_date', 'exit_spread',
+                     'size1', 'size2', 'pnl', 'duration', 'return_pct']
 
 class SpreadPairStrategy(bt.Strategy):
+    # Per-bar series checkpointed incrementally by utils.checkpoint (name -> dtype).
+    CHECKPOINT_SERIES = {"spread_hist": np.float64, "zscore_series": np.float64,
+                         "datetime_series": "datetime64[us]"}
+
     params = dict(
         asset1_name=None,
         asset2_name=None,
@@ -24,7 +36,16 @@ class SpreadPairStrategy(bt.Strategy):
         max_holding_period=5 * 24 * 4,
         volatility_filter=True,
         volatility_lookback=50,
-        max_volatility=3.0
+        max_volatility=3.0,
+        hedge_ratio=None,       # "rolling_ols" | "static" | "kalman"; None follows rolling_beta
+        kalman_delta=1e-4,
+        kalman_obs_var=1e-3,
+        kalman_zscore=True,     # use the filter's innovation / sqrt(innovation variance) as z-score
+        signal_archive=True,    # persist z-score/spread/entries/exits for utils/plot_spread
+        signal_dir=SIGNAL_DIR,
+        write_csv=True,         # append to spread_trades.csv / pairwise_pnl_summary.csv in stop()
+        risk_monitor=None,      # shared risk.limits.RiskLimitMonitor; blocks entries that breach limits
+        profiler=None
     )
 
     def __init__(self):
@@ -35,12 +56,17 @@ class SpreadPairStrategy(bt.Strategy):
         self.exit_timestamps = []
 
         self.active_trade = None
-        self.trades = []
+        self.final_position = None  # position_snapshot() at the last bar, before the forced exit
+        self.trades = spread_trade_log()
         self.subbook_value = self.p.subbook_start_capital
 
         self.realized_pnl = 0.0
         self.unrealized_pnl = 0.0
 
+        self.hedge = make_hedge_estimator(self.p._getkwargs())
+        self._hedge_stamp = None  # leg datetimes last fed to the estimator
+        self._fast_forward = 0  # bars already covered by a checkpoint being resumed
+
     def start(self):
         self.asset1 = next(d for d in self.datas if d._name == self.p.asset1_name)
         self.asset2 = next(d for d in self.datas if d._name == self.p.asset2_name)
@@ -48,21 +74,43 @@ class SpreadPairStrategy(bt.Strategy):
         self.log(f"START | subbook={self.p.subbook_name} | capital={self.subbook_value:.2f}")
 
     def compute_beta(self):
-        price1_hist = self.asset1.close.get(size=self.p.beta_lookback)
-        price2_hist = self.asset2.close.get(size=self.p.beta_lookback)
-        if self.p.rolling_beta and len(price1_hist) == self.p.beta_lookback:
-            try:
-                beta_est = sm.OLS(price1_hist, sm.add_constant(price2_hist)).fit().params[1]
-                return beta_est if np.isfinite(beta_est) else self.p.beta_static
-            except Exception:
-                return self.p.beta_static
-        return self.p.beta_static
+        """
+        Feed the current bar to the hedge-ratio estimator and return its beta.
+        When neither leg has a new bar (another feed in the Cerebro advanced),
+        the repeated closes are not fed again and the last beta is kept.
+        """
+        stamp = (self.asset1.datetime[0], self.asset2.datetime[0])
+        if stamp == self._hedge_stamp:
+            return self.hedge.beta
+        self._hedge_stamp = stamp
+        return self.hedge.update(self.asset1.close[0], self.asset2.close[0])
 
     def next(self):
+        if len(self) <= self._fast_forward:
+            return
+        if self.p.profiler is None:
+            return self._on_bar()
+        start = time.perf_counter()
+        try:
+            self._on_bar()
+        finally:
+            self.p.profiler.add_pair_time(f"{self.p.asset1_name} - {self.p.asset2_name}",
+                                          time.perf_counter() - start)
+
+    def _stage(self, name):
+        return self.p.profiler.stage(name) if self.p.profiler is not None else nullcontext()
+
+    def _on_bar(self):
         beta = self.compute_beta()
         price1 = self.asset1.close[0]
         price2 = self.asset2.close[0]
 
+        monitor = self.p.risk_monitor
+        if monitor is not None:
+            dt = self.datas[0].datetime[0]
+            monitor.mark(self.p.asset1_name, dt, price1)
+            monitor.mark(self.p.asset2_name, dt, price2)
+
         spread = (np.log(price1 + 1e-6) - beta * np.log(price2 + 1e-6)
                   if self.p.use_log_spread else price1 - beta * price2)
 
@@ -71,8 +119,11 @@ class SpreadPairStrategy(bt.Strategy):
         if len(self.spread_hist) < self.p.spread_lookback:
             return
 
-        spread_series = pd.Series(self.spread_hist[-self.p.spread_lookback:])
-        zscore = (spread - spread_series.mean()) / (spread_series.std() + 1e-6)
+        if self.p.kalman_zscore and self.hedge.provides_zscore:
+            zscore = self.hedge.zscore()
+        else:
+            spread_series = pd.Series(self.spread_hist[-self.p.spread_lookback:])
+            zscore = (spread - spread_series.mean()) / (spread_series.std() + 1e-6)
 
         self.zscore_series.append(zscore)
         self.datetime_series.append(self.datas[0].datetime.datetime(0))
@@ -117,6 +168,16 @@ class SpreadPairStrategy(bt.Strategy):
             size1, size2 = self.calc_hedged_position_size(beta)
             self.log(f"Z={zscore:.2f} | Spread={spread:.2f} | pos=({pos1},{pos2}) | size=({size1},{size2}) | β={beta:.2f}")
 
+            if abs(zscore) > self.p.z_entry and monitor is not None:
+                sign = -1 if zscore > self.p.z_entry else 1
+                allowed, breaches = monitor.allow_entry(self.p.subbook_name, [
+                    (self.p.asset1_name, sign * size1, price1),
+                    (self.p.asset2_name, -sign * size2, price2),
+                ])
+                if not allowed:
+                    self.log(f"[RISK] - Entry blocked, would breach {', '.join(sorted(breaches))}")
+                    return
+
             if zscore > self.p.z_entry:
                 self.sell(self.asset1, size=size1)
                 self.buy(self.asset2, size=size2)
@@ -139,6 +200,11 @@ class SpreadPairStrategy(bt.Strategy):
             self.log(f"[STRATEGY] - Target reached | Spread reverted to {spread:.2f}")
             self.active_trade = None
 
+    def notify_order(self, order):
+        if self.p.risk_monitor is not None and order.status == order.Completed:
+            self.p.risk_monitor.on_fill(self.p.subbook_name, order.data._name,
+                                        order.executed.size, order.executed.price)
+
     def calc_hedged_position_size(self, beta):
         risk = 0.02 * self.subbook_value
         spread_vol = np.std(self.spread_hist[-self.p.spread_lookback:]) + 1e-6
@@ -194,9 +260,10 @@ class SpreadPairStrategy(bt.Strategy):
             price_diff2 = (self.asset2.close[0] - pos2.price) * pos2.size
             unrealized += price_diff2
         self.unrealized_pnl = unrealized
+        self.final_position = self.position_snapshot()
 
         if self.active_trade:
-            beta = self.compute_beta()
+            beta = self.hedge.beta
             final_spread = (np.log(self.asset1.close[0]) - beta * np.log(self.asset2.close[0])
                             if self.p.use_log_spread else self.asset1.close[0] - beta * self.asset2.close[0])
             self._close_trade(final_spread)
@@ -204,28 +271,110 @@ class SpreadPairStrategy(bt.Strategy):
             self.log(f"[STRATEGY] - Forced exit at {final_spread:.2f}")
             self.active_trade = None
 
-        if self.trades:
-            df = pd.DataFrame(self.trades)
-            df = df[['symbol', 'side', 'entry_date', 'entry_spread', 'exit_date', 'exit_spread',
-                    'size1', 'size2', 'pnl', 'duration', 'return_pct']]
-            file_path = 'data/processed/spread_trades.csv'
-            df.to_csv(file_path, mode='a' if os.path.exists(file_path) else 'w',
-                    header=not os.path.exists(file_path), index=False)
+        if self.p.write_csv:
+            with self._stage("stop_csv_writes"):
+                if self.trades:
+                    df = self.trades.to_dataframe()[TRADE_CSV_COLUMNS]
+                    file_path = 'data/processed/spread_trades.csv'
+                    df.to_csv(file_path, mode='a' if os.path.exists(file_path) else 'w',
+                            header=not os.path.exists(file_path), index=False)
+
+                summary_path = 'data/processed/pairwise_pnl_summary.csv'
+                df_row = pd.DataFrame([self.pnl_summary()])
+                df_row.to_csv(summary_path, mode='a' if os.path.exists(summary_path) else 'w',
+                            header=not os.path.exists(summary_path), index=False)
+
+        if self.p.signal_archive:
+            with self._stage("stop_signal_archive"):
+                self.save_signals()
+
+        self.log(f"Pair PnL | Realized: {self.realized_pnl:.2f} | Unrealized: {self.unrealized_pnl:.2f}")
+
+    def checkpoint_state(self):
+        """Everything but the CHECKPOINT_SERIES needed to continue from the current bar."""
+        return {
+            'active_trade': self.active_trade,
+            'trades': self.trades,
+            'subbook_value': self.subbook_value,
+            'realized_pnl': self.realized_pnl,
+            'unrealized_pnl': self.unrealized_pnl,
+            'hedge': self.hedge,
+            '_hedge_stamp': self._hedge_stamp,
+            'entry_timestamps': self.entry_timestamps,
+            'exit_timestamps': self.exit_timestamps,
+        }
+
+    def position_snapshot(self, assume_open=False):
+        """
+        The pair's spread position at the current bar as a risk.stress
+        position row, or None when flat. With assume_open a flat pair gets
+        the position an entry would take now, in the direction of its
+        z-score. entry_spread is the current spread and price1/price2 the
+        current closes, so scenario PnL is measured from this bar;
+        stop_distance is what is left of the stop after the move since the
+        trade was entered.
+        """
+        if not self.zscore_series:
+            return None
+        beta = self.hedge.beta
+        spread = self.spread_hist[-1]
+        zscore = self.zscore_series[-1]
+        stop_distance = self.p.stop_loss_multiple * (np.std(self.spread_hist[-self.p.volatility_lookback:]) + 1e-6)
+
+        if self.active_trade:
+            side = self.active_trade['side']
+            direction = 1 if side == 'Long Spread' else -1
+            size1, size2 = self.active_trade['size1'], self.active_trade['size2']
+            stop_distance += direction * (spread - self.active_trade['entry_spread'])
+        elif assume_open and zscore != 0:
+            direction = -1 if zscore > 0 else 1  # short the spread when it is rich
+            side = 'Long Spread' if direction > 0 else 'Short Spread'
+            size1, size2 = self.calc_hedged_position_size(beta)
+        else:
+            return None
+
+        return {
+            'pair': f'{self.p.asset1_name} - {self.p.asset2_name}',
+            's1': self.p.asset1_name,
+            's2': self.p.asset2_name,
+            'subbook': self.p.subbook_name,
+            'side': side,
+            'direction': direction,
+            'size1': size1,
+            'size2': size2,
+            'beta': beta,
+            'price1': self.asset1.close[0],
+            'price2': self.asset2.close[0],
+            'log_spread': bool(self.p.use_log_spread),
+            'entry_spread': spread,
+            'zscore': zscore,
+            'stop_distance': stop_distance,
+        }
+
+    def restore_state(self, state, series):
+        for name, value in {**state, **series}.items():
+            setattr(self, name, value)
 
-        summary_row = {
+    def pnl_summary(self):
+        return {
             'pair': f'{self.p.asset1_name} - {self.p.asset2_name}',
             'subbook': self.p.subbook_name,
             'realized_pnl': self.realized_pnl,
             'unrealized_pnl': self.unrealized_pnl,
             'total_pnl': self.realized_pnl + self.unrealized_pnl
         }
-        summary_path = 'data/processed/pairwise_pnl_summary.csv'
-        df_row = pd.DataFrame([summary_row])
-        df_row.to_csv(summary_path, mode='a' if os.path.exists(summary_path) else 'w',
-                    header=not os.path.exists(summary_path), index=False)
 
-        self.log(f"Pair PnL | Realized: {self.realized_pnl:.2f} | Unrealized: {self.unrealized_pnl:.2f}")
+    def save_signals(self):
+        # One z-score per bar once the lookback is filled, so the matching
+        # spreads are the tail of spread_hist.
+        n = len(self.zscore_series)
+        spreads = self.spread_hist[len(self.spread_hist) - n:] if n else []
+        save_signal_archive(f"{self.p.asset1_name}_{self.p.asset2_name}", self.datetime_series,
+                            self.zscore_series, spreads, self.entry_timestamps, self.exit_timestamps,
+                            folder=self.p.signal_dir)
 
     def log(self, txt):
-        dt = self.datas[0].datetime.date(0)
-        print(f"[STRATEGY] - {dt.isoformat()} | {self.p.asset1_name}-{self.p.asset2_name} | {txt}")
+        data = self.datas[0]
+        # Without preloading (streaming feeds) nothing is loaded yet in start().
+        stamp = data.datetime.date(0).isoformat() if len(data) else "-" * 10
+        print(f"[STRATEGY] - {stamp} | {self.p.asset1_name}-{self.p.asset2_name} | {txt}")
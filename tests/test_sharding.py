@@ -0,0 +1,111 @@
+# tests/test_sharding.py — Work queue semantics and sharded vs single-process backtests
+
+import os
+import time
+
+import pytest
+
+from benchmarks.synthetic import generate_market, write_workspace
+from utils.config import candidate_pairs
+from utils.sharding import backtest_units, run_pair_backtest, run_sharded
+from utils.work_queue import WorkQueue, PENDING, CLAIMED
+
+
+def units(n):
+    return [(f"{i:05d}_u", {"i": i}) for i in range(n)]
+
+
+def backdate(queue, state, unit_id, seconds):
+    path = os.path.join(queue.root, state, f"{unit_id}.json")
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+def test_claim_moves_each_unit_to_exactly_one_worker(tmp_path):
+    queue = WorkQueue(str(tmp_path / "q"))
+    queue.enqueue(units(5))
+    # Two workers on the same directory, claiming alternately.
+    a, b = WorkQueue(queue.root), WorkQueue(queue.root)
+    claimed = []
+    while True:
+        unit = a.claim() if len(claimed) % 2 == 0 else b.claim()
+        if unit is None:
+            break
+        claimed.append(unit["id"])
+
+    assert sorted(claimed) == [unit_id for unit_id, _ in units(5)]
+    assert queue.progress() == {"pending": 0, "claimed": 5, "done": 0}
+    assert not [name for name in os.listdir(os.path.join(queue.root, CLAIMED)) if name.endswith(".tmp")]
+
+
+def test_requeue_stale_only_moves_claims_without_heartbeat(tmp_path):
+    queue = WorkQueue(str(tmp_path / "q"))
+    queue.enqueue(units(3))
+    dead, alive, finished = (queue.claim()["id"] for _ in range(3))
+    backdate(queue, CLAIMED, dead, 600)
+    backdate(queue, CLAIMED, finished, 600)
+    queue.heartbeat(alive)
+    # A worker that wrote its result but died before dropping the claim.
+    queue.complete(finished, {"result": 1})
+    open(os.path.join(queue.root, CLAIMED, f"{finished}.json"), "w").close()
+    backdate(queue, CLAIMED, finished, 600)
+
+    assert queue.requeue_stale(60) == [dead]
+    assert queue.progress() == {"pending": 1, "claimed": 1, "done": 1}
+    assert queue.claim()["id"] == dead
+
+
+def test_enqueue_skips_done_and_claimed_units(tmp_path):
+    queue = WorkQueue(str(tmp_path / "q"))
+    queue.enqueue(units(3))
+    first, second = queue.claim()["id"], queue.claim()["id"]
+    queue.complete(first, {"result": 1})
+
+    assert queue.enqueue(units(3)) == 1
+    assert queue.progress() == {"pending": 1, "claimed": 1, "done": 1}
+    assert second not in [name[:-5] for name in os.listdir(os.path.join(queue.root, PENDING))]
+
+
+def test_results_are_ordered_by_unit_id(tmp_path):
+    queue = WorkQueue(str(tmp_path / "q"))
+    queue.enqueue(units(4))
+    claimed = [queue.claim()["id"] for _ in range(4)]
+    for unit_id in reversed(claimed):
+        queue.complete(unit_id, {"result": unit_id})
+
+    assert [r["id"] for r in queue.results()] == sorted(claimed)
+    assert [r["result"] for r in queue.results()] == sorted(claimed)
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    market = generate_market(6, 300, interval="1d", seed=7)
+    config = write_workspace(market, str(tmp_path / "ws"), interval="1d")
+    # Workers are `cli.py worker` subprocesses; they inherit this cwd and read its data/ and config/.
+    monkeypatch.chdir(tmp_path / "ws")
+    return config
+
+
+def test_sharded_backtest_matches_single_process(workspace, tmp_path, capsys):
+    config = workspace
+    manifest = {"kind": "backtest", "config": config}
+    work = backtest_units(candidate_pairs(config))
+    serial = [run_pair_backtest(payload, manifest) for _, payload in work]
+    assert any(r["trades_csv"] for r in serial)
+
+    # A worker died holding the first unit: its claim has no heartbeat.
+    queue_dir = str(tmp_path / "queue")
+    queue = WorkQueue(queue_dir)
+    queue.write_manifest(manifest)
+    queue.enqueue(work)
+    dead = queue.claim()["id"]
+    backdate(queue, CLAIMED, dead, 600)
+    capsys.readouterr()
+
+    results = run_sharded(queue_dir, manifest, work, workers=2, stale_timeout=60, poll_interval=0.2,
+                          timeout=300)
+
+    assert f"Re-queued stale unit {dead}" in capsys.readouterr().out
+    assert [r["id"] for r in results] == [unit_id for unit_id, _ in work]
+    assert not [r for r in results if "error" in r]
+    assert [r["result"] for r in results] == serial
@@ -0,0 +1,315 @@
+# utils/checkpoint.py — Periodic checkpoints and resume for long backtests and optimizer sweeps
+
+import os
+import time
+import json
+import pickle
+import shutil
+import hashlib
+import datetime as _dt
+from collections import OrderedDict
+
+import numpy as np
+import backtrader as bt
+
+DEFAULT_CHECKPOINT = {
+    "enabled": False,
+    "dir": "data/processed/checkpoints",
+    "interval_s": 300,          # wall-clock seconds between checkpoints
+    "every_bars": None,         # ...or every N bars, whichever comes first
+    "optimizer_every_points": 50,
+}
+
+STATE_FILE = "state.pkl"
+
+
+def checkpoint_settings(config):
+    return {**DEFAULT_CHECKPOINT, **config.get("checkpoint", {})}
+
+
+# Backtests and optimizer sweeps share checkpoint.dir but each keeps (and
+# clears) only its own subdirectory.
+def backtest_checkpoint_dir(settings):
+    return os.path.join(settings["dir"], "backtest")
+
+
+def optimizer_checkpoint_path(settings):
+    return os.path.join(settings["dir"], "optimizer", "optimizer.pkl")
+
+
+def fingerprint(*parts):
+    """Short hash of JSON-serialisable parts; a checkpoint only resumes a run with the same one."""
+    h = hashlib.sha1()
+    for part in parts:
+        h.update(json.dumps(part, sort_keys=True, default=str).encode())
+    return h.hexdigest()[:16]
+
+
+def run_fingerprint(config, *parts):
+    # Checkpointing and profiling settings do not change results.
+    return fingerprint({k: v for k, v in config.items() if k not in ("checkpoint", "profiling")}, *parts)
+
+
+def files_stamp(paths):
+    """(path, size, mtime) of each existing file, so rewritten inputs invalidate a checkpoint."""
+    return [(p, os.path.getsize(p), os.path.getmtime(p)) for p in paths if os.path.exists(p)]
+
+
+def clear_checkpoint(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def _atomic_pickle(obj, path):
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+
+
+# --- Backtrader object state --------------------------------------------------
+# Analyzers and the broker keep their running state in plain attributes
+# (floats, dates, OrderedDicts of returns); everything else on them refers to
+# lines, datas or the strategy and is rebuilt by the resumed run.
+
+_SCALARS = (int, float, bool, str, type(None), _dt.date, np.generic)
+
+
+def _plain(value):
+    if isinstance(value, _SCALARS):
+        return True
+    if isinstance(value, (list, tuple)):
+        return all(_plain(v) for v in value)
+    if isinstance(value, dict):
+        return all(isinstance(k, _SCALARS) and _plain(v) for k, v in value.items())
+    return False
+
+
+def plain_attrs(obj, skip=()):
+    return {k: v for k, v in vars(obj).items() if k not in skip and _plain(v)}
+
+
+def _analyzer_state(analyzer):
+    return {"attrs": plain_attrs(analyzer), "children": [_analyzer_state(c) for c in analyzer._children]}
+
+
+def _restore_analyzer(analyzer, state):
+    for k, v in state["attrs"].items():
+        setattr(analyzer, k, v)
+    for child, child_state in zip(analyzer._children, state["children"]):
+        _restore_analyzer(child, child_state)
+
+
+class BacktestCheckpoint(bt.Strategy):
+    """
+    Checkpoints a portfolio run. Added to Cerebro after the pair strategies,
+    so its next() sees every strategy's state at the end of the bar.
+
+    A checkpoint holds the broker (cash, values, positions), every
+    analyzer's running state, the shared risk monitor and each strategy's
+    checkpoint_state(). The per-bar series (spread, z-score, timestamps)
+    only grow, so each checkpoint writes just the bars added since the last
+    one as an .npz segment. The cost of one checkpoint is bounded by the
+    checkpoint interval, not by the run length. state.pkl is replaced
+    atomically and names the segments it covers. Checkpoints are only taken
+    on bars without open orders.
+
+    On resume the feeds are replayed from the start. Pair strategies skip
+    their logic up to the checkpointed bar, where the saved state is put
+    back, so bar counts, holding periods and analyzers continue exactly as
+    in an uninterrupted run.
+    """
+    params = (
+        ("directory", os.path.join(DEFAULT_CHECKPOINT["dir"], "backtest")),
+        ("fingerprint", None),
+        ("interval_s", DEFAULT_CHECKPOINT["interval_s"]),
+        ("every_bars", None),
+        ("resume", False),
+    )
+
+    def start(self):
+        self.pairs = [s for s in self.env.runningstrats if hasattr(s, "checkpoint_state")]
+        self.monitor = next((s.p.risk_monitor for s in self.pairs if s.p.risk_monitor is not None), None)
+        self.series = self.pairs[0].CHECKPOINT_SERIES if self.pairs else {}
+        self.segments = 0
+        self.saved_len = [{name: 0 for name in self.series} for _ in self.pairs]
+        self.last_bar = 0
+        self.last_time = time.time()
+        self.stats = {"checkpoints": 0, "seconds": 0.0, "bytes": 0}
+        self._pending = None
+
+        os.makedirs(self.p.directory, exist_ok=True)
+        path = os.path.join(self.p.directory, STATE_FILE)
+        if self.p.resume and os.path.exists(path):
+            with open(path, "rb") as f:
+                state = pickle.load(f)
+            if state["fingerprint"] != self.p.fingerprint:
+                raise ValueError(f"[CHECKPOINT] - {path} belongs to a different config or data set; "
+                                 f"remove it or run without --resume")
+            self._pending = state
+            for strat in self.pairs:
+                strat._fast_forward = state["bar"]
+            print(f"[CHECKPOINT] - Resuming from bar {state['bar']} ({state['datetime']}); "
+                  f"replaying earlier bars without strategy logic")
+        else:
+            clear_checkpoint(self.p.directory)
+            os.makedirs(self.p.directory, exist_ok=True)
+
+    def next(self):
+        bar = len(self)
+        if self._pending is not None:
+            if bar == self._pending["bar"]:
+                self._restore(self._pending)
+                self._pending = None
+            return
+
+        due = time.time() - self.last_time >= self.p.interval_s
+        if self.p.every_bars:
+            due = due or bar - self.last_bar >= self.p.every_bars
+        broker = self.broker
+        if due and not broker.pending and not broker.submitted and not broker.notifs:
+            self.save(bar)
+
+    def save(self, bar):
+        t0 = time.time()
+        segment = {}
+        for i, strat in enumerate(self.pairs):
+            for name, dtype in self.series.items():
+                values = getattr(strat, name)
+                start = self.saved_len[i][name]
+                segment[f"{i}__{name}"] = np.array(values[start:], dtype=dtype)
+                self.saved_len[i][name] = len(values)
+        seg_path = os.path.join(self.p.directory, f"segment_{self.segments:05d}.npz")
+        np.savez(seg_path, **segment)
+        self.segments += 1
+
+        broker = self.broker
+        state = {
+            "fingerprint": self.p.fingerprint,
+            "bar": bar,
+            "datetime": self.datas[0].datetime.datetime(0),
+            "segments": self.segments,
+            "series_len": self.saved_len,
+            "broker": plain_attrs(broker, skip=("startingcash", "positions", "d_credit")),
+            "positions": {d._name: plain_attrs(p) for d, p in broker.positions.items()},
+            "analyzers": [[_analyzer_state(a) for a in s.analyzers] for s in self.pairs],
+            "monitor": vars(self.monitor) if self.monitor is not None else None,
+            "strategies": [s.checkpoint_state() for s in self.pairs],
+        }
+        path = os.path.join(self.p.directory, STATE_FILE)
+        _atomic_pickle(state, path)
+
+        self.last_bar = bar
+        self.last_time = time.time()
+        self.stats["checkpoints"] += 1
+        self.stats["seconds"] += self.last_time - t0
+        self.stats["bytes"] += os.path.getsize(seg_path) + os.path.getsize(path)
+
+    def _restore(self, state):
+        dt = self.datas[0].datetime.datetime(0)
+        if dt != state["datetime"]:
+            raise ValueError(f"[CHECKPOINT] - Bar {state['bar']} is {dt} in this run but {state['datetime']} "
+                             f"in the checkpoint; the data changed since it was written")
+
+        series = [{name: [] for name in self.series} for _ in self.pairs]
+        for n in range(state["segments"]):
+            with np.load(os.path.join(self.p.directory, f"segment_{n:05d}.npz")) as seg:
+                for i in range(len(self.pairs)):
+                    for name in self.series:
+                        series[i][name].extend(seg[f"{i}__{name}"].tolist())
+
+        broker = self.broker
+        for k, v in state["broker"].items():
+            setattr(broker, k, v)
+        names = {d._name: d for d in self.datas}
+        for name, attrs in state["positions"].items():
+            position = broker.positions[names[name]]
+            for k, v in attrs.items():
+                setattr(position, k, v)
+        for strat, analyzer_states in zip(self.pairs, state["analyzers"]):
+            for analyzer, analyzer_state in zip(strat.analyzers, analyzer_states):
+                _restore_analyzer(analyzer, analyzer_state)
+        if self.monitor is not None and state["monitor"] is not None:
+            self.monitor.__dict__.update(state["monitor"])
+        for strat, strat_state, strat_series in zip(self.pairs, state["strategies"], series):
+            strat.restore_state(strat_state, strat_series)
+
+        self.segments = state["segments"]
+        self.saved_len = state["series_len"]
+        self.last_bar = state["bar"]
+        self.last_time = time.time()
+        print(f"[CHECKPOINT] - Restored state at bar {state['bar']} ({dt})")
+
+    def stop(self):
+        if self.stats["checkpoints"]:
+            print(f"[CHECKPOINT] - {self.stats['checkpoints']} checkpoint(s), "
+                  f"{self.stats['seconds']:.2f}s, {self.stats['bytes'] / 1e6:.2f} MB written")
+
+
+# --- Optimizer ----------------------------------------------------------------
+
+class GridCheckpoint:
+    """
+    Completed optimizer grid points, kept as an append-only stream of
+    pickled batches: a header with the run fingerprint, then one
+    {key: result} dict per checkpoint. Each save appends only the points
+    finished since the previous one. A batch cut short by an interruption
+    is ignored on load.
+    """
+
+    def __init__(self, path, run_fingerprint, every_points=50, interval_s=300):
+        self.path = path
+        self.fingerprint = run_fingerprint
+        self.every_points = every_points
+        self.interval_s = interval_s
+        self.done = OrderedDict()
+        self._unsaved = {}
+        self._last = time.time()
+
+    def load(self, resume=True):
+        """Completed points of a previous run with the same fingerprint; starts fresh otherwise."""
+        self.done.clear()
+        if resume and os.path.exists(self.path):
+            with open(self.path, "rb") as f:
+                try:
+                    header = pickle.load(f)
+                except (EOFError, pickle.UnpicklingError):
+                    header = {}
+                if header.get("fingerprint") == self.fingerprint:
+                    while True:
+                        try:
+                            self.done.update(pickle.load(f))
+                        except (EOFError, pickle.UnpicklingError):
+                            break
+                else:
+                    print(f"[CHECKPOINT] - {self.path} is from a different run; starting over")
+        # Rewritten so a batch cut short by the interruption does not precede new appends.
+        self._rewrite()
+        return self.done
+
+    def _rewrite(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump({"fingerprint": self.fingerprint}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            if self.done:
+                pickle.dump(dict(self.done), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self.path)
+
+    def add(self, key, result):
+        self.done[key] = result
+        self._unsaved[key] = result
+        if len(self._unsaved) >= self.every_points or time.time() - self._last >= self.interval_s:
+            self.save()
+
+    def save(self):
+        if self._unsaved:
+            with open(self.path, "ab") as f:
+                pickle.dump(self._unsaved, f, protocol=pickle.HIGHEST_PROTOCOL)
+            self._unsaved = {}
+        self._last = time.time()
+
+    def clear(self):
+        clear_checkpoint(self.path)
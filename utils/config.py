@@ -0,0 +1,113 @@
+# utils/config.py — Cached config access shared by every entry point
+
+import os
+import json
+from functools import lru_cache
+from itertools import combinations
+
+DEFAULT_CONFIG_PATH = "config/config.json"
+
+
+@lru_cache(maxsize=None)
+def _load_json(path, mtime):
+    # mtime is part of the cache key so an edited file is re-read.
+    with open(path) as f:
+        return json.load(f)
+
+
+def load_json(path):
+    path = os.path.abspath(path)
+    return _load_json(path, os.path.getmtime(path))
+
+
+def load_config(path=DEFAULT_CONFIG_PATH):
+    """Parsed config.json, cached per file path and modification time."""
+    return load_json(path)
+
+
+def load_symbol_map(config=None):
+    config = config if config is not None else load_config()
+    return load_json(config.get("symbol_map_path", "config/contracts.json"))
+
+
+def config_symbols(config):
+    """Configured contracts in config order, without duplicates."""
+    return list(dict.fromkeys(
+        symbol for entry in config["capital_allocation"].values() for symbol in entry["contracts"]
+    ))
+
+
+def subbook_index(config):
+    """
+    symbol -> subbook for config["capital_allocation"]; a symbol listed in
+    several subbooks belongs to the first. Callers build it once per run
+    (PortfolioEngine keeps it as symbol_index) and pass it down, so an
+    edited config is picked up by the next run.
+    """
+    index = {}
+    for book, info in config["capital_allocation"].items():
+        for symbol in info["contracts"]:
+            index.setdefault(symbol, book)
+    return index
+
+
+def find_subbook(symbol, config):
+    """Subbook of a single symbol; loops over many symbols should use subbook_index."""
+    return subbook_index(config).get(symbol)
+
+
+def candidate_pairs(config, verbose=True):
+    """
+    Pairs admitted by pair_mode and excluded_pairs, as (s1, s2, book1, book2).
+    """
+    excluded_pairs = set(config.get("excluded_pairs", []))
+    pair_mode = config.get("pair_mode", "intra")
+    books = subbook_index(config)
+
+    pairs = []
+    for s1, s2 in combinations(config_symbols(config), 2):
+        book1 = books.get(s1)
+        book2 = books.get(s2)
+
+        pair_name = f"{s1} - {s2}"
+        reverse_pair = f"{s2} - {s1}"
+
+        if pair_name in excluded_pairs or reverse_pair in excluded_pairs:
+            if verbose:
+                print(f"[MAIN] - Skipping excluded pair: {pair_name}")
+            continue
+
+        if book1 is None or book2 is None:
+            if verbose:
+                print(f"[MAIN] - Skipping pair {s1}-{s2} | book1={book1}, book2={book2}")
+            continue
+
+        if pair_mode == "intra" and book1 != book2:
+            continue
+        elif pair_mode == "cross" and book1 == book2:
+            continue
+        elif pair_mode not in ["intra", "cross", "all"]:
+            if verbose:
+                print(f"[MAIN] - Invalid pair_mode '{pair_mode}' in config. Skipping pair {s1}-{s2}.")
+            continue
+
+        pairs.append((s1, s2, book1, book2))
+    return pairs
+
+
+def pair_strategy_params(config, s1, s2):
+    """
+    Extra SpreadPairStrategy params for a pair: the "hedge_ratio" section
+    as defaults, then any per-pair entry in "pair_overrides" (either order).
+    """
+    section = config.get("hedge_ratio", {})
+    params = {}
+    if "method" in section:
+        params["hedge_ratio"] = section["method"]
+    for key in ("kalman_delta", "kalman_obs_var", "kalman_zscore"):
+        if key in section:
+            params[key] = section[key]
+
+    overrides = config.get("pair_overrides", {})
+    params.update(overrides.get(f"{s1} - {s2}", overrides.get(f"{s2} - {s1}", {})))
+    return params
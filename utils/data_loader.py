@@ -2,14 +2,39 @@
 
 import pandas as pd
 import os
-import yfinance as yf
 from datetime import datetime, timedelta
 
+RAW_DIR = "data/raw"
+CACHE_DIR = "data/cache"
+
+# yfinance interval -> (pandas resample rule, nominal bar length used for ordering).
+# Every bin is left-closed and labelled with its start, like yfinance's own
+# bars: weeks run Monday-Friday and carry the Monday date (W-MON), months the
+# 1st. yfinance's "5d" is not a fixed bin and is therefore not derived.
+INTERVALS = {
+    "1m": ("1min", timedelta(minutes=1)),
+    "2m": ("2min", timedelta(minutes=2)),
+    "5m": ("5min", timedelta(minutes=5)),
+    "15m": ("15min", timedelta(minutes=15)),
+    "30m": ("30min", timedelta(minutes=30)),
+    "60m": ("60min", timedelta(hours=1)),
+    "90m": ("90min", timedelta(minutes=90)),
+    "1h": ("1h", timedelta(hours=1)),
+    "1d": ("1D", timedelta(days=1)),
+    "1wk": ("W-MON", timedelta(weeks=1)),
+    "1mo": ("MS", timedelta(days=31)),
+}
+
+OHLCV_AGG = {"Open": "first", "High": "max", "Low": "min", "Close": "last", "Volume": "sum"}
+
 def download_data(symbol, start="2022-01-01", interval="1d"):
+    import yfinance as yf  # only needed when data is actually fetched
+
     end = datetime.today()
 
     if interval.endswith("m"):
         start = end - timedelta(days=59)
+    start = pd.Timestamp(start)
 
     df = yf.download(
         symbol,
@@ -37,15 +62,102 @@ def download_data(symbol, start="2022-01-01", interval="1d"):
     return df
 
 def save_to_csv(df, symbol, interval="1d"):
-    folder = f"data/raw/{interval}"
+    folder = f"{RAW_DIR}/{interval}"
     os.makedirs(folder, exist_ok=True)
     path = os.path.join(folder, f"{symbol}.csv")
     df.to_csv(path)
 
 def load_csv(symbol, interval="1d"):
-    path = f"data/raw/{interval}/{symbol}.csv"
+    path = f"{RAW_DIR}/{interval}/{symbol}.csv"
     if not os.path.exists(path):
         raise FileNotFoundError(f"[LOADER] - No data file found for {symbol} at {path}")
     df = pd.read_csv(path, parse_dates=["Date"])
     df = df.set_index("Date")
     return df
+
+
+def can_resample(base, target):
+    """True if target bars can be built exactly from base bars."""
+    if base not in INTERVALS or target not in INTERVALS or base == target:
+        return False
+    base_len, target_len = INTERVALS[base][1], INTERVALS[target][1]
+    if target_len <= base_len:
+        return False
+    # Daily and calendar bars aggregate any finer bars; sub-daily bars must tile evenly.
+    return target_len >= timedelta(days=1) or target_len % base_len == timedelta(0)
+
+def resample_source(symbol, interval):
+    """Finest stored interval for symbol that interval can be derived from, or None."""
+    if not os.path.isdir(RAW_DIR):
+        return None
+    stored = [
+        base for base in os.listdir(RAW_DIR)
+        if can_resample(base, interval) and os.path.exists(os.path.join(RAW_DIR, base, f"{symbol}.csv"))
+    ]
+    return min(stored, key=lambda base: INTERVALS[base][1]) if stored else None
+
+def resample_ohlcv(df, interval, session_start=None):
+    """
+    Aggregate OHLCV bars to a coarser interval in one vectorized pass.
+
+    session_start ("HH:MM") makes daily and longer bars follow the trading
+    session instead of the calendar day: e.g. with "18:00" the Globex
+    session opening Sunday 18:00 is labelled Monday. Bins without any base
+    bar (weekends, holidays, halts) are dropped rather than forward-filled.
+    """
+    rule = INTERVALS[interval][0]
+    agg = {col: how for col, how in OHLCV_AGG.items() if col in df.columns}
+
+    index = df.index
+    shifted = session_start is not None and INTERVALS[interval][1] >= timedelta(days=1)
+    if shifted:
+        start = pd.Timedelta(f"{session_start}:00")
+        index = index + (pd.Timedelta(days=1) - start)
+
+    out = df[list(agg)].set_axis(index).resample(rule, label="left", closed="left").agg(agg)
+    out = out[out["Close"].notna()] if "Close" in out.columns else out.dropna(how="all")
+    out.index.name = "Date"
+    return out
+
+def _source_stamp(path):
+    stat = os.stat(path)
+    return {"source": os.path.abspath(path), "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+def load_resampled(symbol, interval, session_start=None):
+    """
+    Bars for interval derived from the finest stored interval, cached as a
+    pickle under data/cache/{interval}/. The cache entry records the base
+    file's size and mtime plus the resample rule and is rebuilt whenever
+    either changes.
+    """
+    base = resample_source(symbol, interval)
+    if base is None:
+        raise FileNotFoundError(f"[LOADER] - No data to derive {interval} bars for {symbol}")
+
+    base_path = os.path.join(RAW_DIR, base, f"{symbol}.csv")
+    stamp = {**_source_stamp(base_path), "base": base, "rule": INTERVALS[interval][0],
+             "session_start": session_start}
+    cache_path = os.path.join(CACHE_DIR, interval, f"{symbol}.pkl")
+
+    if os.path.exists(cache_path):
+        try:
+            cached = pd.read_pickle(cache_path)
+            if cached["stamp"] == stamp:
+                return cached["frame"]
+        except Exception:
+            pass
+
+    print(f"[LOADER] - Resampling {symbol} {base} -> {interval}")
+    df = resample_ohlcv(load_csv(symbol, interval=base), interval, session_start=session_start)
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    pd.to_pickle({"stamp": stamp, "frame": df}, cache_path)
+    return df
+
+def load_bars(symbol, interval="1d", resample=True, session_start=None):
+    """Stored bars for interval if present, else bars resampled from a finer stored interval."""
+    try:
+        return load_csv(symbol, interval=interval)
+    except FileNotFoundError:
+        if not resample:
+            raise
+        return load_resampled(symbol, interval, session_start=session_start)
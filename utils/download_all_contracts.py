@@ -1,15 +1,19 @@
 # utils/download_all_contracts.py
-
+import sys
 import os
-import json
-from data_loader import download_data, save_to_csv
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.config import load_json
+from utils.data_loader import download_data, save_to_csv
 
 def load_contracts(path="config/contracts.json"):
-    with open(path) as f:
-        return json.load(f)
+    return load_json(path)
 
-def download_all(start_date="2023-01-01", interval="1d", output_dir="data/raw"):
+def download_all(start_date="2023-01-01", interval="1d", output_dir="data/raw", symbols=None):
     contracts = load_contracts()
+    if symbols:
+        contracts = {s: contracts[s] for s in symbols if s in contracts}
     os.makedirs(output_dir, exist_ok=True)
 
     for symbol, yf_symbol in contracts.items():
@@ -17,8 +21,8 @@ def download_all(start_date="2023-01-01", interval="1d", output_dir="data/raw"):
             print(f"[DOWNLOADER] - Downloading {symbol} ({yf_symbol})...")
             df = download_data(yf_symbol, start=start_date, interval=interval)
             if not df.empty:
-                save_to_csv(df, symbol)
-                print(f"[DOWNLOADER] - Saved {symbol} to {output_dir}/{symbol}.csv")
+                save_to_csv(df, symbol, interval=interval)
+                print(f"[DOWNLOADER] - Saved {symbol} to {output_dir}/{interval}/{symbol}.csv")
             else:
                 print(f"[DOWNLOADER] - No data for {symbol}")
         except Exception as e:
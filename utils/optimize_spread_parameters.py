@@ -5,130 +5,179 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 # optimize_spread_parameters.py
 
-import os
-import json
 import pandas as pd
 import backtrader as bt
 from itertools import product, combinations
-from utils.data_loader import load_csv
+from utils.config import load_config, config_symbols, subbook_index
+from utils.data_loader import load_csv, RAW_DIR
+from utils.checkpoint import GridCheckpoint, checkpoint_settings, optimizer_checkpoint_path, run_fingerprint, files_stamp
+from utils.results_db import record_optimizer_outputs
 from strategies.spread_pair_strategy import SpreadPairStrategy
 import statsmodels.api as sm
 
-# Load config
-with open("config/config.json") as f:
-    config = json.load(f)
-
-symbol_map_path = config.get("symbol_map_path", "config/contracts.json")
-with open(symbol_map_path) as f:
-    symbol_map = json.load(f)
-
-capital_allocation = config["capital_allocation"]
-symbols_by_subbook = {book: OPTIMIZER["contracts"] for book, OPTIMIZER in capital_allocation.items()}
-all_symbols = sum([v for v in symbols_by_subbook.values()], [])
-start_date = config.get("start_date", "2023-01-01")
-initial_capital = config.get("capital", 10_000_000)
-slippage_pct = config.get("slippage_pct", 0.001)
-
-def find_subbook(symbol):
-    for book, contracts in symbols_by_subbook.items():
-        if symbol in contracts:
-            return book
-    return None
-
-def estimate_beta(asset1_series, asset2_series):
-    model = sm.OLS(asset1_series, sm.add_constant(asset2_series)).fit()
-    return model.params.iloc[1]
-
 # Parameter grid
 z_entries = [0.5, 1.0, 1.5]
 z_exits = [0.1, 0.25, 0.5]
 lookbacks = [10, 20, 30]
 param_grid = list(product(z_entries, z_exits, lookbacks))
 
-results = []
-
-# Build intra + cross subbook pairs
-pairs = []
-for a, b in combinations(set(all_symbols), 2):
-    book1 = find_subbook(a)
-    book2 = find_subbook(b)
-    if not book1 or not book2:
-        continue
-    tag = book1 if book1 == book2 else "cross"
-    pairs.append((a, b, tag))
-
-print(f"\n[OPTIMIZER] - Total Pairs to Optimize: {len(pairs)}")
-
-for s1, s2, book in pairs:
-    print(f"\n[OPTIMIZER] - Optimizing {s1}-{s2} ({book})")
-    subbook_budget = capital_allocation.get(book, {}).get("budget", initial_capital)
-    best_result = None
-
-    try:
-        df1 = load_csv(s1)
-        df2 = load_csv(s2)
-        common_idx = df1.index.intersection(df2.index)
-        df1 = df1.loc[common_idx]
-        df2 = df2.loc[common_idx]
-        if len(common_idx) < 50:
-            print(f"[OPTIMIZER] - Not enough data overlap for {s1}-{s2}")
+def estimate_beta(asset1_series, asset2_series):
+    model = sm.OLS(asset1_series, sm.add_constant(asset2_series)).fit()
+    return model.params.iloc[1]
+
+def optimizer_pairs(config):
+    """Intra + cross subbook pairs, tagged with the subbook (or "cross")."""
+    books = subbook_index(config)
+    pairs = []
+    for a, b in combinations(config_symbols(config), 2):
+        book1 = books.get(a)
+        book2 = books.get(b)
+        if not book1 or not book2:
             continue
+        tag = book1 if book1 == book2 else "cross"
+        pairs.append((a, b, tag))
+    return pairs
+
+def load_pair(s1, s2, min_overlap=50):
+    """Both contracts on their common index, or None when the overlap is too short."""
+    df1 = load_csv(s1)
+    df2 = load_csv(s2)
+    common_idx = df1.index.intersection(df2.index)
+    if len(common_idx) < min_overlap:
+        return None
+    return df1.loc[common_idx], df2.loc[common_idx]
+
+def evaluate_point(df1, df2, s1, s2, book, beta, z_entry, z_exit, lookback,
+                   subbook_budget, slippage_pct, write_csv=False, signal_archive=False, **strategy_kwargs):
+    """
+    Backtest one pair at one grid point and return its result row.
+
+    The strategy's trade CSVs and signal archive are off unless asked for,
+    so evaluating a grid point never overwrites the backtest's outputs.
+    """
+    cerebro = bt.Cerebro()
+    cerebro.broker.set_cash(subbook_budget)
+
+    data1 = bt.feeds.PandasData(dataname=df1, name=s1)
+    data2 = bt.feeds.PandasData(dataname=df2, name=s2)
+    cerebro.adddata(data1)
+    cerebro.adddata(data2)
+
+    cerebro.addstrategy(
+        SpreadPairStrategy,
+        asset1_name=s1,
+        asset2_name=s2,
+        beta_static=beta,
+        spread_lookback=lookback,
+        z_entry=z_entry,
+        z_exit=z_exit,
+        slippage_pct=slippage_pct,
+        subbook_name=book,
+        subbook_start_capital=subbook_budget,
+        write_csv=write_csv,
+        signal_archive=signal_archive,
+        **strategy_kwargs
+    )
+
+    cerebro.addanalyzer(bt.analyzers.SharpeRatio, _name="sharpe")
+    cerebro.addanalyzer(bt.analyzers.DrawDown, _name="drawdown")
+    cerebro.addanalyzer(bt.analyzers.Returns, _name="returns")
+
+    results_bt = cerebro.run()
+    strat = results_bt[0]
+
+    sharpe = strat.analyzers.sharpe.get_analysis().get("sharperatio", 0.0)
+    drawdown = strat.analyzers.drawdown.get_analysis().get("max", {}).get("drawdown", 1e6)
+    total_return = strat.analyzers.returns.get_analysis().get("rtot", 0.0)
+
+    return {
+        "pair": f"{s1}-{s2}",
+        "subbook": book,
+        "z_entry": z_entry,
+        "z_exit": z_exit,
+        "lookback": lookback,
+        "sharpe": sharpe,
+        "drawdown": drawdown,
+        "return_pct": total_return
+    }
+
+def save_results(results, output_path="data/processed/best_pair_parameters.csv"):
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    df = pd.DataFrame(results)
+    df.to_csv(output_path, index=False)
+    print(f"\n[OPTIMIZER] - Optimization completed and saved to {output_path}")
+    return df
+
+def optimize(config=None, grid=None, output_path="data/processed/best_pair_parameters.csv", resume=False):
+    """
+    Grid-search every optimizer pair and save the results.
+
+    With checkpoint.enabled (or resume=True) completed grid points are
+    checkpointed; resume=True skips the points an interrupted run already
+    finished, so the saved results match an uninterrupted run.
+    """
+    config = config if config is not None else load_config()
+    grid = grid if grid is not None else param_grid
+    capital_allocation = config["capital_allocation"]
+    initial_capital = config.get("capital", 10_000_000)
+    slippage_pct = config.get("slippage_pct", 0.001)
+
+    results = []
+    pairs = optimizer_pairs(config)
+
+    print(f"\n[OPTIMIZER] - Total Pairs to Optimize: {len(pairs)}")
+
+    settings = checkpoint_settings(config)
+    checkpoint = None
+    if settings["enabled"] or resume:
+        raw_files = [f"{RAW_DIR}/1d/{symbol}.csv" for symbol in config_symbols(config)]
+        checkpoint = GridCheckpoint(optimizer_checkpoint_path(settings),
+                                    run_fingerprint(config, [list(point) for point in grid], files_stamp(raw_files)),
+                                    every_points=settings["optimizer_every_points"],
+                                    interval_s=settings["interval_s"])
+        if checkpoint.load(resume):
+            print(f"[CHECKPOINT] - Resuming: {len(checkpoint.done)} grid point(s) already completed")
+
+    for s1, s2, book in pairs:
+        keys = [(s1, s2, i) for i in range(len(grid))]
+        if checkpoint is not None and all(key in checkpoint.done for key in keys):
+            print(f"\n[OPTIMIZER] - {s1}-{s2} ({book}) restored from checkpoint")
+            results.extend(checkpoint.done[key] for key in keys)
+            continue
+
+        print(f"\n[OPTIMIZER] - Optimizing {s1}-{s2} ({book})")
+        subbook_budget = capital_allocation.get(book, {}).get("budget", initial_capital)
+
+        try:
+            pair_data = load_pair(s1, s2)
+            if pair_data is None:
+                print(f"[OPTIMIZER] - Not enough data overlap for {s1}-{s2}")
+                continue
+            df1, df2 = pair_data
+
+            beta = estimate_beta(df1["Close"], df2["Close"])
+
+            for key, (z_entry, z_exit, lookback) in zip(keys, grid):
+                if checkpoint is not None and key in checkpoint.done:
+                    results.append(checkpoint.done[key])
+                    continue
+                # Grid points must not touch the backtest's trade CSVs or signal archives.
+                result = evaluate_point(df1, df2, s1, s2, book, beta, z_entry, z_exit, lookback,
+                                        subbook_budget, slippage_pct, write_csv=False, signal_archive=False)
+                print(result)
+                results.append(result)
+                if checkpoint is not None:
+                    checkpoint.add(key, result)
+
+        except Exception as e:
+            print(f"[OPTIMIZER] - Skipping {s1}-{s2}: {e}")
+            continue
+
+    df = save_results(results, output_path)
+    if checkpoint is not None:
+        checkpoint.clear()
+    record_optimizer_outputs(config, df)
+    return df
 
-        beta = estimate_beta(df1["Close"], df2["Close"])
-
-        for z_entry, z_exit, lookback in param_grid:
-            cerebro = bt.Cerebro()
-            cerebro.broker.set_cash(subbook_budget)
-
-            data1 = bt.feeds.PandasData(dataname=df1, name=s1)
-            data2 = bt.feeds.PandasData(dataname=df2, name=s2)
-            cerebro.adddata(data1)
-            cerebro.adddata(data2)
-
-            cerebro.addstrategy(
-                SpreadPairStrategy,
-                asset1_name=s1,
-                asset2_name=s2,
-                beta=beta,
-                spread_lookback=lookback,
-                z_entry=z_entry,
-                z_exit=z_exit,
-                slippage_pct=slippage_pct,
-                subbook_name=book,
-                subbook_start_capital=subbook_budget
-            )
-
-            cerebro.addanalyzer(bt.analyzers.SharpeRatio, _name="sharpe")
-            cerebro.addanalyzer(bt.analyzers.DrawDown, _name="drawdown")
-            cerebro.addanalyzer(bt.analyzers.Returns, _name="returns")
-
-            results_bt = cerebro.run()
-            strat = results_bt[0]
-
-            sharpe = strat.analyzers.sharpe.get_analysis().get("sharperatio", 0.0)
-            drawdown = strat.analyzers.drawdown.get_analysis().get("max", {}).get("drawdown", 1e6)
-            total_return = strat.analyzers.returns.get_analysis().get("rtot", 0.0)
-
-            result = {
-                "pair": f"{s1}-{s2}",
-                "subbook": book,
-                "z_entry": z_entry,
-                "z_exit": z_exit,
-                "lookback": lookback,
-                "sharpe": sharpe,
-                "drawdown": drawdown,
-                "return_pct": total_return
-            }
-            print(result)
-            results.append(result)
-
-    except Exception as e:
-        print(f"[OPTIMIZER] - Skipping {s1}-{s2}: {e}")
-        continue
-
-
-# Save results
-os.makedirs("data/processed", exist_ok=True)
-df = pd.DataFrame(results)
-df.to_csv("data/processed/best_pair_parameters.csv", index=False)
-print("\n[OPTIMIZER] - Optimization completed and saved to data/processed/best_pair_parameters.csv")
+if __name__ == "__main__":
+    optimize()
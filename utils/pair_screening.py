@@ -0,0 +1,158 @@
+# utils/pair_screening.py — Score candidate pairs before any strategy is built
+
+import os
+import hashlib
+import numpy as np
+import pandas as pd
+from statsmodels.tsa.stattools import adfuller
+
+DEFAULT_SCREENING = {
+    "enabled": False,
+    "top_n": None,
+    "max_pvalue": 0.10,
+    "min_abs_correlation": 0.0,
+    "min_half_life": 1.0,
+    "max_half_life": None,
+    "min_overlap": 100,
+    "cache_dir": "data/processed/screening",
+}
+
+SCORE_COLUMNS = ["pair", "symbol1", "symbol2", "overlap", "correlation", "beta",
+                 "cointegration_pval", "half_life", "score"]
+
+
+def screening_settings(config):
+    return {**DEFAULT_SCREENING, **config.get("screening", {})}
+
+
+def data_version(symbol_data, symbols):
+    """
+    Fingerprint of the close series used for screening. Any change to a
+    symbol's history (new bars, revised prices) yields a new version.
+    """
+    h = hashlib.sha1()
+    for symbol in sorted(symbols):
+        close = symbol_data[symbol]["Close"]
+        h.update(symbol.encode())
+        h.update(str(len(close)).encode())
+        if len(close):
+            h.update(str(close.index[0]).encode())
+            h.update(str(close.index[-1]).encode())
+            h.update(pd.util.hash_pandas_object(close, index=True).values.tobytes())
+    return h.hexdigest()[:16]
+
+
+def half_life(spread):
+    """Mean-reversion half-life (bars) from an AR(1) fit of Δspread on lagged spread."""
+    lagged = spread[:-1] - spread[:-1].mean()
+    delta = np.diff(spread)
+    denom = lagged @ lagged
+    if denom <= 0:
+        return np.inf
+    lam = (lagged @ delta) / denom
+    return -np.log(2) / lam if lam < 0 else np.inf
+
+
+def score_pair(close1, close2):
+    """
+    Screening statistics for one pair on their common timestamps, using the
+    same log prices the strategy builds its spread from.
+    """
+    joined = pd.concat([close1, close2], axis=1, join="inner").dropna()
+    overlap = len(joined)
+    result = {"overlap": overlap, "correlation": np.nan, "beta": np.nan,
+              "cointegration_pval": np.nan, "half_life": np.nan}
+    if overlap < 20:
+        return result
+
+    y = np.log(joined.iloc[:, 0].to_numpy(dtype=float) + 1e-6)
+    x = np.log(joined.iloc[:, 1].to_numpy(dtype=float) + 1e-6)
+
+    ry, rx = np.diff(y), np.diff(x)
+    if ry.std() > 0 and rx.std() > 0:
+        result["correlation"] = float(np.corrcoef(ry, rx)[0, 1])
+
+    xc = x - x.mean()
+    var_x = xc @ xc
+    if var_x <= 0:
+        return result
+    beta = (xc @ (y - y.mean())) / var_x
+    spread = y - beta * x
+
+    result["beta"] = float(beta)
+    result["cointegration_pval"] = float(adfuller(spread)[1])
+    result["half_life"] = float(half_life(spread))
+    return result
+
+
+def compute_scores(symbol_data, candidates):
+    rows = []
+    for s1, s2, *_ in candidates:
+        stats = score_pair(symbol_data[s1]["Close"], symbol_data[s2]["Close"])
+        rows.append({"pair": f"{s1} - {s2}", "symbol1": s1, "symbol2": s2, **stats})
+    df = pd.DataFrame(rows, columns=SCORE_COLUMNS[:-1])
+    df["score"] = df["correlation"].abs() * (1 - df["cointegration_pval"])
+    return df
+
+
+def load_or_compute_scores(symbol_data, candidates, cache_dir=DEFAULT_SCREENING["cache_dir"]):
+    """
+    Scores for the candidate pairs, cached per data version so repeated runs
+    on unchanged data only pay for newly added pairs.
+    """
+    symbols = {s for c in candidates for s in c[:2]}
+    version = data_version(symbol_data, symbols)
+    path = os.path.join(cache_dir, f"scores_{version}.csv")
+
+    cached = pd.read_csv(path) if os.path.exists(path) else pd.DataFrame(columns=SCORE_COLUMNS)
+    known = set(cached["pair"])
+    missing = [c for c in candidates if f"{c[0]} - {c[1]}" not in known]
+    if missing:
+        print(f"[SCREEN] - Scoring {len(missing)} pair(s) (data version {version})")
+        fresh = compute_scores(symbol_data, missing)
+        cached = fresh if cached.empty else pd.concat([cached, fresh], ignore_index=True)
+        os.makedirs(cache_dir, exist_ok=True)
+        cached.to_csv(path, index=False)
+    else:
+        print(f"[SCREEN] - Using cached scores for data version {version}")
+
+    wanted = [f"{c[0]} - {c[1]}" for c in candidates]
+    return cached.set_index("pair").loc[wanted].reset_index()
+
+
+def screen_pairs(symbol_data, candidates, settings):
+    """
+    Filter candidate pairs (tuples starting with s1, s2) by overlap,
+    correlation, cointegration p-value and half-life, then keep the best
+    top_n by score. Returns (admitted candidates, scores DataFrame).
+    """
+    scores = load_or_compute_scores(symbol_data, candidates, settings["cache_dir"])
+
+    passed = scores["overlap"] >= settings["min_overlap"]
+    passed &= scores["correlation"].abs() >= settings["min_abs_correlation"]
+    passed &= scores["cointegration_pval"] <= settings["max_pvalue"]
+    passed &= scores["half_life"] >= settings["min_half_life"]
+    if settings["max_half_life"] is not None:
+        passed &= scores["half_life"] <= settings["max_half_life"]
+    scores["admitted"] = passed.fillna(False)
+
+    ranked = scores[scores["admitted"]].sort_values("score", ascending=False)
+    if settings["top_n"]:
+        ranked = ranked.head(settings["top_n"])
+    admitted_pairs = set(ranked["pair"])
+    scores["admitted"] = scores["pair"].isin(admitted_pairs)
+
+    admitted = [c for c in candidates if f"{c[0]} - {c[1]}" in admitted_pairs]
+    print(f"[SCREEN] - Admitted {len(admitted)}/{len(candidates)} pairs")
+    return admitted, scores
+
+
+def summarize(scores, path=None):
+    """Print the score table (best first) and optionally save it."""
+    table = scores.sort_values("score", ascending=False)
+    with pd.option_context("display.width", 160, "display.max_rows", 500):
+        print(table.to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+    if path:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        table.to_csv(path, index=False)
+        print(f"[SCREEN] - Screening scores saved to {path}")
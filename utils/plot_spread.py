@@ -1,57 +1,158 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
-import os
 
-def plot_spread_zscore_with_trades(pair_id: str, z_entry=1.0, z_exit=0.25):
+from utils.signal_archive import SIGNAL_DIR, archive_path, load_signal_archive
+
+
+def minmax_downsample(x, y, n_out):
     """
-    Plot z-score and spread with trade entry/exit markers for a given pair.
+    Keep the min and max of y in each of n_out // 2 equal-count buckets, in
+    time order. Preserves every spike's extent; fully vectorized.
+    """
+    n = len(y)
+    n_buckets = n_out // 2
+    if n <= n_out or n_buckets < 1:
+        return np.arange(n)
 
-    Args:
-        pair_id (str): e.g., "CL_NG"
-        z_entry (float): z-score entry threshold
-        z_exit (float): z-score exit threshold
+    edges = np.linspace(0, n, n_buckets + 1).astype(np.int64)
+    starts = edges[:-1]
+    # Pad the series so every bucket can be viewed as one row of equal width.
+    width = int(np.max(np.diff(edges)))
+    raw_idx = starts[:, None] + np.arange(width)[None, :]
+    valid = raw_idx < edges[1:, None]
+    values = y[np.minimum(raw_idx, n - 1)]
+
+    lo = np.where(valid, values, np.inf).argmin(axis=1)
+    hi = np.where(valid, values, -np.inf).argmax(axis=1)
+    idx = np.concatenate([starts + lo, starts + hi])
+    return np.unique(idx)
+
+
+def lttb_downsample(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets: pick, per bucket, the point forming the
+    largest triangle with the previously kept point and the next bucket's
+    mean. Keeps the visual shape with n_out points; one vectorized step per
+    bucket.
     """
-    base_path = "data/processed/zscore/"
+    n = len(y)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+
+    idx = np.empty(n_out, dtype=np.int64)
+    idx[0], idx[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        nxt_start, nxt_end = end, (edges[i + 2] if i + 2 < len(edges) else n)
+        avg_x = x[nxt_start:nxt_end].mean() if nxt_end > nxt_start else x[-1]
+        avg_y = y[nxt_start:nxt_end].mean() if nxt_end > nxt_start else y[-1]
+
+        bx, by = x[start:end], y[start:end]
+        area = np.abs((x[a] - avg_x) * (by - y[a]) - (x[a] - bx) * (avg_y - y[a]))
+        a = start + int(area.argmax())
+        idx[i + 1] = a
+    return idx
+
+
+DOWNSAMPLERS = {
+    "lttb": lttb_downsample,
+    "minmax": minmax_downsample,
+}
+
+
+def load_signals(pair_id, base_path=SIGNAL_DIR):
+    """Signal archive written by the strategy, falling back to the legacy CSV triple."""
+    if os.path.exists(archive_path(pair_id, base_path)):
+        return load_signal_archive(pair_id, base_path)
+
     z_path = os.path.join(base_path, f"zscore_series_{pair_id}.csv")
     e_path = os.path.join(base_path, f"entries_{pair_id}.csv")
     x_path = os.path.join(base_path, f"exits_{pair_id}.csv")
-
     if not all(map(os.path.exists, [z_path, e_path, x_path])):
-        print(f"[PLOT] - Missing data files for {pair_id}.")
-        return
+        return None
 
     df = pd.read_csv(z_path, parse_dates=["datetime"])
     entries = pd.read_csv(e_path, parse_dates=["entry"])["entry"]
     exits = pd.read_csv(x_path, parse_dates=["exit"])["exit"]
+    return df, entries, exits
+
+
+def plot_spread_zscore_with_trades(pair_id: str, z_entry=1.0, z_exit=0.25, max_points=4000, method="lttb"):
+    """
+    Plot z-score and spread with trade entry/exit markers for a given pair.
+
+    Args:
+        pair_id (str): e.g., "CL_NG"
+        z_entry (float): z-score entry threshold
+        z_exit (float): z-score exit threshold
+        max_points (int): points drawn per series after downsampling (None = all)
+        method (str): "lttb" or "minmax"
+    """
+    signals = load_signals(pair_id)
+    if signals is None:
+        print(f"[PLOT] - Missing data files for {pair_id}.")
+        return
+    df, entries, exits = signals
+
+    t = df["datetime"].to_numpy()
+    x = t.astype("datetime64[ns]").astype(np.int64)
+    z = df["zscore"].to_numpy(dtype=float)
+    spread = df["spread"].to_numpy(dtype=float)
+    if max_points:
+        downsample = DOWNSAMPLERS[method]
+        z_idx = downsample(x, z, max_points)
+        s_idx = downsample(x, spread, max_points)
+    else:
+        z_idx = s_idx = np.arange(len(df))
 
     fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(14, 8), sharex=True)
 
     # ax1: z-score with entry/exit markers
     # ax2: spread
 
-    ax1.plot(df["datetime"], df["zscore"], label="Z-Score", color="blue")
+    ax1.plot(t[z_idx], z[z_idx], label="Z-Score", color="blue")
     ax1.axhline(z_entry, color="red", linestyle="--", label=f"+Z Entry ({z_entry})")
     ax1.axhline(-z_entry, color="green", linestyle="--", label=f"-Z Entry ({-z_entry})")
     ax1.axhline(z_exit, color="gray", linestyle="--", label=f"+Z Exit ({z_exit})")
     ax1.axhline(-z_exit, color="gray", linestyle="--", label=f"-Z Exit ({-z_exit})")
 
-    for t in entries:
-        ax1.axvline(t, color="blue", linestyle=":", alpha=0.4)
-    for t in exits:
-        ax1.axvline(t, color="orange", linestyle=":", alpha=0.4)
-
+    # One collection per marker type instead of one artist per trade.
+    ax1.vlines(entries, 0, 1, transform=ax1.get_xaxis_transform(), color="blue", linestyle=":", alpha=0.4)
+    ax1.vlines(exits, 0, 1, transform=ax1.get_xaxis_transform(), color="orange", linestyle=":", alpha=0.4)
 
     ax1.set_title(f"Z-Score and Trades for {pair_id}")
     ax1.set_ylabel("Z-Score")
     ax1.legend()
     ax1.grid(True)
-    
-    ax2.plot(df["datetime"], df["spread"], color="black")
+
+    ax2.plot(t[s_idx], spread[s_idx], color="black", label="Spread")
     ax2.set_title("Spread Series")
     ax2.legend()
     ax2.grid(True)
-    
+
     plt.tight_layout()
     plt.show()
 
-plot_spread_zscore_with_trades("CL_NG", z_entry=1.5, z_exit=0.25)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plot a pair's z-score and spread with trade markers.")
+    parser.add_argument("pair_id", nargs="?", default="CL_NG", help='e.g. "CL_NG"')
+    parser.add_argument("--z-entry", type=float, default=1.5)
+    parser.add_argument("--z-exit", type=float, default=0.25)
+    parser.add_argument("--max-points", type=int, default=4000)
+    parser.add_argument("--method", choices=sorted(DOWNSAMPLERS), default="lttb")
+    args = parser.parse_args()
+    plot_spread_zscore_with_trades(args.pair_id, z_entry=args.z_entry, z_exit=args.z_exit,
+                                   max_points=args.max_points, method=args.method)
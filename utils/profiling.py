@@ -0,0 +1,193 @@
+# utils/profiling.py — Named stage timers, per-pair timings and optional cProfile/tracemalloc capture
+
+import io
+import os
+import json
+import time
+import cProfile
+import pstats
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+
+class RunProfiler:
+    """
+    Collects timings for one backtest run.
+
+    Stages are named, re-entrant timers: entering the same stage several
+    times accumulates its total and call count (e.g. "get_data" per symbol).
+    A stage entered inside another records it as its parent; its time is
+    already part of the parent's, so only top-level stages get a share of
+    the run. With memory tracking, each stage's peak is folded into every
+    enclosing stage (and the run) before tracemalloc's peak is reset, so
+    nested stages do not hide their parents' peaks.
+    Strategies report their own per-pair time spent in next() through
+    add_pair_time. cProfile and tracemalloc are only switched on when asked
+    for, since both slow the run down noticeably.
+    """
+
+    def __init__(self, enabled=True, cprofile=False, memory=False, top_n=15):
+        self.enabled = enabled
+        self.use_cprofile = enabled and cprofile
+        self.use_memory = enabled and memory
+        self.top_n = top_n
+
+        self.stages = {}
+        self.stage_order = []
+        self.pair_times = {}
+        self.pair_calls = {}
+
+        self._open = []             # [name, peak_mb] of the stages currently entered, outermost first
+        self._run_peak_mb = 0.0
+        self._profiler = None
+        self._run_start = None
+        self._run_seconds = None
+
+    def start(self):
+        if not self.enabled:
+            return
+        self._run_start = time.perf_counter()
+        if self.use_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if self.use_cprofile:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    def stop(self):
+        if not self.enabled or self._run_start is None:
+            return
+        if self._profiler is not None:
+            self._profiler.disable()
+        self._run_seconds = time.perf_counter() - self._run_start
+        if self.use_memory and tracemalloc.is_tracing():
+            self._fold_peak()
+            self.peak_memory_mb = self._run_peak_mb
+            tracemalloc.stop()
+
+    def _fold_peak(self):
+        """Credit tracemalloc's peak since the last reset to the run and every open stage."""
+        peak = tracemalloc.get_traced_memory()[1] / 1e6
+        self._run_peak_mb = max(self._run_peak_mb, peak)
+        for frame in self._open:
+            frame[1] = max(frame[1], peak)
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+
+        if name not in self.stages:
+            parent = self._open[-1][0] if self._open else None
+            self.stages[name] = {"seconds": 0.0, "calls": 0, "peak_memory_mb": None, "parent": parent}
+            self.stage_order.append(name)
+        tracing = self.use_memory and tracemalloc.is_tracing()
+        if tracing:
+            self._fold_peak()
+            tracemalloc.reset_peak()
+        frame = [name, 0.0]
+        self._open.append(frame)
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            entry = self.stages[name]
+            entry["seconds"] += time.perf_counter() - start
+            entry["calls"] += 1
+            if tracing and tracemalloc.is_tracing():
+                self._fold_peak()
+                entry["peak_memory_mb"] = max(entry["peak_memory_mb"] or 0.0, frame[1])
+            self._open.pop()
+
+    def add_pair_time(self, pair, seconds):
+        self.pair_times[pair] = self.pair_times.get(pair, 0.0) + seconds
+        self.pair_calls[pair] = self.pair_calls.get(pair, 0) + 1
+
+    def _cprofile_rows(self):
+        if self._profiler is None:
+            return []
+        stats = pstats.Stats(self._profiler, stream=io.StringIO())
+        rows = []
+        for (filename, line, func), (cc, nc, tt, ct, _) in stats.stats.items():
+            rows.append({
+                "function": f"{os.path.basename(filename)}:{line}({func})",
+                "calls": nc,
+                "tottime": tt,
+                "cumtime": ct,
+            })
+        rows.sort(key=lambda r: r["cumtime"], reverse=True)
+        return rows[:self.top_n]
+
+    def report(self):
+        """Structured run report with stages and pairs ranked by time."""
+        total = self._run_seconds or sum(s["seconds"] for s in self.stages.values())
+        stages = [
+            {"stage": name, **self.stages[name],
+             "pct_of_run": (100 * self.stages[name]["seconds"] / total
+                            if total and self.stages[name]["parent"] is None else None)}
+            for name in self.stage_order
+        ]
+        stages.sort(key=lambda s: s["seconds"], reverse=True)
+
+        pairs = [
+            {"pair": pair, "seconds": secs, "bars": self.pair_calls[pair],
+             "us_per_bar": 1e6 * secs / self.pair_calls[pair] if self.pair_calls[pair] else None}
+            for pair, secs in self.pair_times.items()
+        ]
+        pairs.sort(key=lambda p: p["seconds"], reverse=True)
+
+        return {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "total_seconds": total,
+            "peak_memory_mb": getattr(self, "peak_memory_mb", None),
+            "stages": stages,
+            "pairs": pairs,
+            "cprofile_top": self._cprofile_rows(),
+        }
+
+    def print_report(self, report=None):
+        report = report or self.report()
+        print(f"\n[PROFILE] - Run time: {report['total_seconds']:.2f}s"
+              + (f" | Peak traced memory: {report['peak_memory_mb']:.1f} MB" if report["peak_memory_mb"] else ""))
+
+        print(f"\n{'stage':<40}{'seconds':>10}{'calls':>8}{'% run':>8}{'peak MB':>10}")
+        for s in report["stages"]:
+            pct = f"{s['pct_of_run']:.1f}" if s["pct_of_run"] is not None else "-"
+            peak = f"{s['peak_memory_mb']:.1f}" if s["peak_memory_mb"] is not None else "-"
+            label = f"  {s['stage']} ({s['parent']})" if s["parent"] else s["stage"]
+            print(f"{label:<40}{s['seconds']:>10.3f}{s['calls']:>8}{pct:>8}{peak:>10}")
+
+        if report["pairs"]:
+            print(f"\n{'pair (next)':<28}{'seconds':>10}{'bars':>8}{'us/bar':>10}")
+            for p in report["pairs"][:self.top_n]:
+                print(f"{p['pair']:<28}{p['seconds']:>10.3f}{p['bars']:>8}{p['us_per_bar']:>10.1f}")
+
+        if report["cprofile_top"]:
+            print(f"\n{'function (cProfile)':<60}{'calls':>10}{'tottime':>10}{'cumtime':>10}")
+            for r in report["cprofile_top"]:
+                print(f"{r['function'][:59]:<60}{r['calls']:>10}{r['tottime']:>10.3f}{r['cumtime']:>10.3f}")
+
+    def save(self, output_dir="data/processed/profiling"):
+        """Write the JSON report (and raw cProfile stats, if captured); returns the JSON path."""
+        os.makedirs(output_dir, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        report = self.report()
+        path = os.path.join(output_dir, f"run_{stamp}.json")
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+        if self._profiler is not None:
+            self._profiler.dump_stats(os.path.join(output_dir, f"run_{stamp}.prof"))
+        print(f"[PROFILE] - Run report saved to {path}")
+        return path
+
+
+class NullProfiler(RunProfiler):
+    """Disabled profiler: every call is a no-op, so call sites need no branching."""
+
+    def __init__(self):
+        super().__init__(enabled=False)
+
+    def add_pair_time(self, pair, seconds):
+        pass
@@ -1,51 +1,56 @@
 # utils/rank_spread_candidates.py
-
+import sys
 import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 import json
 import pandas as pd
 import numpy as np
 from itertools import combinations
 from statsmodels.tsa.stattools import adfuller
-import seaborn as sns
-import matplotlib.pyplot as plt
 
-from data_loader import load_csv
+from utils.data_loader import load_csv
 
 def load_contract_symbols(path="config/contracts.json"):
     with open(path) as f:
         contracts = json.load(f)
     return list(set(contracts.keys()))
 
+def pair_metrics(sym1, sym2, df1, df2):
+    """Return correlation and spread cointegration p-value for one pair, or None if overlap < 100 bars."""
+    df = pd.DataFrame({
+        sym1: df1["Close"],
+        sym2: df2["Close"]
+    }).dropna()
+
+    if len(df) < 100:
+        return None
+
+    returns = df.pct_change().dropna()
+    corr = returns[sym1].corr(returns[sym2])
+
+    # Cointegration test
+    spread = df[sym1] - df[sym2]
+    coint_pval = adfuller(spread.dropna())[1]
+
+    return {
+        "pair": f"{sym1}-{sym2}",
+        "symbol1": sym1,
+        "symbol2": sym2,
+        "correlation": corr,
+        "cointegration_pval": coint_pval
+    }
+
 def compute_metrics(symbols, data_dir="data/raw"):
     pairs = list(combinations(symbols, 2))
     results = []
 
     for sym1, sym2 in pairs:
         try:
-            df1 = load_csv(sym1)
-            df2 = load_csv(sym2)
-            df = pd.DataFrame({
-                sym1: df1["Close"],
-                sym2: df2["Close"]
-            }).dropna()
-
-            if len(df) < 100:
-                continue
-
-            returns = df.pct_change().dropna()
-            corr = returns[sym1].corr(returns[sym2])
-
-            # Cointegration test
-            spread = df[sym1] - df[sym2]
-            coint_pval = adfuller(spread.dropna())[1]
-
-            results.append({
-                "pair": f"{sym1}-{sym2}",
-                "symbol1": sym1,
-                "symbol2": sym2,
-                "correlation": corr,
-                "cointegration_pval": coint_pval
-            })
+            metrics = pair_metrics(sym1, sym2, load_csv(sym1), load_csv(sym2))
+            if metrics is not None:
+                results.append(metrics)
 
         except Exception as e:
             print(f"[RANKER] - Failed {sym1}-{sym2}: {e}")
@@ -59,6 +64,9 @@ def rank_pairs(df, top_n=10):
     return ranked.head(top_n)
 
 def plot_heatmap(df, symbols, output="data/processed/correlation_heatmap.png"):
+    import seaborn as sns
+    import matplotlib.pyplot as plt
+
     matrix = pd.DataFrame(index=symbols, columns=symbols, dtype=float)
     for _, row in df.iterrows():
         s1, s2 = row["symbol1"], row["symbol2"]
@@ -0,0 +1,588 @@
+# utils/research_daemon.py — Long-running research server: warm data, pooled backtest/optimize/rank jobs
+
+import os
+import sys
+import json
+import time
+import queue
+import signal
+import threading
+import traceback
+import multiprocessing
+from itertools import count
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib import request as urlrequest, error as urlerror
+
+from utils.config import DEFAULT_CONFIG_PATH, load_config, config_symbols, candidate_pairs, subbook_index
+
+DEFAULT_DAEMON = {
+    "host": "127.0.0.1",
+    "port": 8765,
+    "workers": max(1, (os.cpu_count() or 2) - 1),
+    "worker_log": "data/processed/daemon_workers.log",
+}
+
+JOB_KINDS = ("backtest", "optimize", "rank")
+
+
+def daemon_settings(config):
+    return {**DEFAULT_DAEMON, **config.get("daemon", {})}
+
+
+# --- Warm state ---------------------------------------------------------------
+# Filled once in the daemon process before the worker pool forks, so workers
+# inherit the heavy imports and parsed bars instead of reloading them per job.
+# The per-pair caches below then stay warm in each worker across jobs.
+
+_STATE = {}
+
+
+def warm(config):
+    """Import the backtest stack and load every configured contract into _STATE."""
+    import backtrader  # noqa: F401
+    import statsmodels.api  # noqa: F401
+    from main import get_data
+    from utils.data_loader import load_csv
+
+    interval = config.get("data_interval", "1d")
+    bars, daily = {}, {}
+    for symbol in config_symbols(config):
+        try:
+            bars[symbol] = get_data(symbol, config)
+            raw = load_csv(symbol)
+        except Exception as e:
+            print(f"[DAEMON] - Skipping {symbol}: {e}")
+            continue
+        # The optimizer and ranker read the stored daily CSV; share the frame when it is the same one.
+        daily[symbol] = bars[symbol] if interval == "1d" and raw.equals(bars[symbol]) else raw
+
+    _STATE.clear()
+    _STATE.update(config=config, bars=bars, daily=daily, pairs={}, rank={}, loaded_at=time.time())
+    return _STATE
+
+
+def _init_worker(config, worker_log):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if worker_log:
+        os.makedirs(os.path.dirname(worker_log) or ".", exist_ok=True)
+        sys.stdout = open(worker_log, "a", buffering=1)
+    if not _STATE:  # spawn start method: nothing was inherited
+        warm(config)
+
+
+def _call(unit):
+    index, fn, args = unit
+    try:
+        return index, fn(*args), None
+    except Exception as e:
+        return index, None, f"{type(e).__name__}: {e}"
+
+
+def _backtest_pair(s1, s2, book1, params):
+    """Like sharding.run_pair_backtest, from the warm bars."""
+    import backtrader as bt
+    from main import pair_strategy_kwargs
+    from strategies.spread_pair_strategy import SpreadPairStrategy, TRADE_CSV_COLUMNS
+
+    config, bars = _STATE["config"], _STATE["bars"]
+    cerebro = bt.Cerebro()
+    cerebro.broker.set_cash(config.get("capital", 10_000_000))
+    for symbol in (s1, s2):
+        cerebro.adddata(bt.feeds.PandasData(dataname=bars[symbol], name=symbol))
+    kwargs = pair_strategy_kwargs(config, s1, s2, book1, write_csv=False, signal_archive=False)
+    kwargs.update(params)
+    cerebro.addstrategy(SpreadPairStrategy, **kwargs)
+    strat = cerebro.run()[0]
+    trades = strat.trades.to_dataframe()[TRADE_CSV_COLUMNS] if strat.trades else None
+    return {"summary": strat.pnl_summary(), "trades": None if trades is None else trades.to_dict("records")}
+
+
+def _pair_inputs(s1, s2, min_overlap=50):
+    """Common index and OLS beta for an optimizer pair (load_pair + estimate_beta), cached per process."""
+    from utils.optimize_spread_parameters import estimate_beta
+
+    cache = _STATE["pairs"]
+    if (s1, s2) not in cache:
+        daily = _STATE["daily"]
+        inputs = None
+        if s1 in daily and s2 in daily:
+            common = daily[s1].index.intersection(daily[s2].index)
+            if len(common) >= min_overlap:
+                inputs = (common, estimate_beta(daily[s1].loc[common, "Close"], daily[s2].loc[common, "Close"]))
+        cache[(s1, s2)] = inputs
+    return cache[(s1, s2)]
+
+
+def _optimizer_point(s1, s2, book, z_entry, z_exit, lookback, params):
+    from utils.optimize_spread_parameters import evaluate_point
+
+    config = _STATE["config"]
+    inputs = _pair_inputs(s1, s2)
+    if inputs is None:
+        return {"skipped": f"Not enough data overlap for {s1}-{s2}"}
+    common, beta = inputs
+    daily = _STATE["daily"]
+    subbook_budget = config["capital_allocation"].get(book, {}).get("budget", config.get("capital", 10_000_000))
+    return evaluate_point(daily[s1].loc[common], daily[s2].loc[common], s1, s2, book, beta, z_entry, z_exit,
+                          lookback, subbook_budget, config.get("slippage_pct", 0.001),
+                          write_csv=False, signal_archive=False, **params)
+
+
+def _rank_pair(s1, s2):
+    from utils.rank_spread_candidates import pair_metrics
+
+    daily = _STATE["daily"]
+    if s1 not in daily or s2 not in daily:
+        return None
+    return pair_metrics(s1, s2, daily[s1], daily[s2])
+
+
+# --- Jobs ---------------------------------------------------------------------
+
+class Job:
+    """One submitted job. Events are appended under a condition so /events streams can follow them."""
+
+    def __init__(self, job_id, kind, params):
+        self.id = job_id
+        self.kind = kind
+        self.params = params
+        self.status = "queued"
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.done = 0
+        self.total = 0
+        self.result = None
+        self.error = None
+        self.events = []
+        self.cond = threading.Condition()
+
+    def emit(self, event, **fields):
+        with self.cond:
+            self.events.append({"event": event, "job": self.id, "time": round(time.time(), 3), **fields})
+            self.cond.notify_all()
+
+    def snapshot(self, result=True):
+        snap = {
+            "id": self.id, "kind": self.kind, "params": self.params, "status": self.status,
+            "done": self.done, "total": self.total, "error": self.error,
+            "elapsed": round((self.finished or time.time()) - (self.started or self.submitted), 3),
+        }
+        if result:
+            snap["result"] = self.result
+        return snap
+
+
+def _parse_pair(name):
+    s1, s2 = [part.strip() for part in name.replace(" - ", "-").split("-", 1)]
+    return s1, s2
+
+
+class ResearchDaemon:
+    """
+    Keeps the configured universe loaded and runs backtest, optimize and
+    rank jobs on a process pool. Every job is split into per-pair (or
+    per-grid-point) units; progress events and the final result are
+    available over HTTP on localhost (see serve()).
+    """
+
+    def __init__(self, config=None, workers=None, config_path=DEFAULT_CONFIG_PATH):
+        self.config_path = config_path
+        self.config = config if config is not None else load_config(config_path)
+        self.settings = daemon_settings(self.config)
+        self.workers = workers or self.settings["workers"]
+        self.jobs = {}
+        self._ids = count(1)
+        self._lock = threading.Lock()
+        self.pool = None
+        self.started = time.time()
+        self._control = queue.Queue()   # reload/stop requests for the main thread
+
+    # --- Lifecycle --------------------------------------------------------------
+
+    def load(self):
+        """Warm the data, then fork the pool so workers inherit it."""
+        t0 = time.time()
+        state = warm(self.config)
+        print(f"[DAEMON] - Loaded {len(state['bars'])} contract(s) in {time.time() - t0:.1f}s "
+              f"({self.memory_mb():.1f} MB)")
+        methods = multiprocessing.get_all_start_methods()
+        ctx = multiprocessing.get_context("fork" if "fork" in methods else "spawn")
+        self.pool = ctx.Pool(self.workers, initializer=_init_worker,
+                             initargs=(self.config, self.settings.get("worker_log")))
+        print(f"[DAEMON] - {self.workers} worker(s) ready ({ctx.get_start_method()})")
+
+    def reload(self):
+        """
+        Re-read config_path and the data (e.g. after a download) and restart
+        the pool. Refused while jobs run. The new state and pool replace the
+        old ones only once they are ready; if loading fails the daemon keeps
+        serving the previous config. Forks the pool, so call it from the main
+        thread; HTTP handlers go through request_reload().
+        """
+        with self._lock:  # no submissions while the pool is replaced
+            if self.running():
+                raise RuntimeError("[DAEMON] - Jobs are running; reload when idle")
+            config, state, pool = self.config, dict(_STATE), self.pool
+            self.pool = None
+            try:
+                self.config = load_config(self.config_path)  # cached per mtime, so edits are picked up
+                self.load()
+            except Exception:
+                self.close()
+                self.config, self.pool = config, pool
+                _STATE.clear()
+                _STATE.update(state)
+                raise
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+
+    # Handler threads must not fork the pool themselves: they queue the
+    # request for the main thread (control_loop) and wait for its outcome.
+
+    def request_reload(self):
+        reply = {"done": threading.Event(), "error": None}
+        self._control.put(("reload", reply))
+        reply["done"].wait()
+        if reply["error"] is not None:
+            raise reply["error"]
+
+    def request_stop(self):
+        self._control.put(("stop", None))
+
+    def control_loop(self):
+        """Run queued reloads on the calling (main) thread until request_stop()."""
+        while True:
+            action, reply = self._control.get()
+            if action == "stop":
+                return
+            try:
+                self.reload()
+            except Exception as e:
+                reply["error"] = e
+            finally:
+                reply["done"].set()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+    def running(self):
+        return [job.id for job in self.jobs.values() if job.status in ("queued", "running")]
+
+    def memory_mb(self):
+        frames = {id(df): df for group in ("bars", "daily") for df in _STATE.get(group, {}).values()}
+        return sum(int(df.memory_usage(deep=True).sum()) for df in frames.values()) / 1e6
+
+    def status(self):
+        return {
+            "pid": os.getpid(),
+            "uptime": round(time.time() - self.started, 1),
+            "workers": self.workers,
+            "contracts": len(_STATE.get("bars", {})),
+            "memory_mb": round(self.memory_mb(), 2),
+            "data_interval": self.config.get("data_interval", "1d"),
+            "jobs": {state: sum(job.status == state for job in self.jobs.values())
+                     for state in ("queued", "running", "done", "failed")},
+        }
+
+    # --- Jobs -------------------------------------------------------------------
+
+    def submit(self, kind, params=None):
+        if kind not in JOB_KINDS:
+            raise ValueError(f"[DAEMON] - Unknown job kind '{kind}'; expected one of {JOB_KINDS}")
+        with self._lock:
+            job = Job(next(self._ids), kind, params or {})
+            self.jobs[job.id] = job
+        job.emit("queued", kind=kind)
+        threading.Thread(target=self._run, args=(job,), daemon=True).start()
+        return job
+
+    def _run(self, job):
+        job.status = "running"
+        job.started = time.time()
+        try:
+            if job.kind == "backtest":
+                job.result = self._backtest(job)
+            elif job.kind == "optimize":
+                job.result = self._optimize(job)
+            else:
+                job.result = self._rank(job)
+            job.status = "done"
+        except Exception as e:
+            job.status = "failed"
+            job.error = f"{type(e).__name__}: {e}"
+            traceback.print_exc()
+        job.finished = time.time()
+        print(f"[DAEMON] - Job {job.id} ({job.kind}) {job.status} in {job.finished - job.started:.2f}s")
+        job.emit(job.status, elapsed=round(job.finished - job.started, 3), error=job.error)
+
+    def _map(self, job, units):
+        """Run (fn, args) units on the pool; results come back in unit order, failures as None."""
+        job.total = len(units)
+        job.emit("started", total=job.total)
+        results = [None] * len(units)
+        step = max(1, len(units) // 20)
+        tasks = [(i, fn, args) for i, (fn, args) in enumerate(units)]
+        for index, value, error in self.pool.imap_unordered(_call, tasks):
+            results[index] = value
+            job.done += 1
+            if error:
+                job.emit("unit_failed", unit=index, error=error)
+            if job.done % step == 0 or job.done == job.total:
+                job.emit("progress", done=job.done, total=job.total)
+        return results
+
+    def _selected_pairs(self, job, pairs):
+        names = job.params.get("pairs")
+        if not names:
+            return pairs
+        wanted = {_parse_pair(name) for name in names}
+        return [p for p in pairs if (p[0], p[1]) in wanted]
+
+    def _backtest(self, job):
+        import pandas as pd
+        from utils.sharding import merged_portfolio_summary
+        from utils.pair_screening import screening_settings, screen_pairs
+        from utils.results_db import ResultsDB, results_db_settings
+        from strategies.spread_pair_strategy import TRADE_CSV_COLUMNS
+
+        config = self.config
+        pairs = candidate_pairs(config, verbose=False)
+        screening = screening_settings(config)
+        if screening["enabled"]:
+            pairs, _ = screen_pairs(_STATE["bars"], pairs, screening)
+        pairs = [p for p in self._selected_pairs(job, pairs) if p[0] in _STATE["bars"] and p[1] in _STATE["bars"]]
+        params = job.params.get("params", {})
+
+        results = self._map(job, [(_backtest_pair, (s1, s2, book1, params)) for s1, s2, book1, _ in pairs])
+        ok = [r for r in results if r is not None]
+        trades = pd.DataFrame([t for r in ok for t in (r["trades"] or [])], columns=TRADE_CSV_COLUMNS)
+        summary = pd.DataFrame([r["summary"] for r in ok])
+        portfolio = merged_portfolio_summary(trades, summary, config) if not trades.empty else None
+
+        subbooks = {book: 0.0 for book in config["capital_allocation"]}
+        books = subbook_index(config)
+        for pair, pnl in zip(trades["symbol"], trades["pnl"]):
+            book = books.get(pair.split(" - ")[0])
+            if book:
+                subbooks[book] += float(pnl)
+
+        run_id = None
+        db = results_db_settings(config)
+        if db["enabled"] and job.params.get("record", True):
+            with ResultsDB(db["path"]) as store:
+                run_id = store.record_backtest(config, trades, summary,
+                                               pd.DataFrame([portfolio]) if portfolio else None,
+                                               label=f"daemon:{json.dumps(params, sort_keys=True)}")
+        return {
+            "run_id": run_id,
+            "pairs": summary.to_dict("records"),
+            "subbooks": subbooks,
+            "portfolio": portfolio,
+            "failed": len(results) - len(ok),
+        }
+
+    def _optimize(self, job):
+        import pandas as pd
+        from utils.optimize_spread_parameters import optimizer_pairs, param_grid
+        from utils.results_db import ResultsDB, results_db_settings
+
+        config = self.config
+        grid = [tuple(point) for point in job.params.get("grid") or param_grid]
+        pairs = self._selected_pairs(job, optimizer_pairs(config))
+        params = job.params.get("params", {})
+
+        units = [(_optimizer_point, (s1, s2, book, z_entry, z_exit, lookback, params))
+                 for s1, s2, book in pairs for z_entry, z_exit, lookback in grid]
+        results = self._map(job, units)
+        rows = [r for r in results if r is not None and "skipped" not in r]
+        df = pd.DataFrame(rows)
+
+        run_id = None
+        db = results_db_settings(config)
+        if db["enabled"] and job.params.get("record", True) and not df.empty:
+            with ResultsDB(db["path"]) as store:
+                run_id = store.record_optimizer(config, df, label="daemon")
+        best = df.loc[df.groupby("pair")["sharpe"].idxmax()] if not df.empty else df
+        return {
+            "run_id": run_id,
+            "points": len(rows),
+            "skipped": sorted({r["skipped"] for r in results if r is not None and "skipped" in r}),
+            "best": best.to_dict("records"),
+        }
+
+    def _rank(self, job):
+        import pandas as pd
+        from itertools import combinations
+        from utils.rank_spread_candidates import rank_pairs
+
+        symbols = job.params.get("symbols") or config_symbols(self.config)
+        cache = _STATE["rank"]
+        todo = [pair for pair in combinations(symbols, 2) if pair not in cache]
+        for pair, metrics in zip(todo, self._map(job, [(_rank_pair, pair) for pair in todo])):
+            cache[pair] = metrics
+        rows = [cache[pair] for pair in combinations(symbols, 2) if cache.get(pair)]
+        if not rows:
+            return {"ranked": [], "computed": len(todo)}
+        ranked = rank_pairs(pd.DataFrame(rows), top_n=job.params.get("top_n", 10))
+        return {"ranked": ranked.to_dict("records"), "computed": len(todo)}
+
+
+# --- HTTP server --------------------------------------------------------------
+
+class _Handler(BaseHTTPRequestHandler):
+    """
+    GET  /status             daemon and cache state
+    GET  /jobs               all jobs (without results)
+    GET  /jobs/<id>          one job with its result
+    GET  /jobs/<id>/events   NDJSON stream of the job's events until it finishes
+    POST /jobs               {"kind": "backtest"|"optimize"|"rank", "params": {...}}
+    POST /reload             reload config and data
+    POST /shutdown           stop the daemon
+    """
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def daemon(self):
+        return self.server.research_daemon
+
+    def _send(self, payload, code=200):
+        body = json.dumps(payload, default=str).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _job(self, parts):
+        try:
+            return self.daemon.jobs[int(parts[1])]
+        except (ValueError, KeyError):
+            self._send({"error": f"unknown job {parts[1]}"}, 404)
+            return None
+
+    def do_GET(self):
+        parts = self.path.strip("/").split("/")
+        if parts == ["status"]:
+            return self._send(self.daemon.status())
+        if parts == ["jobs"]:
+            return self._send([job.snapshot(result=False) for job in self.daemon.jobs.values()])
+        if len(parts) >= 2 and parts[0] == "jobs":
+            job = self._job(parts)
+            if job is None:
+                return
+            if len(parts) == 3 and parts[2] == "events":
+                return self._stream(job)
+            return self._send(job.snapshot())
+        self._send({"error": f"unknown path {self.path}"}, 404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError as e:
+            return self._send({"error": f"invalid JSON: {e}"}, 400)
+        path = self.path.strip("/")
+        try:
+            if path == "jobs":
+                job = self.daemon.submit(body.get("kind"), body.get("params"))
+                return self._send(job.snapshot(result=False), 202)
+            if path == "reload":
+                self.daemon.request_reload()
+                return self._send(self.daemon.status())
+            if path == "shutdown":
+                self._send({"status": "stopping"})
+                self.daemon.request_stop()
+                return
+        except (ValueError, RuntimeError) as e:
+            return self._send({"error": str(e)}, 409 if isinstance(e, RuntimeError) else 400)
+        self._send({"error": f"unknown path {self.path}"}, 404)
+
+    def _stream(self, job):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        sent = 0
+        while True:
+            with job.cond:
+                job.cond.wait_for(lambda: len(job.events) > sent, timeout=30)
+                events = job.events[sent:]
+            for event in events:
+                self.wfile.write((json.dumps(event, default=str) + "\n").encode())
+            self.wfile.flush()
+            sent += len(events)
+            if events and events[-1]["event"] in ("done", "failed"):
+                break
+        self.wfile.write((json.dumps({"event": "result", **job.snapshot()}, default=str) + "\n").encode())
+
+
+def serve(config=None, host=None, port=None, workers=None, config_path=DEFAULT_CONFIG_PATH):
+    """
+    Load the universe, start the pool and serve jobs on host:port until
+    /shutdown or Ctrl-C. HTTP is served from a background thread; the main
+    thread runs the control loop, so pool (re)starts always fork from it.
+    """
+    daemon = ResearchDaemon(config, workers=workers, config_path=config_path)
+    host = host or daemon.settings["host"]
+    port = port or daemon.settings["port"]
+    daemon.load()
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    server.research_daemon = daemon
+    threading.Thread(target=server.serve_forever, name="http", daemon=True).start()
+    print(f"[DAEMON] - Listening on http://{host}:{port} (pid {os.getpid()})")
+    try:
+        daemon.control_loop()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        server.server_close()
+        daemon.close()
+        print("[DAEMON] - Stopped")
+
+
+# --- Client -------------------------------------------------------------------
+# Standard library only, so `cli.py submit` starts in milliseconds.
+
+def _url(settings, path):
+    return f"http://{settings['host']}:{settings['port']}/{path}"
+
+
+def request(settings, path, payload=None, timeout=30):
+    data = None if payload is None else json.dumps(payload).encode()
+    req = urlrequest.Request(_url(settings, path), data=data, method="GET" if data is None else "POST",
+                             headers={"Content-Type": "application/json"})
+    try:
+        with urlrequest.urlopen(req, timeout=timeout) as resp:
+            return json.loads(resp.read())
+    except urlerror.HTTPError as e:
+        raise RuntimeError(json.loads(e.read()).get("error", str(e))) from None
+    except urlerror.URLError as e:
+        raise ConnectionError(f"[CLIENT] - No research daemon at {_url(settings, '')} ({e.reason}); "
+                              f"start one with `python cli.py daemon start`") from None
+
+
+def follow(settings, job_id, on_event=None):
+    """Yield the job's events as they arrive; the last one is the final job snapshot."""
+    with urlrequest.urlopen(_url(settings, f"jobs/{job_id}/events"), timeout=None) as resp:
+        for line in resp:
+            event = json.loads(line)
+            if on_event:
+                on_event(event)
+            if event["event"] == "result":
+                return event
+    return request(settings, f"jobs/{job_id}")
+
+
+def submit(settings, kind, params=None, wait=True, on_event=None):
+    job = request(settings, "jobs", {"kind": kind, "params": params or {}})
+    if not wait:
+        return job
+    return follow(settings, job["id"], on_event)
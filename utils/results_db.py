@@ -0,0 +1,279 @@
+# utils/results_db.py — SQLite store of backtest and optimizer results across runs
+
+import os
+import json
+import sqlite3
+import hashlib
+from datetime import datetime
+
+import pandas as pd
+
+DEFAULT_DB_PATH = "data/results.db"
+BATCH_SIZE = 10_000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id      INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind        TEXT NOT NULL,
+    created_at  TEXT NOT NULL,
+    label       TEXT,
+    config_hash TEXT,
+    config      TEXT
+);
+
+CREATE TABLE IF NOT EXISTS trades (
+    run_id       INTEGER NOT NULL REFERENCES runs(run_id),
+    pair         TEXT NOT NULL,
+    subbook      TEXT,
+    side         TEXT,
+    entry_date   TEXT,
+    entry_spread REAL,
+    exit_date    TEXT,
+    exit_spread  REAL,
+    size1        INTEGER,
+    size2        INTEGER,
+    pnl          REAL,
+    duration     INTEGER,
+    return_pct   REAL
+);
+CREATE INDEX IF NOT EXISTS idx_trades_run ON trades(run_id);
+CREATE INDEX IF NOT EXISTS idx_trades_pair ON trades(pair, run_id);
+CREATE INDEX IF NOT EXISTS idx_trades_subbook_date ON trades(subbook, exit_date);
+CREATE INDEX IF NOT EXISTS idx_trades_exit_date ON trades(exit_date);
+
+CREATE TABLE IF NOT EXISTS pair_summary (
+    run_id         INTEGER NOT NULL REFERENCES runs(run_id),
+    pair           TEXT NOT NULL,
+    subbook        TEXT,
+    realized_pnl   REAL,
+    unrealized_pnl REAL,
+    total_pnl      REAL
+);
+CREATE INDEX IF NOT EXISTS idx_pair_summary_run ON pair_summary(run_id);
+CREATE INDEX IF NOT EXISTS idx_pair_summary_pair ON pair_summary(pair, run_id);
+CREATE INDEX IF NOT EXISTS idx_pair_summary_subbook ON pair_summary(subbook, run_id);
+
+CREATE TABLE IF NOT EXISTS portfolio_summary (
+    run_id          INTEGER NOT NULL REFERENCES runs(run_id),
+    portfolio_value REAL,
+    sharpe          REAL,
+    drawdown        REAL,
+    return_pct      REAL,
+    total_trades    INTEGER,
+    wins            INTEGER,
+    losses          INTEGER,
+    win_rate        REAL,
+    loss_rate       REAL
+);
+CREATE INDEX IF NOT EXISTS idx_portfolio_summary_run ON portfolio_summary(run_id);
+
+CREATE TABLE IF NOT EXISTS optimizer_results (
+    run_id     INTEGER NOT NULL REFERENCES runs(run_id),
+    pair       TEXT NOT NULL,
+    subbook    TEXT,
+    z_entry    REAL,
+    z_exit     REAL,
+    lookback   INTEGER,
+    sharpe     REAL,
+    drawdown   REAL,
+    return_pct REAL
+);
+CREATE INDEX IF NOT EXISTS idx_optimizer_run ON optimizer_results(run_id);
+CREATE INDEX IF NOT EXISTS idx_optimizer_pair_sharpe ON optimizer_results(pair, sharpe DESC);
+CREATE INDEX IF NOT EXISTS idx_optimizer_pair_return ON optimizer_results(pair, return_pct DESC);
+CREATE INDEX IF NOT EXISTS idx_optimizer_pair_drawdown ON optimizer_results(pair, drawdown);
+CREATE INDEX IF NOT EXISTS idx_optimizer_params ON optimizer_results(z_entry, z_exit, lookback);
+"""
+
+# Table -> column order; DataFrames are inserted by these names.
+COLUMNS = {
+    "trades": ["pair", "subbook", "side", "entry_date", "entry_spread", "exit_date", "exit_spread",
+               "size1", "size2", "pnl", "duration", "return_pct"],
+    "pair_summary": ["pair", "subbook", "realized_pnl", "unrealized_pnl", "total_pnl"],
+    "portfolio_summary": ["portfolio_value", "sharpe", "drawdown", "return_pct", "total_trades",
+                          "wins", "losses", "win_rate", "loss_rate"],
+    "optimizer_results": ["pair", "subbook", "z_entry", "z_exit", "lookback", "sharpe", "drawdown", "return_pct"],
+}
+
+
+def results_db_settings(config):
+    return {"enabled": True, "path": DEFAULT_DB_PATH, **config.get("results_db", {})}
+
+
+def _sql_value(value):
+    if value is None or (isinstance(value, float) and value != value):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    if hasattr(value, "item"):  # numpy scalars
+        return value.item()
+    return value
+
+
+class ResultsDB:
+    """
+    Indexed, append-only store of run outputs. Every recorded run gets a
+    run_id; rows are inserted with executemany in batched transactions.
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --- Writes -----------------------------------------------------------------
+
+    def new_run(self, kind, config=None, label=None):
+        config_json = json.dumps(config, sort_keys=True, default=str) if config is not None else None
+        config_hash = hashlib.sha1(config_json.encode()).hexdigest()[:12] if config_json else None
+        with self.conn:
+            cur = self.conn.execute(
+                "INSERT INTO runs (kind, created_at, label, config_hash, config) VALUES (?, ?, ?, ?, ?)",
+                (kind, datetime.now().isoformat(timespec="seconds"), label, config_hash, config_json),
+            )
+        return cur.lastrowid
+
+    def insert(self, table, run_id, df, batch_size=BATCH_SIZE):
+        """Bulk-insert df's columns for table (missing ones become NULL), one transaction per batch."""
+        if df is None or df.empty:
+            return 0
+        columns = COLUMNS[table]
+        frame = df.reindex(columns=columns)
+        sql = f"INSERT INTO {table} (run_id, {', '.join(columns)}) VALUES ({', '.join('?' * (len(columns) + 1))})"
+        rows = frame.itertuples(index=False, name=None)
+        total = 0
+        while True:
+            batch = [(run_id, *map(_sql_value, row)) for _, row in zip(range(batch_size), rows)]
+            if not batch:
+                break
+            with self.conn:
+                self.conn.executemany(sql, batch)
+            total += len(batch)
+        return total
+
+    def record_backtest(self, config, trades=None, pair_summary=None, portfolio_summary=None, label=None):
+        """Store one backtest's outputs under a new run_id. trades use the spread_trades.csv columns."""
+        from utils.config import subbook_index
+
+        run_id = self.new_run("backtest", config, label)
+        if trades is not None and not trades.empty:
+            trades = trades.rename(columns={"symbol": "pair"})
+            index = subbook_index(config)
+            books = {pair: index.get(pair.split(" - ")[0]) for pair in trades["pair"].unique()}
+            trades = trades.assign(subbook=trades["pair"].map(books))
+        self.insert("trades", run_id, trades)
+        self.insert("pair_summary", run_id, pair_summary)
+        self.insert("portfolio_summary", run_id, portfolio_summary)
+        return run_id
+
+    def record_optimizer(self, config, results, label=None):
+        run_id = self.new_run("optimize", config, label)
+        self.insert("optimizer_results", run_id, results)
+        return run_id
+
+    # --- Queries ----------------------------------------------------------------
+
+    def query(self, sql, params=()):
+        return pd.read_sql_query(sql, self.conn, params=params)
+
+    def runs(self, kind=None):
+        sql = "SELECT run_id, kind, created_at, label, config_hash FROM runs"
+        if kind:
+            return self.query(sql + " WHERE kind = ? ORDER BY run_id", (kind,))
+        return self.query(sql + " ORDER BY run_id")
+
+    def latest_run(self, kind):
+        row = self.conn.execute("SELECT MAX(run_id) FROM runs WHERE kind = ?", (kind,)).fetchone()
+        return row[0]
+
+    def best_params(self, metric="sharpe", pair=None, run_ids=None):
+        """Best (z_entry, z_exit, lookback) per pair by metric across the selected optimizer runs."""
+        if metric not in ("sharpe", "return_pct", "drawdown"):
+            raise ValueError(f"[RESULTS] - Unknown metric '{metric}'")
+        # SQLite returns the other (bare) columns from the row holding the MIN/MAX.
+        # The (pair, metric) indexes are ordered best-first, so each group's
+        # winner is its first index entry and no sort or window is needed.
+        best = "MIN" if metric == "drawdown" else "MAX"
+        where, params = [f"{metric} IS NOT NULL"], []
+        if pair:
+            where.append("pair = ?")
+            params.append(pair)
+        if run_ids:
+            where.append(f"run_id IN ({', '.join('?' * len(run_ids))})")
+            params.extend(run_ids)
+        sql = f"""
+            SELECT run_id, pair, subbook, z_entry, z_exit, lookback, sharpe, drawdown, return_pct,
+                   {best}({metric}) AS best
+            FROM optimizer_results WHERE {' AND '.join(where)} GROUP BY pair ORDER BY pair
+        """
+        return self.query(sql, params).drop(columns="best")
+
+    def subbook_pnl(self, freq="month", run_id=None):
+        """Realised trade PnL per subbook per day/month/year of exit (latest backtest by default)."""
+        width = {"day": 10, "month": 7, "year": 4}[freq]
+        run_id = run_id or self.latest_run("backtest")
+        return self.query(
+            f"""SELECT subbook, substr(exit_date, 1, {width}) AS period, COUNT(*) AS trades, SUM(pnl) AS pnl
+                FROM trades WHERE run_id = ? GROUP BY subbook, period ORDER BY subbook, period""",
+            (run_id,),
+        )
+
+    def pair_pnl_by_run(self, pair=None):
+        """Total PnL per pair for every backtest run, one column per run."""
+        sql = "SELECT run_id, pair, total_pnl FROM pair_summary"
+        df = self.query(sql + " WHERE pair = ?", (pair,)) if pair else self.query(sql)
+        return df.pivot_table(index="pair", columns="run_id", values="total_pnl")
+
+    def trades(self, run_id=None, pair=None, subbook=None, start=None, end=None):
+        where, params = ["run_id = ?"], [run_id or self.latest_run("backtest")]
+        for column, value in (("pair", pair), ("subbook", subbook)):
+            if value:
+                where.append(f"{column} = ?")
+                params.append(value)
+        if start:
+            where.append("exit_date >= ?")
+            params.append(str(start))
+        if end:
+            where.append("exit_date <= ?")
+            params.append(str(end))
+        return self.query(f"SELECT * FROM trades WHERE {' AND '.join(where)} ORDER BY exit_date", params)
+
+
+def record_backtest_outputs(config, folder="data/processed", label=None):
+    """Store the CSVs a backtest just wrote; returns the run_id, or None when the store is disabled."""
+    settings = results_db_settings(config)
+    if not settings["enabled"]:
+        return None
+
+    def read(name):
+        path = os.path.join(folder, name)
+        return pd.read_csv(path) if os.path.exists(path) else None
+
+    with ResultsDB(settings["path"]) as db:
+        run_id = db.record_backtest(config, read("spread_trades.csv"), read("pairwise_pnl_summary.csv"),
+                                    read("portfolio_summary.csv"), label=label)
+    print(f"[RESULTS] - Backtest stored as run {run_id} in {settings['path']}")
+    return run_id
+
+
+def record_optimizer_outputs(config, results, label=None):
+    settings = results_db_settings(config)
+    if not settings["enabled"]:
+        return None
+    with ResultsDB(settings["path"]) as db:
+        run_id = db.record_optimizer(config, results, label=label)
+    print(f"[RESULTS] - Optimizer results stored as run {run_id} in {settings['path']}")
+    return run_id
@@ -0,0 +1,327 @@
+# utils/sharding.py — Sharded backtest/optimizer runs over a shared-filesystem work queue
+
+import os
+import sys
+import time
+import subprocess
+
+import pandas as pd
+
+from utils.config import load_config, config_symbols, candidate_pairs, subbook_index
+from utils.work_queue import WorkQueue, run_worker
+from utils.results_db import record_backtest_outputs, record_optimizer_outputs
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# --- Work units ---------------------------------------------------------------
+# Ids are zero-padded positions in the serial run's order, so merging the
+# results sorted by id reproduces that order regardless of which worker ran
+# what.
+
+def backtest_units(pairs):
+    return [
+        (f"{i:05d}_{s1}_{s2}", {"s1": s1, "s2": s2, "book1": book1, "book2": book2})
+        for i, (s1, s2, book1, book2) in enumerate(pairs)
+    ]
+
+
+def optimizer_units(pairs, grid):
+    return [
+        (f"{i:05d}_{s1}_{s2}_{j:04d}",
+         {"s1": s1, "s2": s2, "book": book, "z_entry": z_entry, "z_exit": z_exit, "lookback": lookback})
+        for i, (s1, s2, book) in enumerate(pairs)
+        for j, (z_entry, z_exit, lookback) in enumerate(grid)
+    ]
+
+
+# --- Worker handlers ----------------------------------------------------------
+
+def run_pair_backtest(payload, manifest):
+    """
+    One pair in its own Cerebro; returns closed trades, the pair's PnL
+    summary and, with risk_limits enabled, its own monitor's report.
+    """
+    import backtrader as bt
+    from main import get_data, pair_strategy_kwargs
+    from risk.limits import RiskLimitMonitor
+    from strategies.spread_pair_strategy import SpreadPairStrategy, TRADE_CSV_COLUMNS
+
+    config = manifest["config"]
+    s1, s2, book1 = payload["s1"], payload["s2"], payload["book1"]
+
+    cerebro = bt.Cerebro()
+    cerebro.broker.set_cash(config.get("capital", 10_000_000))
+    # The coordinator fetched missing data before enqueueing; workers only read it.
+    for symbol in (s1, s2):
+        cerebro.adddata(bt.feeds.PandasData(dataname=get_data(symbol, config, download=False), name=symbol))
+    monitor = RiskLimitMonitor.from_config(config)
+    # Workers write nothing to the shared tree: no trade CSVs, no signal archives.
+    cerebro.addstrategy(SpreadPairStrategy, **pair_strategy_kwargs(config, s1, s2, book1, write_csv=False,
+                                                                   signal_archive=False, risk_monitor=monitor))
+    strat = cerebro.run()[0]
+
+    # CSV rows exactly as the serial run appends them to spread_trades.csv.
+    trades = strat.trades.to_dataframe()[TRADE_CSV_COLUMNS].to_csv(index=False, header=False) if strat.trades else ""
+    result = {"summary": strat.pnl_summary(), "trades_csv": trades}
+    if monitor is not None:
+        result["risk_limits"] = monitor.report().assign(pair=f"{s1} - {s2}").to_dict("records")
+    return result
+
+
+# Per-process cache: a worker usually claims consecutive grid points of one pair.
+_pair_cache = {}
+
+
+def run_optimizer_point(payload, manifest):
+    from utils.optimize_spread_parameters import load_pair, estimate_beta, evaluate_point
+
+    config = manifest["config"]
+    s1, s2, book = payload["s1"], payload["s2"], payload["book"]
+    if (s1, s2) not in _pair_cache:
+        _pair_cache.clear()
+        pair_data = load_pair(s1, s2)
+        beta = estimate_beta(pair_data[0]["Close"], pair_data[1]["Close"]) if pair_data else None
+        _pair_cache[(s1, s2)] = (pair_data, beta)
+    pair_data, beta = _pair_cache[(s1, s2)]
+    if pair_data is None:
+        return {"skipped": f"Not enough data overlap for {s1}-{s2}"}
+
+    df1, df2 = pair_data
+    subbook_budget = config["capital_allocation"].get(book, {}).get("budget", config.get("capital", 10_000_000))
+    # Shared CSVs and signal archives are not written from workers; the coordinator merges.
+    return evaluate_point(df1, df2, s1, s2, book, beta, payload["z_entry"], payload["z_exit"],
+                          payload["lookback"], subbook_budget, config.get("slippage_pct", 0.001),
+                          write_csv=False, signal_archive=False)
+
+
+HANDLERS = {
+    "backtest": run_pair_backtest,
+    "optimize": run_optimizer_point,
+}
+
+
+def worker(queue_dir, **kwargs):
+    return run_worker(queue_dir, HANDLERS, **kwargs)
+
+
+# --- Coordinator --------------------------------------------------------------
+
+def spawn_workers(queue_dir, n, log_dir=None):
+    """Start n local `cli.py worker` processes; their output goes to queue_dir/logs/."""
+    log_dir = log_dir or os.path.join(queue_dir, "logs")
+    os.makedirs(log_dir, exist_ok=True)
+    procs = []
+    for i in range(n):
+        log = open(os.path.join(log_dir, f"worker_{i:03d}.log"), "a")
+        procs.append(subprocess.Popen(
+            [sys.executable, os.path.join(REPO_ROOT, "cli.py"), "worker", queue_dir],
+            stdout=log, stderr=subprocess.STDOUT,
+        ))
+        log.close()
+    return procs
+
+
+def run_sharded(queue_dir, manifest, units, workers=0, stale_timeout=120.0, poll_interval=2.0, timeout=None):
+    """
+    Enqueue units, optionally start local workers, and wait until every unit
+    has a result. Claims without a heartbeat for stale_timeout seconds are
+    re-queued. Re-running on the same queue_dir resumes: units that already
+    have a result are not enqueued again. Returns the results ordered by id.
+
+    With a timeout (seconds), raises TimeoutError if units are still pending
+    or claimed by then; the queue is left as is, so a re-run resumes it.
+    """
+    queue = WorkQueue(queue_dir)
+    manifest_path = os.path.join(queue_dir, "manifest.json")
+    if os.path.exists(manifest_path) and queue.read_manifest() != manifest:
+        raise ValueError(f"[SHARD] - {queue_dir} holds a different run; use a fresh queue directory")
+    queue.write_manifest(manifest)
+
+    enqueued = queue.enqueue(units)
+    print(f"[SHARD] - {len(units)} unit(s), {enqueued} enqueued in {queue_dir} ({manifest['kind']})")
+    if workers:
+        print(f"[SHARD] - Starting {workers} local worker(s); run `python cli.py worker {queue_dir}` "
+              f"on other hosts to add more")
+    else:
+        print(f"[SHARD] - No local workers; waiting for external workers (`python cli.py worker {queue_dir}`)")
+    procs = spawn_workers(queue_dir, workers) if workers else []
+
+    last = None
+    warned = False
+    start = time.time()
+    while True:
+        for unit_id in queue.requeue_stale(stale_timeout):
+            print(f"[SHARD] - Re-queued stale unit {unit_id}")
+        progress = queue.progress()
+        if progress != last:
+            print(f"[SHARD] - {time.time() - start:7.1f}s | done {progress['done']}/{len(units)} "
+                  f"| claimed {progress['claimed']} | pending {progress['pending']}")
+            last = progress
+        if not progress["pending"] and not progress["claimed"]:
+            break
+        if timeout is not None and time.time() - start >= timeout:
+            for p in procs:
+                p.terminate()
+            raise TimeoutError(f"[SHARD] - {progress['pending'] + progress['claimed']} unit(s) unfinished "
+                               f"after {timeout:.0f}s; re-run on {queue_dir} to resume")
+        if procs and not warned and all(p.poll() is not None for p in procs):
+            print("[SHARD] - Local workers exited with work left; waiting for external workers")
+            warned = True
+        time.sleep(poll_interval)
+
+    for p in procs:
+        p.wait()
+    return queue.results()
+
+
+def _failed(results, label):
+    ok = []
+    for r in results:
+        if "error" in r:
+            print(f"[SHARD] - {label} {r['id']} failed on {r.get('worker')}: {r['error']}")
+        else:
+            ok.append(r)
+    return ok
+
+
+def merged_portfolio_summary(trades, summary, config):
+    """portfolio_summary.csv row for per-pair runs: no shared broker, so no Sharpe or drawdown."""
+    initial_capital = config.get("capital", 10_000_000)
+    total_pnl = summary["total_pnl"].sum()
+    wins = int((trades["pnl"] > 0).sum())
+    losses = int((trades["pnl"] <= 0).sum())
+    total = wins + losses
+    return {
+        "portfolio_value": initial_capital + total_pnl,
+        "sharpe": None,
+        "drawdown": None,
+        "return_pct": total_pnl / initial_capital,
+        "total_trades": total,
+        "wins": wins,
+        "losses": losses,
+        "win_rate": wins / total if total else 0,
+        "loss_rate": losses / total if total else 0
+    }
+
+
+def sharded_backtest(queue_dir, config=None, workers=0, stale_timeout=120.0, timeout=None):
+    """
+    Sharded counterpart of main.run_portfolio: one work unit per pair, each
+    run in its own Cerebro. The coordinator writes the same CSVs as the
+    serial run; the portfolio summary is built from the merged trades, since
+    per-pair brokers have no portfolio-level Sharpe or drawdown.
+
+    Every pair gets its own RiskLimitMonitor, so risk_limits apply per pair
+    rather than to the shared subbook; the per-pair reports are merged into
+    risk_limits.csv. Checkpoint settings do not apply: re-running on the
+    same queue_dir resumes instead. Missing data is downloaded here, before
+    anything is enqueued, so workers never fetch or write raw files; nor do
+    they write signal archives, so plot_spread needs a serial run.
+    """
+    from main import get_data, save_risk_metrics, log_path
+    from utils.pair_screening import screening_settings, screen_pairs
+    from strategies.spread_pair_strategy import TRADE_CSV_COLUMNS
+
+    config = config if config is not None else load_config()
+    os.makedirs("data/processed/zscore", exist_ok=True)
+    if config.get("risk_limits", {}).get("enabled", False):
+        print("[SHARD] - risk_limits are enforced per pair in sharded runs (one monitor per pair), "
+              "not across each subbook as in the serial backtest")
+    if config.get("checkpoint", {}).get("enabled", False):
+        print(f"[SHARD] - checkpoint settings do not apply to sharded runs; re-run on {queue_dir} to resume")
+
+    symbol_data = {symbol: get_data(symbol, config) for symbol in config_symbols(config)}
+    pairs = candidate_pairs(config)
+    screening = screening_settings(config)
+    if screening["enabled"]:
+        pairs, scores = screen_pairs(symbol_data, pairs, screening)
+        scores.to_csv("data/processed/pair_screening.csv", index=False)
+
+    manifest = {"kind": "backtest", "config": config}
+    results = run_sharded(queue_dir, manifest, backtest_units(pairs), workers, stale_timeout,
+                          timeout=timeout)
+
+    ok = []
+    for r in results:
+        if "error" in r:
+            with open(log_path, "a") as f:
+                f.write(f"[SHARD] - Failed pair {r['id']}: {r['error']}\n")
+        else:
+            ok.append(r["result"])
+    print(f"[SHARD] - Merged {len(ok)}/{len(results)} pair(s); failures logged to {log_path}")
+
+    trades_path = "data/processed/spread_trades.csv"
+    for path in (trades_path, "data/processed/pairwise_pnl_summary.csv", "data/processed/portfolio_summary.csv",
+                 "data/processed/risk_limits.csv"):
+        if os.path.exists(path):
+            os.remove(path)
+    rows = "".join(r["trades_csv"] for r in ok)
+    if rows:
+        with open(trades_path, "w") as f:
+            f.write(",".join(TRADE_CSV_COLUMNS) + "\n" + rows)
+        trades = pd.read_csv(trades_path)
+    else:
+        trades = pd.DataFrame(columns=TRADE_CSV_COLUMNS)
+    summary = pd.DataFrame([r["summary"] for r in ok])
+    if not summary.empty:
+        summary.to_csv("data/processed/pairwise_pnl_summary.csv", index=False)
+
+    capital_allocation = config["capital_allocation"]
+    subbook_pnls = {book: 0.0 for book in capital_allocation}
+    books = subbook_index(config)
+    for pair, pnl in zip(trades["symbol"], trades["pnl"]):
+        book = books.get(pair.split(" - ")[0])
+        if book:
+            subbook_pnls[book] += pnl
+
+    print("\n[SHARD] - Final Subbook Results:")
+    for book, pnl in subbook_pnls.items():
+        start_cap = capital_allocation[book]["budget"]
+        print(f"  [SHARD] - {book.capitalize()}: Start = {start_cap:,.2f}, PnL = {pnl:,.2f}, "
+              f"Final = {start_cap + pnl:,.2f}")
+
+    if not trades.empty:
+        pd.DataFrame([merged_portfolio_summary(trades, summary, config)]).to_csv(
+            "data/processed/portfolio_summary.csv", index=False)
+        print("\n[SHARD] - Portfolio Summary saved to data/processed/portfolio_summary.csv")
+
+    limit_rows = [row for r in ok for row in r.get("risk_limits", [])]
+    if limit_rows:
+        limits = pd.DataFrame(limit_rows)
+        limits = limits[["pair"] + [c for c in limits.columns if c != "pair"]]
+        limits.to_csv("data/processed/risk_limits.csv", index=False)
+        print("[SHARD] - Per-pair risk-limit reports saved to data/processed/risk_limits.csv")
+
+    save_risk_metrics(symbol_data)
+    record_backtest_outputs(config, label="sharded")
+    print("\n[SHARD] - Sharded backtest completed and metrics saved.")
+    return trades, summary
+
+
+def sharded_optimize(queue_dir, config=None, grid=None, workers=0, stale_timeout=120.0, timeout=None,
+                     output_path="data/processed/best_pair_parameters.csv"):
+    """Sharded counterpart of optimize(): one work unit per (pair, grid point)."""
+    from utils.optimize_spread_parameters import optimizer_pairs, param_grid, save_results
+
+    config = config if config is not None else load_config()
+    grid = grid if grid is not None else param_grid
+    pairs = optimizer_pairs(config)
+    print(f"\n[OPTIMIZER] - Total Pairs to Optimize: {len(pairs)} x {len(grid)} grid points")
+
+    manifest = {"kind": "optimize", "config": config, "grid": [list(point) for point in grid]}
+    results = run_sharded(queue_dir, manifest, optimizer_units(pairs, grid), workers, stale_timeout,
+                          timeout=timeout)
+
+    rows = []
+    skipped = set()
+    for r in _failed(results, "Grid point"):
+        if "skipped" in r["result"]:
+            skipped.add(r["result"]["skipped"])
+        else:
+            rows.append(r["result"])
+    for message in sorted(skipped):
+        print(f"[OPTIMIZER] - {message}")
+    df = save_results(rows, output_path)
+    record_optimizer_outputs(config, df, label="sharded")
+    return df
@@ -0,0 +1,48 @@
+# utils/signal_archive.py — Compressed per-pair archive of z-score, spread and trade markers
+
+import os
+import numpy as np
+import pandas as pd
+
+SIGNAL_DIR = "data/processed/zscore"
+
+
+def archive_path(pair_id, folder=SIGNAL_DIR):
+    return os.path.join(folder, f"signals_{pair_id}.npz")
+
+
+def _to_ns(values):
+    if not len(values):
+        return np.empty(0, dtype=np.int64)
+    return np.asarray(pd.DatetimeIndex(values), dtype="datetime64[ns]").view(np.int64)
+
+
+def save_signal_archive(pair_id, datetimes, zscore, spread, entries, exits, folder=SIGNAL_DIR):
+    """
+    Write one pair's signal history as a compressed .npz with one array per
+    column: timestamps as int64 nanoseconds, z-score and spread as float64.
+    """
+    os.makedirs(folder, exist_ok=True)
+    path = archive_path(pair_id, folder)
+    np.savez_compressed(
+        path,
+        datetime=_to_ns(datetimes),
+        zscore=np.asarray(zscore, dtype=np.float64),
+        spread=np.asarray(spread, dtype=np.float64),
+        entries=_to_ns(entries),
+        exits=_to_ns(exits),
+    )
+    return path
+
+
+def load_signal_archive(pair_id, folder=SIGNAL_DIR):
+    """Returns (DataFrame[datetime, zscore, spread], entry times, exit times)."""
+    with np.load(archive_path(pair_id, folder)) as data:
+        df = pd.DataFrame({
+            "datetime": pd.to_datetime(data["datetime"]),
+            "zscore": data["zscore"],
+            "spread": data["spread"],
+        })
+        entries = pd.Series(pd.to_datetime(data["entries"]), name="entry")
+        exits = pd.Series(pd.to_datetime(data["exits"]), name="exit")
+    return df, entries, exits
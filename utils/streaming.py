@@ -0,0 +1,126 @@
+# utils/streaming.py — Chunked reads of the raw price store with bounded memory
+
+import os
+import backtrader as bt
+import pandas as pd
+from backtrader.utils import date2num
+
+from utils.data_loader import RAW_DIR
+
+BAR_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+
+def raw_path(symbol, interval="1d"):
+    return os.path.join(RAW_DIR, interval, f"{symbol}.csv")
+
+
+def iter_chunks(symbol, interval="1d", chunksize=100_000, columns=None):
+    """Stored bars for one symbol as DataFrames of at most chunksize rows, in file order."""
+    path = raw_path(symbol, interval)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"[LOADER] - No data file found for {symbol} at {path}")
+    usecols = ["Date", *columns] if columns else None
+    for chunk in pd.read_csv(path, parse_dates=["Date"], chunksize=chunksize, usecols=usecols):
+        yield chunk.set_index("Date")
+
+
+def merge_aligned(streams, column="Close", how="outer"):
+    """
+    k-way merge of per-symbol chunk iterators into time-aligned blocks.
+
+    streams maps symbol -> iterator of DataFrames sorted by index. Each block
+    covers every timestamp up to the smallest last timestamp among the
+    buffered chunks, so it is complete for all symbols; the rest of each
+    buffer carries over. At most one chunk per symbol is held at a time.
+    Blocks have one column per symbol (in streams order); with how="outer"
+    a symbol without a bar at a timestamp gets NaN, with "inner" the
+    timestamp is dropped. Concatenated, the blocks equal the full in-memory
+    alignment.
+    """
+    iterators = dict(streams)
+    buffers = {}
+    # Typed empty column for symbols that are exhausted (or never had bars).
+    empty = {symbol: pd.Series(index=pd.DatetimeIndex([], name="Date"), dtype=float) for symbol in iterators}
+
+    def refill(symbol):
+        for chunk in iterators[symbol]:
+            if len(chunk):
+                buffers[symbol] = chunk[column]
+                empty[symbol] = chunk[column].iloc[:0]
+                return
+        buffers.pop(symbol, None)
+
+    for symbol in iterators:
+        refill(symbol)
+
+    while buffers:
+        boundary = min(buf.index[-1] for buf in buffers.values())
+        parts = {}
+        for symbol in iterators:
+            buf = buffers.get(symbol)
+            if buf is None:
+                parts[symbol] = empty[symbol]
+                continue
+            n = buf.index.searchsorted(boundary, side="right")
+            parts[symbol] = buf.iloc[:n]
+            if n == len(buf):
+                refill(symbol)
+            else:
+                buffers[symbol] = buf.iloc[n:]
+        block = pd.concat(parts, axis=1, join=how).sort_index()
+        if len(block):
+            yield block
+
+
+def aligned_closes(symbols, interval="1d", chunksize=100_000, how="outer"):
+    """Close matrix (one column per symbol) built through merge_aligned; only Close is read."""
+    streams = {s: iter_chunks(s, interval, chunksize, columns=["Close"]) for s in symbols}
+    blocks = list(merge_aligned(streams, how=how))
+    if not blocks:
+        return pd.DataFrame(columns=list(symbols), dtype=float)
+    return pd.concat(blocks)
+
+
+class StreamingCSVData(bt.feed.DataBase):
+    """
+    Backtrader feed that reads data/raw/{interval}/{symbol}.csv one chunk at
+    a time instead of holding the whole history in a DataFrame. Bars are
+    converted exactly like bt.feeds.PandasData does, so a backtest gives the
+    same results as the in-memory path. Combine with Cerebro(exactbars=...)
+    to also bound backtrader's own line buffers.
+    """
+    params = (
+        ("symbol", None),
+        ("interval", "1d"),
+        ("chunksize", 100_000),
+    )
+
+    def start(self):
+        super().start()
+        self._rows = self._iter_rows()
+
+    def _iter_rows(self):
+        for chunk in iter_chunks(self.p.symbol, self.p.interval, self.p.chunksize):
+            dts = chunk.index.to_pydatetime()
+            cols = [chunk[c].to_numpy() if c in chunk.columns else None for c in BAR_COLUMNS]
+            for i in range(len(chunk)):
+                yield dts[i], [None if col is None else col[i] for col in cols]
+
+    def qbuffer(self, savemem=0, replaying=False):
+        # Under exactbars the buffer holds only the current bar and the final
+        # (failed) load rewinds it, so stop() would find no bar to read.
+        # One extra slot keeps the last bar available.
+        for line in self.lines:
+            line.qbuffer(savemem=savemem, extrasize=1)
+
+    def _load(self):
+        try:
+            dt, values = next(self._rows)
+        except StopIteration:
+            return False
+        lines = self.lines
+        for line, value in zip((lines.open, lines.high, lines.low, lines.close, lines.volume), values):
+            if value is not None:
+                line[0] = value
+        lines.datetime[0] = date2num(dt)
+        return True
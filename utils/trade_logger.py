@@ -1,21 +1,165 @@
+import os
+import uuid
+import numpy as np
 import pandas as pd
 
+
+class ColumnarLog:
+    """
+    Append-only table stored as one preallocated NumPy structured array.
+
+    Capacity doubles when full, so appends are amortised O(1) without a
+    Python dict per row. Columns declared with dtype "category" hold int32
+    codes into a per-column category table; None is stored as code -1 and
+    reads back as missing. When flush_rows and flush_dir are set, every
+    flush_rows rows are written to flush_dir as one compressed .npz chunk
+    (one array per column) and dropped from memory. Chunk files are prefixed
+    with the log's name (unique by default), so logs can share a flush_dir.
+    """
+
+    def __init__(self, schema, capacity=1024, flush_rows=None, flush_dir=None, name=None):
+        self.columns = [name for name, _ in schema]
+        self.categorical = {name for name, dt in schema if dt == "category"}
+        dtype = [(name, np.int32 if name in self.categorical else dt) for name, dt in schema]
+        self.dtype = np.dtype(dtype)
+        self.data = np.empty(capacity, dtype=self.dtype)
+        self.size = 0
+
+        self.categories = {name: [] for name in self.categorical}
+        self._codes = {name: {} for name in self.categorical}
+
+        self.flush_rows = flush_rows
+        self.flush_dir = flush_dir
+        self.name = name or f"log_{os.getpid()}_{uuid.uuid4().hex[:8]}"
+        self.flushed_rows = 0
+        self.chunk_paths = []
+
+    def __len__(self):
+        return self.flushed_rows + self.size
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def _encode(self, name, value):
+        if value is None:
+            return -1
+        codes = self._codes[name]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(self.categories[name])
+            self.categories[name].append(value)
+        return code
+
+    def append(self, row=None, **values):
+        row = {**(row or {}), **values}
+        if self.size == len(self.data):
+            grown = np.empty(max(2 * len(self.data), 1), dtype=self.dtype)
+            grown[:self.size] = self.data[:self.size]
+            self.data = grown
+
+        record = self.data[self.size]
+        for name in self.columns:
+            value = row.get(name)
+            if name in self.categorical:
+                record[name] = self._encode(name, value)
+            elif value is None:
+                record[name] = np.datetime64("NaT") if self.dtype[name].kind == "M" else np.nan
+            else:
+                record[name] = value
+        self.size += 1
+
+        if self.flush_rows and self.flush_dir and self.size >= self.flush_rows:
+            self.flush()
+
+    def flush(self):
+        """Write the in-memory rows as the next columnar chunk file."""
+        if not self.size or not self.flush_dir:
+            return
+        os.makedirs(self.flush_dir, exist_ok=True)
+        arrays = {name: self.data[name][:self.size] for name in self.columns}
+        for name in self.categorical:
+            arrays[f"__categories__{name}"] = np.array(self.categories[name], dtype=object).astype(str)
+        path = os.path.join(self.flush_dir, f"{self.name}_chunk_{len(self.chunk_paths):05d}.npz")
+        np.savez_compressed(path, **arrays)
+        self.chunk_paths.append(path)
+        self.flushed_rows += self.size
+        self.size = 0
+
+    def _frame(self, columns, categories):
+        df = pd.DataFrame(columns)
+        for name in self.categorical:
+            df[name] = pd.Categorical.from_codes(df[name].to_numpy(), categories=categories[name])
+        return df
+
+    def to_dataframe(self):
+        frames = []
+        for path in self.chunk_paths:
+            with np.load(path) as chunk:
+                cols = {name: chunk[name] for name in self.columns}
+                cats = {name: chunk[f"__categories__{name}"].tolist() for name in self.categorical}
+            frames.append(self._frame(cols, cats))
+        if self.size or not frames:
+            cols = {name: self.data[name][:self.size] for name in self.columns}
+            frames.append(self._frame(cols, self.categories))
+
+        if len(frames) == 1:
+            df = frames[0]
+        else:
+            df = pd.concat([f.astype({n: object for n in self.categorical}) for f in frames], ignore_index=True)
+            for name in self.categorical:
+                df[name] = df[name].astype("category")
+        return df[self.columns]
+
+
+TRADE_LOG_SCHEMA = [
+    ("datetime", "datetime64[ns]"),
+    ("symbol", "category"),
+    ("action", "category"),
+    ("price", np.float64),
+    ("size", np.float64),
+    ("pnl", np.float64),
+]
+
+
+# Closed round-trip trades recorded by SpreadPairStrategy.
+SPREAD_TRADE_SCHEMA = [
+    ("symbol", "category"),
+    ("side", "category"),
+    ("entry_date", "datetime64[ns]"),
+    ("entry_index", np.int64),
+    ("entry_spread", np.float64),
+    ("price1", np.float64),
+    ("price2", np.float64),
+    ("size1", np.int64),
+    ("size2", np.int64),
+    ("exit_date", "datetime64[ns]"),
+    ("exit_index", np.int64),
+    ("exit_spread", np.float64),
+    ("pnl", np.float64),
+    ("duration", np.int64),
+    ("return_pct", np.float64),
+]
+
+
+def spread_trade_log(capacity=64):
+    return ColumnarLog(SPREAD_TRADE_SCHEMA, capacity=capacity)
+
+
 class TradeLogger:
-    def __init__(self):
-        self.trades = []
+    def __init__(self, capacity=1024, flush_rows=None, flush_dir=None, name=None):
+        self.trades = ColumnarLog(TRADE_LOG_SCHEMA, capacity=capacity,
+                                  flush_rows=flush_rows, flush_dir=flush_dir, name=name)
 
     def log_trade(self, dt, symbol, action, price, size, pnl=None):
-        self.trades.append({
-            "datetime": dt,
-            "symbol": symbol,
-            "action": action,
-            "price": price,
-            "size": size,
-            "pnl": pnl
-        })
+        self.trades.append(datetime=dt, symbol=symbol, action=action, price=price, size=size, pnl=pnl)
+
+    def flush(self):
+        self.trades.flush()
 
     def to_dataframe(self):
-        return pd.DataFrame(self.trades)
+        if not self.trades:
+            return pd.DataFrame()
+        return self.trades.to_dataframe()
 
     def save_to_csv(self, path="data/processed/trade_log.csv"):
         df = self.to_dataframe()
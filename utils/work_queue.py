@@ -0,0 +1,183 @@
+# utils/work_queue.py — Filesystem work queue shared by any number of worker processes/hosts
+
+import os
+import json
+import time
+import socket
+import threading
+
+PENDING = "pending"
+CLAIMED = "claimed"
+RESULTS = "results"
+
+
+def _write_json_atomic(path, payload):
+    tmp = f"{path}.{socket.gethostname()}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(payload, f, default=str)
+    os.replace(tmp, path)
+
+
+class WorkQueue:
+    """
+    Work units are JSON files moving through three directories:
+
+        pending/{id}.json --claim--> claimed/{id}.json --complete--> results/{id}.json
+
+    Claiming is a rename, which is atomic on POSIX filesystems (including
+    NFS), so exactly one worker wins each unit. A running worker refreshes
+    its claim file's mtime as a heartbeat; the coordinator moves claims
+    whose heartbeat is older than the stale timeout back to pending. Results
+    are written to a temp file and renamed into place, so readers never see
+    partial output, and a unit completed twice simply overwrites an
+    identical result.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        for sub in (PENDING, CLAIMED, RESULTS):
+            os.makedirs(os.path.join(root, sub), exist_ok=True)
+
+    def _path(self, state, unit_id):
+        return os.path.join(self.root, state, f"{unit_id}.json")
+
+    def _ids(self, state):
+        return sorted(name[:-5] for name in os.listdir(os.path.join(self.root, state)) if name.endswith(".json"))
+
+    # --- Coordinator side -------------------------------------------------------
+
+    def write_manifest(self, manifest):
+        _write_json_atomic(os.path.join(self.root, "manifest.json"), manifest)
+
+    def read_manifest(self):
+        with open(os.path.join(self.root, "manifest.json")) as f:
+            return json.load(f)
+
+    def enqueue(self, units):
+        """
+        units: iterable of (unit_id, payload). Ids order the merged results.
+        Units with a result or a claim are skipped; a dead worker's claim
+        goes back to pending through requeue_stale.
+        """
+        done = set(self._ids(RESULTS)) | set(self._ids(CLAIMED))
+        count = 0
+        for unit_id, payload in units:
+            if unit_id in done:
+                continue
+            _write_json_atomic(self._path(PENDING, unit_id), {"id": unit_id, "payload": payload})
+            count += 1
+        return count
+
+    def requeue_stale(self, timeout):
+        """Move claims without a heartbeat for `timeout` seconds back to pending."""
+        now = time.time()
+        requeued = []
+        for unit_id in self._ids(CLAIMED):
+            path = self._path(CLAIMED, unit_id)
+            try:
+                if now - os.path.getmtime(path) < timeout:
+                    continue
+                if os.path.exists(self._path(RESULTS, unit_id)):
+                    os.remove(path)
+                    continue
+                os.rename(path, self._path(PENDING, unit_id))
+                requeued.append(unit_id)
+            except FileNotFoundError:
+                continue  # completed or requeued concurrently
+        return requeued
+
+    def progress(self):
+        return {
+            "pending": len(self._ids(PENDING)),
+            "claimed": len(self._ids(CLAIMED)),
+            "done": len(self._ids(RESULTS)),
+        }
+
+    def results(self):
+        """All results ordered by unit id, so the merge is deterministic."""
+        out = []
+        for unit_id in self._ids(RESULTS):
+            with open(self._path(RESULTS, unit_id)) as f:
+                out.append(json.load(f))
+        return out
+
+    # --- Worker side ------------------------------------------------------------
+
+    def claim(self):
+        """Claim the next pending unit, or return None when nothing is pending."""
+        for unit_id in self._ids(PENDING):
+            source, target = self._path(PENDING, unit_id), self._path(CLAIMED, unit_id)
+            try:
+                # Refresh mtime first: rename keeps it, and an old enqueue time
+                # would make a fresh claim look stale to the coordinator.
+                os.utime(source)
+                os.rename(source, target)
+                with open(target) as f:
+                    return json.load(f)
+            except FileNotFoundError:
+                continue  # another worker won this one
+        return None
+
+    def heartbeat(self, unit_id):
+        try:
+            os.utime(self._path(CLAIMED, unit_id))
+        except FileNotFoundError:
+            pass
+
+    def complete(self, unit_id, result):
+        _write_json_atomic(self._path(RESULTS, unit_id), {"id": unit_id, **result})
+        try:
+            os.remove(self._path(CLAIMED, unit_id))
+        except FileNotFoundError:
+            pass
+
+
+def run_worker(queue_dir, handlers, heartbeat_interval=10.0, idle_timeout=5.0, max_units=None):
+    """
+    Claim and run units until nothing is pending or claimed for idle_timeout seconds.
+    `handlers` maps the manifest "kind" to a function (payload, manifest) -> dict.
+    """
+    queue = WorkQueue(queue_dir)
+    manifest = queue.read_manifest()
+    handler = handlers[manifest["kind"]]
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+    processed = 0
+    idle_since = None
+    while max_units is None or processed < max_units:
+        unit = queue.claim()
+        if unit is None:
+            # Stay around while other workers hold claims: a stale one may be requeued.
+            if queue.progress()["claimed"]:
+                idle_since = None
+                time.sleep(0.5)
+                continue
+            idle_since = idle_since or time.time()
+            if time.time() - idle_since >= idle_timeout:
+                break
+            time.sleep(0.2)
+            continue
+        idle_since = None
+
+        stop = threading.Event()
+
+        def beat(unit_id=unit["id"]):
+            while not stop.wait(heartbeat_interval):
+                queue.heartbeat(unit_id)
+
+        beater = threading.Thread(target=beat, daemon=True)
+        beater.start()
+        start = time.perf_counter()
+        try:
+            result = {"result": handler(unit["payload"], manifest)}
+        except Exception as e:
+            result = {"error": f"{type(e).__name__}: {e}"}
+        finally:
+            stop.set()
+            beater.join()
+        result.update({"worker": worker_id, "seconds": time.perf_counter() - start})
+        queue.complete(unit["id"], result)
+        processed += 1
+
+    print(f"[WORKER] - {worker_id} processed {processed} unit(s)")
+    return processed